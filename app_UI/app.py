@@ -3,6 +3,7 @@ from tabs.series import render as render_precipitation
 from tabs.kalibratie import render as render_kalibratie
 from tabs.model_vergelijkingen import render as render_model_vergelijkingen
 from tabs.terugkeertijden import render as render_terugkeertijden
+from tabs.taken import render as render_taken
 
 st.set_page_config(page_title="Pastas WV2030", layout="wide")
 st.sidebar.title("Navigation")
@@ -10,7 +11,8 @@ choice = st.sidebar.radio("", [
     "Meetreeksen",
     "Model Bouwen",
     "Model Vergelijkingen",
-    "Terugkeertijden en voorspellingen"
+    "Terugkeertijden en voorspellingen",
+    "Taken"
 ])
 
 if choice == "Meetreeksen":
@@ -21,3 +23,5 @@ elif choice == "Model Vergelijkingen":
     render_model_vergelijkingen()
 elif choice == "Terugkeertijden en voorspellingen":
     render_terugkeertijden()
+elif choice == "Taken":
+    render_taken()
@@ -7,6 +7,15 @@ import plotly.graph_objects as go
 import streamlit as st
 import pastas as ps
 
+from app_UI.utils import show_job, submit_job
+from pastas_wv2030.aggregate import load_aggregate
+from pastas_wv2030.archive import SeriesArchive
+from pastas_wv2030.batch import RECHARGE_MODELS, RESPONSE_FUNCTIONS
+from pastas_wv2030.config import ARCHIVE_DIR
+from pastas_wv2030.forecast import load_solved_model
+from pastas_wv2030.plotting import scatter_trace
+from pastas_wv2030.uncertainty import prediction_bands
+
 # — 1) Data folders
 INPUT_PREC = Path('../input_files/input_prec')
 INPUT_EVAP = Path('../input_files/input_evap')
@@ -19,27 +28,50 @@ def list_csv_files(directory: Path) -> list[str]:
         return []
     return sorted(f for f in os.listdir(directory) if f.lower().endswith('.csv'))
 
-# — 3) Model‐component dictionaries
-recharge_models = {
-    "Linear":       ps.rch.Linear(),
-    "FlexModel":    ps.rch.FlexModel(),
-    "Berendrecht":  ps.rch.Berendrecht()
-}
-response_functions = {
-    "Exponential":       ps.Exponential(),
-    "Gamma":             ps.Gamma(),
-    "DoubleExponential": ps.DoubleExponential(),
-    "Hantush":           ps.Hantush(),
-    "FourParam":         ps.FourParam(),
-}
+# — 3) Cached loaders
+# Series are cached by path and modification time, so an updated file is re-read.
+@st.cache_data(max_entries=64)
+def _read_series(path: str, mtime: float) -> pd.Series:
+    df = pd.read_csv(path)
+    df[df.columns[0]] = pd.to_datetime(df[df.columns[0]])
+    return df.set_index(df.columns[0])[df.columns[1]].dropna()
+
+def load_series(path: Path) -> pd.Series:
+    return _read_series(str(path), os.path.getmtime(path))
+
+@st.cache_data(max_entries=64)
+def _read_archived(root: str, series_id: str, stat: str | None, version: str, n: int) -> pd.Series:
+    archive = SeriesArchive(root)
+    if stat is None:
+        return archive.load(series_id)
+    return load_aggregate(archive, series_id, "D", stat)
+
+def _read_head(source: str, *key) -> pd.Series:
+    if source == "CSV":
+        path, mtime, stat = key
+        head_s = _read_series(path, mtime)
+        return head_s if stat is None else head_s.resample("D").agg(stat)
+    return _read_archived(*key)
+
+# — 4) Calibration
+# Solved by the job worker (see pastas_wv2030.jobs), so a slow model never blocks the session; the
+# job is keyed on the inputs and model choices only, so plot options never trigger a refit and an
+# identical request reuses the finished job. The saved model is cached per path and modification
+# time as a resource, so it is not pickled and copied on every rerun; the tab only reads from it.
+@st.cache_resource(max_entries=32)
+def _load_model(path: str, mtime: float) -> ps.Model:
+    return load_solved_model(path)
+
+def load_model(path: str) -> ps.Model:
+    return _load_model(path, os.path.getmtime(path))
+
+# Monte Carlo bands of the solved model (see pastas_wv2030.uncertainty), cached like the model
+@st.cache_data(max_entries=16)
+def _prediction_bands(path: str, mtime: float, n: int, noise: bool) -> pd.DataFrame:
+    bands, _ = prediction_bands(_load_model(path, mtime), n, seed=0, noise=noise)
+    return bands
 
 def render():
-   # helper to load a series from CSV
-    def load_series(path: Path) -> pd.Series:
-        df = pd.read_csv(path)
-        df[df.columns[0]] = pd.to_datetime(df[df.columns[0]])
-        return df.set_index(df.columns[0])[df.columns[1]].dropna()
-
     st.header("Kalibratie")
 
      # 1) File selectors
@@ -51,8 +83,33 @@ def render():
         evap_files = list_csv_files(INPUT_EVAP)
         sel_evap   = st.selectbox("Evaporation CSV", evap_files)
     with col3:
-        head_files = list_csv_files(INPUT_HEAD)
-        sel_head   = st.selectbox("Observed head CSV", head_files)
+        archive = SeriesArchive(ARCHIVE_DIR)
+        head_source = st.radio("Head series source", ["CSV", "Series archive"] if len(archive) else ["CSV"],
+                               horizontal=True)
+        if head_source == "CSV":
+            head_files = list_csv_files(INPUT_HEAD)
+            sel_head   = st.selectbox("Observed head CSV", head_files)
+        else:
+            sel_head   = st.selectbox("Observed head series", archive.ids())
+
+    def head_key() -> tuple:
+        """Cache key of the selected head series; archived series use the precomputed aggregates."""
+        stat = {"Daily Mean": "mean", "Daily Median": "median", "Daily Max": "max"}.get(agg_method)
+        if head_source == "CSV":
+            path = INPUT_HEAD/sel_head
+            return ("CSV", str(path), os.path.getmtime(path), stat)
+        meta = archive.index.loc[sel_head]
+        return ("archive", str(archive.root), sel_head, stat, str(meta.get("version")), int(meta["n"]))
+
+    def series_key(path: Path) -> tuple:
+        return (str(path), os.path.getmtime(path))
+
+    def head_spec() -> dict:
+        """The selected head series as the worker reads it (see pastas_wv2030.jobs)."""
+        stat = {"Daily Mean": "mean", "Daily Median": "median", "Daily Max": "max"}.get(agg_method, "original")
+        if head_source == "CSV":
+            return {"path": str((INPUT_HEAD/sel_head).resolve()), "aggregation": stat}
+        return {"archive": str(archive.root.resolve()), "id": sel_head, "aggregation": stat}
 
     if not (sel_prec and sel_evap and sel_head):
         st.warning("Please select all three CSV files before proceeding.")
@@ -61,9 +118,9 @@ def render():
     # 2) Recharge & response selectors
     col4, col5 = st.columns(2)
     with col4:
-        sel_rch = st.selectbox("Recharge model", list(recharge_models.keys()))
+        sel_rch = st.selectbox("Recharge model", [name for name, cls in RECHARGE_MODELS.items() if cls is not None])
     with col5:
-        sel_rf  = st.selectbox("Response function", list(response_functions.keys()))
+        sel_rf  = st.selectbox("Response function", list(RESPONSE_FUNCTIONS))
 
     # 3) Head aggregation selector
     agg_method = st.selectbox(
@@ -78,20 +135,14 @@ def render():
     if st.button("Plot input series"):
         prec_s = load_series(INPUT_PREC/sel_prec)
         evap_s = load_series(INPUT_EVAP/sel_evap)
-        head_s = load_series(INPUT_HEAD/sel_head)
-
-        # apply aggregation if needed
-        if agg_method != "Original":
-            head_s = head_s.resample("D").agg({
-                "Daily Mean": "mean",
-                "Daily Median": "median",
-                "Daily Max": "max"
-            }[agg_method])
+        head_s = _read_head(*head_key())
 
+        # Only the observation window is plotted, and long series are downsampled
+        start, end = head_s.index.min(), head_s.index.max()
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=prec_s.index, y=prec_s.values, mode='lines', name='Precipitation'))
-        fig.add_trace(go.Scatter(x=evap_s.index, y=evap_s.values, mode='lines', name='Evaporation'))
-        fig.add_trace(go.Scatter(x=head_s.index, y=head_s.values, mode='lines', name=f'Observed Head ({agg_method})'))
+        fig.add_trace(scatter_trace(prec_s, start=start, end=end, name='Precipitation'))
+        fig.add_trace(scatter_trace(evap_s, start=start, end=end, name='Evaporation'))
+        fig.add_trace(scatter_trace(head_s, name=f'Observed Head ({agg_method})'))
         fig.update_layout(
             title="Input time series",
             xaxis_title="Date",
@@ -99,47 +150,45 @@ def render():
         )
         st.plotly_chart(fig, use_container_width=True)
 
-    # 6) Build & run model
+    # 6) Build & run model; the solved model is remembered per session
+    model_key = (head_key(), series_key(INPUT_PREC/sel_prec), series_key(INPUT_EVAP/sel_evap),
+                 sel_rch, sel_rf, include_noise)
     if st.button("Build & run model"):
-        # load & optionally aggregate
-        prec_s = load_series(INPUT_PREC/sel_prec)
-        evap_s = load_series(INPUT_EVAP/sel_evap)
-        head_s = load_series(INPUT_HEAD/sel_head)
-        if agg_method != "Original":
-            head_s = head_s.resample("D").agg({
-                "Daily Mean": "mean",
-                "Daily Median": "median",
-                "Daily Max": "max"
-            }[agg_method])
-
-        # build the Pastas model
-        ml = ps.Model(head_s, name="Kalibratie")
-        rm = ps.RechargeModel(
-            prec=prec_s,
-            evap=evap_s,
-            recharge=recharge_models[sel_rch],
-            rfunc=response_functions[sel_rf],
-            name="rch"
-        )
-        ml.add_stressmodel(rm)
-        if include_noise:
-            ml.add_noisemodel(ps.ArNoiseModel())
-        ml.solve(report=True)
-
-        # show parameters
-        st.subheader("Calibration results")
-        st.dataframe(ml.parameters)
-
-        # Obs vs Sim plot
-        st.subheader("Observed vs Simulated heads")
-        ax1 = ml.plot()
-        fig1 = ax1.get_figure()
-        fig1.set_size_inches(12, 6)
-        st.pyplot(fig1, dpi=200, clear_figure=True)
-
-        # Diagnostic plots
+        params = {"head": head_spec(), "prec": str((INPUT_PREC/sel_prec).resolve()),
+                  "evap": str((INPUT_EVAP/sel_evap).resolve()), "recharge": sel_rch, "rfunc": sel_rf,
+                  "noise": include_noise, "inputs": model_key[:3]}
+        st.session_state["kalibratie_job"] = submit_job("calibration", params, reuse=True)
+        st.session_state["kalibratie_model_key"] = model_key
+    if st.session_state.get("kalibratie_model_key") != model_key:
+        return
+    job = show_job(st.session_state["kalibratie_job"])
+    if job["status"] != "done":
+        return
+    ml = load_model(job["result"]["model"])
+
+    # show parameters
+    st.subheader("Calibration results")
+    st.dataframe(ml.parameters)
+
+    # Obs vs Sim plot
+    st.subheader("Observed vs Simulated heads")
+    ax1 = ml.plot()
+    interval = st.radio("Uncertainty band (95%, 1000 parameter sets)", ["None", "Confidence", "Prediction"],
+                        horizontal=True, help="Prediction also includes the residual noise")
+    if interval != "None":
+        path = job["result"]["model"]
+        bands = _prediction_bands(path, os.path.getmtime(path), 1000, interval == "Prediction")
+        ax1.fill_between(bands.index, bands[0.025], bands[0.975], color="gray", alpha=0.3,
+                         label=f"95% {interval.lower()} interval")
+        ax1.legend()
+    fig1 = ax1.get_figure()
+    fig1.set_size_inches(12, 6)
+    st.pyplot(fig1, dpi=200, clear_figure=True)
+
+    # Diagnostic plots
+    if st.checkbox("Show model diagnostic plots", value=True):
         st.subheader("Model diagnostic plots")
         axes = ml.plots.results()
         fig2 = axes[0].get_figure()
         fig2.set_size_inches(12, 6)
-        st.pyplot(fig2, dpi=200, clear_figure=True)
\ No newline at end of file
+        st.pyplot(fig2, dpi=200, clear_figure=True)
@@ -1,5 +1,89 @@
+# tabs/model_vergelijkingen.py
+import os
+
+import plotly.graph_objects as go
 import streamlit as st
 
+from pastas_wv2030.compare import MODEL_COLUMNS, ModelIndex, update_index
+from pastas_wv2030.config import BATCH_STORE, MODEL_INDEX, MODELS_DIR
+from pastas_wv2030.plotting import scatter_trace
+
+SORT_METRICS = {"EVP": False, "R2": False, "RMSE": True, "AIC": True, "BIC": True}
+
+# The index is only read again after an update changed the database file
+@st.cache_data(max_entries=2, show_spinner="Loading model index...")
+def _load_table(path: str, mtime: float):
+    with ModelIndex(path) as index:
+        return index.table()
+
+@st.cache_data(max_entries=32)
+def _load_series(path: str, mtime: float, model_id: str):
+    with ModelIndex(path) as index:
+        return index.series(model_id)
+
 def render():
     st.header("Model Vergelijkingen")
-    st.info("Placeholder voor modelvergelijkingen.")
+
+    # 1) Index: only new or changed models are loaded
+    if st.button("Update model index", help=f"Index new models in {MODELS_DIR} and {BATCH_STORE}") \
+            or not MODEL_INDEX.exists():
+        with st.spinner("Indexing models..."):
+            update_index(MODEL_INDEX, [MODELS_DIR], [BATCH_STORE]).close()
+    mtime = os.path.getmtime(MODEL_INDEX)
+    table = _load_table(str(MODEL_INDEX), mtime)
+    if table.empty:
+        st.warning(f"No solved models found in {MODELS_DIR} or {BATCH_STORE}.")
+        return
+
+    # 2) Filter and rank
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        files = st.multiselect("Series", sorted(table["file"].dropna().unique()))
+        recharge = st.multiselect("Recharge model", sorted(table["RechargeModel"].dropna().unique()))
+    with col2:
+        rfunc = st.multiselect("Response function", sorted(table["RechargeRfunc"].dropna().unique()))
+        min_evp = st.slider("Minimum EVP (%)", 0.0, 100.0, 0.0, 1.0)
+    with col3:
+        metric = st.selectbox("Rank by", list(SORT_METRICS))
+        best_only = st.checkbox("Best model per series only")
+
+    selected = table[table["EVP"].fillna(-1) >= min_evp]
+    if files:
+        selected = selected[selected["file"].isin(files)]
+    if recharge:
+        selected = selected[selected["RechargeModel"].isin(recharge)]
+    if rfunc:
+        selected = selected[selected["RechargeRfunc"].isin(rfunc)]
+    selected = selected.sort_values(metric, ascending=SORT_METRICS[metric])
+    if best_only:
+        selected = selected.drop_duplicates("file")
+
+    p_columns = [c for c in selected.columns if c.startswith("p_")]
+    columns = ["file", "model", "RechargeModel", "RechargeRfunc", "noise", *SORT_METRICS, *p_columns]
+    st.subheader(f"{len(selected)} of {len(table)} models")
+    st.dataframe(selected[columns].round(3), use_container_width=True, hide_index=True)
+    with st.expander("Parameters"):
+        parameters = selected.drop(columns=MODEL_COLUMNS[1:] + p_columns)
+        st.dataframe(parameters.set_index(selected["model"]).dropna(axis=1, how="all"), use_container_width=True)
+    st.download_button("Download CSV", selected.to_csv(index=False).encode(), "model_vergelijking.csv", "text/csv")
+
+    # 3) Overlay of the simulations (stored for .pas models)
+    with_series = selected[selected["source"] == "pas"]
+    labels = dict(zip(with_series.index, with_series["model"]))
+    chosen = st.multiselect("Overlay simulations", list(labels), default=list(labels)[:2],
+                            format_func=labels.get)
+    if chosen:
+        fig = go.Figure()
+        observed = set()
+        for model_id in chosen:
+            series = _load_series(str(MODEL_INDEX), mtime, model_id)
+            if series is None:
+                continue
+            file = selected.at[model_id, "file"]
+            if file not in observed:
+                observed.add(file)
+                fig.add_trace(scatter_trace(series["observed"].dropna(), name=f"{file} (observed)",
+                                            mode="markers", marker=dict(size=3, color="black")))
+            fig.add_trace(scatter_trace(series["simulated"], name=labels[model_id], mode="lines"))
+        fig.update_layout(height=500, yaxis_title="Head", legend=dict(orientation="h", y=-0.2))
+        st.plotly_chart(fig, use_container_width=True)
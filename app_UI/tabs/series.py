@@ -44,6 +44,7 @@ import plotly.graph_objs as go
 from datetime import date
 from app_UI.config import DEFAULT_START_DATE, DEFAULT_END_DATE
 from app_UI.utils import fetch_knmi_prec_evap
+from pastas_wv2030.plotting import scatter_trace
 
 def render():
     st.header("Bekijken Meetreeksen")
@@ -106,32 +107,33 @@ def render():
             # 4) Build Plotly figure
             fig = go.Figure()
 
-            # KNMI series (left y-axis)
-            fig.add_trace(go.Scatter(
-                x=prec.index, y=prec.values,
+            # KNMI series (left y-axis), clipped to the observation window and downsampled
+            start = end = None
+            if obs_df is not None and not obs_df.empty:
+                start, end = obs_df.index.min(), obs_df.index.max()
+            fig.add_trace(scatter_trace(
+                prec, start=start, end=end,
                 mode="lines", name="Precipitation (mm/day)",
                 line=dict(color="blue")
             ))
-            fig.add_trace(go.Scatter(
-                x=evap.index, y=evap.values,
+            fig.add_trace(scatter_trace(
+                evap, start=start, end=end,
                 mode="lines", name="Evapotranspiration (mm/day)",
                 line=dict(color="orange")
             ))
             if recharge_knmi is not None:
-                fig.add_trace(go.Scatter(
-                    x=common_idx,
-                    y=recharge_knmi.values,
+                fig.add_trace(scatter_trace(
+                    recharge_knmi, start=start, end=end,
                     mode="lines",
                     name="Recharge (KNMI)",
                     line=dict(color="green")
                 ))
 
-            # Observer original (secondary y-axis)
+            # Observer original (secondary y-axis), downsampled for long logger series
             if obs_df is not None and not obs_df.empty:
                 col = obs_df.columns[0]
-                fig.add_trace(go.Scatter(
-                    x=obs_df.index,
-                    y=obs_df[col],
+                fig.add_trace(scatter_trace(
+                    pd.to_numeric(obs_df[col], errors="coerce"),
                     mode="markers+lines",
                     name=f"Observer Original: {col}",
                     yaxis="y2",
@@ -142,9 +144,8 @@ def render():
             # Observer daily mean (secondary y-axis)
             if obs_resampled is not None and not obs_resampled.empty:
                 col = obs_resampled.columns[0]
-                fig.add_trace(go.Scatter(
-                    x=obs_resampled.index,
-                    y=obs_resampled[col],
+                fig.add_trace(scatter_trace(
+                    obs_resampled[col],
                     mode="lines",
                     name=f"Observer Daily Mean: {col}",
                     yaxis="y2",
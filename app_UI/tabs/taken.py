@@ -0,0 +1,90 @@
+# tabs/taken.py
+import streamlit as st
+
+from app_UI.utils import POLL_SECONDS, session_owner, show_job, submit_job
+from pastas_wv2030.archive import SeriesArchive
+from pastas_wv2030.batch import RECHARGE_MODELS, RESPONSE_FUNCTIONS
+from pastas_wv2030.config import (ARCHIVE_DIR, DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, JOB_QUEUE, OUTPUT_DIR,
+                                  OUTPUT_SHEETS)
+from pastas_wv2030.jobs import FINISHED, JobQueue
+
+# Batches and reports over many series run in the job worker; this page queues them and follows
+# their progress and results, also those of the jobs of other users.
+def render():
+    st.header("Taken")
+    with JobQueue(JOB_QUEUE) as queue:
+        workers = queue.workers()
+    if workers.empty:
+        st.warning("No job worker is running. Start one next to the app with `python -m scripts.job_worker` "
+                   "(`--concurrent N` runs N jobs side by side).")
+    else:
+        st.caption(f"{len(workers)} job worker(s) running, {workers['job_id'].notna().sum()} busy")
+
+    tab_batch, tab_reports, tab_jobs = st.tabs(["Batch calibratie", "Rapporten", "Wachtrij"])
+    with tab_batch:
+        _render_batch()
+    with tab_reports:
+        _render_reports()
+    with tab_jobs:
+        _render_jobs()
+
+def _head_specs(source: str, names: list, aggregation: str) -> list:
+    if source == "CSV":
+        return [{"path": str(OUTPUT_SHEETS / f"{name}.csv"), "aggregation": aggregation} for name in names]
+    return [{"archive": str(ARCHIVE_DIR), "id": name, "aggregation": aggregation} for name in names]
+
+def _render_batch():
+    archive = SeriesArchive(ARCHIVE_DIR)
+    source = st.radio("Head series source", ["CSV", "Series archive"] if len(archive) else ["CSV"], horizontal=True,
+                      key="batch_source")
+    names = sorted(f.stem for f in OUTPUT_SHEETS.glob("*.csv")) if source == "CSV" else sorted(archive.ids())
+    all_series = st.checkbox(f"All {len(names)} series", value=True)
+    selected = names if all_series else st.multiselect("Series", names)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        recharge = st.multiselect("Recharge models", list(RECHARGE_MODELS), default=list(RECHARGE_MODELS))
+        aggregation = st.selectbox("Daily aggregation", ["median", "mean", "max"], key="batch_aggregation")
+    with col2:
+        rfunc = st.multiselect("Response functions", list(RESPONSE_FUNCTIONS), default=list(RESPONSE_FUNCTIONS))
+        noise = st.checkbox("Include AR noise model", value=True, key="batch_noise")
+        tarso = st.checkbox("Also fit a TarsoModel", value=True)
+    select = st.number_input("Only fully fit the best N variants per series (0: the whole grid)", 0, 20, 0,
+                             help="Screens all variants with cheap fits first, see pastas_wv2030.selection")
+
+    if st.button("Queue batch", disabled=not (selected and recharge and rfunc)):
+        params = {"heads": _head_specs(source, selected, aggregation), "prec": str(DEFAULT_PREC_FILE),
+                  "evap": str(DEFAULT_EVAP_FILE), "recharge": recharge, "rfunc": rfunc,
+                  "tarso": tarso, "noise": noise, "select": int(select) or None}
+        st.session_state["taken_job"] = submit_job("batch", params)
+        st.success(f"Queued as job {st.session_state['taken_job']}, follow it under Wachtrij.")
+
+def _render_reports():
+    files = sorted(OUTPUT_SHEETS.glob("*.csv"))
+    aggregation = st.selectbox("Daily aggregation", ["median", "mean", "max", "original"], key="report_aggregation")
+    force = st.checkbox("Render all reports, also unchanged ones")
+    if st.button(f"Queue reports of {len(files)} series", disabled=not files):
+        params = {"files": [str(f) for f in files], "prec": str(DEFAULT_PREC_FILE), "evap": str(DEFAULT_EVAP_FILE),
+                  "output_dir": str(OUTPUT_DIR / f"output_graphs_{aggregation}"), "aggregation": aggregation,
+                  "force": force}
+        st.session_state["taken_job"] = submit_job("report", params)
+        st.success(f"Queued as job {st.session_state['taken_job']}, follow it under Wachtrij.")
+
+def _render_jobs():
+    only_mine = st.checkbox("Only my jobs", value=True)
+    with JobQueue(JOB_QUEUE) as queue:
+        jobs = queue.list(owner=session_owner() if only_mine else None)
+    if jobs.empty:
+        st.info("No jobs yet.")
+        return
+    st.dataframe(jobs.drop(columns=["owner"] if only_mine else []), use_container_width=True)
+
+    ids = list(jobs.index)
+    current = st.session_state.get("taken_job")
+    job_id = st.selectbox("Job", ids, index=ids.index(current) if current in ids else 0,
+                          format_func=lambda i: f"{i}: {jobs.loc[i, 'kind']} ({jobs.loc[i, 'status']})")
+    job = show_job(job_id, results=True)
+    if job["status"] not in FINISHED:
+        st.caption(f"Refreshed every {POLL_SECONDS} s; results appear as the worker reports them.")
+    elif job["status"] == "done":
+        st.json(job["result"])
@@ -1,5 +1,193 @@
+# tabs/terugkeertijden.py
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
 import streamlit as st
 
+from pastas_wv2030.aggregate import load_aggregate
+from pastas_wv2030.archive import SeriesArchive
+from pastas_wv2030.config import ARCHIVE_DIR, CACHE_DIR, MODELS_DIR, OUTPUT_SHEETS
+from pastas_wv2030.extremes import (RETURN_PERIODS, annual_maxima, cached_fit, peaks_over_threshold,
+                                    plotting_positions, return_levels)
+from pastas_wv2030.forecast import delta_scenarios, forecast_wells, load_solved_model
+from pastas_wv2030.readers import read_head_csv
+
+FIT_CACHE = CACHE_DIR / "extremes.parquet"
+
+# Daily maxima, cached on the file modification times / archive versions in key
+@st.cache_data(max_entries=8, show_spinner="Loading head series...")
+def _load_heads(source: str, location: str, key: tuple) -> dict:
+    if source == "CSV":
+        return {name: read_head_csv(os.path.join(location, f"{name}.csv")).resample("D").max().dropna()
+                for name, _ in key}
+    archive = SeriesArchive(location)
+    return {series_id: load_aggregate(archive, series_id, "D", "max") for series_id, _ in key}
+
+# Fits are cached per series on disk (cached_fit), and per source and settings in memory
+@st.cache_data(max_entries=16, show_spinner="Fitting distributions...")
+def _fit(source: str, location: str, key: tuple, distribution: str, settings: tuple) -> pd.DataFrame:
+    heads = _load_heads(source, location, key)
+    return cached_fit(heads, FIT_CACHE, distribution=distribution, **dict(settings))
+
+# Forecast bands, cached on the model file modification times in key
+@st.cache_data(max_entries=16, show_spinner="Simulating scenarios...")
+def _forecast(key: tuple, n: int, horizon: int, scenarios: tuple) -> dict:
+    return forecast_wells({name: MODELS_DIR / name for name, _ in key}, n, horizon, scenarios, max_workers=1)
+
+# Observed heads and the historical simulation of one model, for the context of the forecast
+@st.cache_data(max_entries=16)
+def _history(name: str, mtime: float) -> tuple:
+    ml = load_solved_model(MODELS_DIR / name)
+    return ml.oseries.series, ml.simulate()
+
 def render():
     st.header("Terugkeertijden en voorspellingen")
-    st.info("Placeholder voor terugkeertijden en voorspellingen.")
+    tab_return, tab_forecast = st.tabs(["Terugkeertijden", "Voorspellingen"])
+    with tab_return:
+        _render_return_periods()
+    with tab_forecast:
+        _render_forecast()
+
+def _render_return_periods():
+    # 1) Head series
+    archive = SeriesArchive(ARCHIVE_DIR)
+    source = st.radio("Head series source", ["CSV", "Series archive"] if len(archive) else ["CSV"], horizontal=True)
+    if source == "CSV":
+        location = str(OUTPUT_SHEETS)
+        key = tuple((f.stem, f.stat().st_mtime) for f in sorted(OUTPUT_SHEETS.glob("*.csv")))
+    else:
+        location = str(archive.root)
+        key = tuple((series_id, f"{row.version}-{row.n}") for series_id, row in archive.index.iterrows())
+    heads = _load_heads(source, location, key)
+    if not heads:
+        st.warning("No head series found.")
+        return
+
+    # 2) Method
+    col1, col2 = st.columns(2)
+    with col1:
+        method = st.selectbox("Method", ["Peaks over threshold (GPD)", "Annual maxima (GEV)"],
+                              help="Short records have too few years for annual maxima; use peaks over threshold.")
+    distribution = "gpd" if method.startswith("Peaks") else "gev"
+    with col2:
+        if distribution == "gpd":
+            quantile = st.slider("Threshold (quantile of the daily maxima)", 0.80, 0.995, 0.95, 0.005)
+            run = st.number_input("Days between independent peaks", 1, 60, 7)
+            settings = (("quantile", quantile), ("run", int(run)))
+        else:
+            min_coverage = st.slider("Minimum data coverage per hydrological year", 0.5, 1.0, 0.8, 0.05)
+            settings = (("min_coverage", min_coverage), ("year_start", 4))
+
+    # 3) All wells in one vectorized fit
+    params = _fit(source, location, key, distribution, settings)
+    levels = return_levels(params, RETURN_PERIODS)
+    table = pd.concat([params[["n", "shape", "scale", "threshold", "rate"]],
+                       levels.add_prefix("T=").add_suffix(" jaar")], axis=1)
+    fitted = params["shape"].notna()
+    st.subheader(f"Return levels ({fitted.sum()} of {len(params)} series fitted)")
+    st.dataframe(table[fitted].round(3), use_container_width=True)
+    st.download_button("Download CSV", table.to_csv().encode(), f"terugkeertijden_{distribution}.csv", "text/csv")
+
+    # 4) Return level plot of one well
+    names = list(params.index[fitted])
+    if not names:
+        st.warning("No series has enough extremes for a fit.")
+        return
+    name = st.selectbox("Series", names)
+    head = heads[name]
+    row = params.loc[[name]]
+    if distribution == "gev":
+        s = dict(settings)
+        extremes = annual_maxima(head.to_frame(), year_start=s["year_start"], min_coverage=s["min_coverage"])[name]
+        empirical = plotting_positions(extremes)
+    else:
+        s = dict(settings)
+        peaks = peaks_over_threshold(head, quantile=s["quantile"], run=s["run"])
+        empirical = plotting_positions(peaks, rate=row["rate"].iat[0])
+    if row["n"].iat[0] < 10:
+        st.info(f"Only {row['n'].iat[0]} extremes: the fitted tail is very uncertain.")
+
+    periods = np.geomspace(1.1, 200, 100)
+    curve = return_levels(row, periods).iloc[0]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=periods, y=curve.values, mode="lines", name=f"{distribution.upper()} fit"))
+    fig.add_trace(go.Scatter(x=empirical["return_period"], y=empirical["head"], mode="markers", name="Observed"))
+    fig.update_layout(
+        title=f"Return levels: {name}",
+        xaxis=dict(title="Return period (years)", type="log"),
+        yaxis_title="Head",
+        template="plotly_white"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def _render_forecast():
+    # 1) Solved models
+    files = sorted([*MODELS_DIR.glob("*.pas"), *MODELS_DIR.glob("*.pasz")])
+    if not files:
+        st.warning(f"No solved models found in {MODELS_DIR}.")
+        return
+    names = st.multiselect("Models", [f.name for f in files],
+                           default=[f.name for f in files if "_Best_Fit" in f.name] or [files[0].name])
+    if not names:
+        return
+
+    # 2) Scenarios
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        scenarios = st.multiselect("Scenarios", list(delta_scenarios()), default=["reference", "dry", "wet"],
+                                   help="Resampled historical years, with the monthly delta-change factors of "
+                                        "the scenario on precipitation and evaporation")
+    with col2:
+        n = st.slider("Synthetic futures per scenario", 20, 1000, 200, 20)
+    with col3:
+        horizon = st.slider("Horizon (years)", 1, 30, 10)
+    if not scenarios:
+        return
+
+    mtimes = {f.name: f.stat().st_mtime for f in files}
+    bands = _forecast(tuple((name, mtimes[name]) for name in names), n, horizon, tuple(scenarios))
+    failed = [name for name in names if name not in bands]
+    if failed:
+        st.warning(f"No forecast for {', '.join(failed)} (unsupported model, see the log).")
+    if not bands:
+        return
+
+    # 3) Summary: median and 90% band of every scenario at the end of the horizon
+    rows = {}
+    for name, b in bands.items():
+        last = b.iloc[-1]
+        for scenario in b.columns.unique("scenario"):
+            q = last[scenario]
+            rows[name, scenario] = {"median": q[0.5], "5%": q[0.05], "95%": q[0.95],
+                                    "mean median": b[scenario, 0.5].mean()}
+    st.subheader(f"Forecast at {bands[next(iter(bands))].index[-1].date()}")
+    st.dataframe(pd.DataFrame(rows).T.rename_axis(["model", "scenario"]).round(3), use_container_width=True)
+
+    # 4) Bands of one model
+    name = st.selectbox("Model", list(bands))
+    b = bands[name]
+    observed, simulated = _history(name, mtimes[name])
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=simulated.index, y=simulated.values, mode="lines", name="Simulated",
+                             line=dict(color="grey")))
+    fig.add_trace(go.Scatter(x=observed.index, y=observed.values, mode="markers", name="Observed",
+                             marker=dict(size=3, color="black")))
+    colors = ["#1f77b4", "#d62728", "#2ca02c", "#9467bd", "#ff7f0e", "#8c564b"]
+    for i, scenario in enumerate(b.columns.unique("scenario")):
+        color = colors[i % len(colors)]
+        q = b[scenario]
+        fig.add_trace(go.Scatter(x=np.concatenate([q.index, q.index[::-1]]),
+                                 y=np.concatenate([q[0.95], q[0.05][::-1]]), fill="toself", opacity=0.2,
+                                 line=dict(width=0, color=color), name=f"{scenario} 5-95%", hoverinfo="skip"))
+        fig.add_trace(go.Scatter(x=q.index, y=q[0.5], mode="lines", line=dict(color=color),
+                                 name=f"{scenario} median"))
+    fig.update_layout(
+        title=f"Forecast: {name}",
+        xaxis_title="Date",
+        yaxis_title="Head",
+        template="plotly_white"
+    )
+    st.plotly_chart(fig, use_container_width=True)
@@ -1,48 +1,78 @@
 # Shared utility functions for app_UI
+# KNMI data is served from the local cache of pastas_wv2030; only missing days are downloaded.
+import uuid
+
 import pandas as pd
-import numpy as np
-import requests
-from io import StringIO
+import streamlit as st
+
+from pastas_wv2030.config import JOB_QUEUE
+from pastas_wv2030.jobs import FINISHED, JobQueue
+from pastas_wv2030.knmi import fetch_knmi_prec_evap
+
+# Seconds between looks at the queue while a job of the page runs
+POLL_SECONDS = 2
+
+# — Job queue: heavy work is submitted to the worker service (python -m scripts.job_worker) and
+# polled, so it never blocks a session and several users can queue long runs side by side.
+def session_owner() -> str:
+    """Owner of the jobs submitted from this browser session."""
+    return st.session_state.setdefault("job_owner", uuid.uuid4().hex[:8])
+
+def submit_job(kind: str, params: dict, reuse: bool = False) -> int:
+    """Queue a job for the worker; with reuse, an identical queued, running or finished job is returned instead."""
+    with JobQueue(JOB_QUEUE) as queue:
+        if queue.workers().empty:
+            st.warning("No job worker is running; the job waits in the queue until one is started with "
+                       "`python -m scripts.job_worker`.")
+        return queue.submit(kind, params, owner=session_owner(), reuse=reuse)
 
-def fetch_knmi_prec_evap(station: int, start_date: str, end_date: str):
+def _new_events(queue: JobQueue, job_id: int) -> list:
+    """All streamed results of a job; only the ones since the last look are read from the queue."""
+    last, payloads = st.session_state.get(f"job_events_{job_id}", (0, []))
+    events = queue.events(job_id, after=last)
+    if events:
+        last, payloads = events[-1][0], payloads + [payload for _, payload in events]
+        st.session_state[f"job_events_{job_id}"] = (last, payloads)
+    return payloads
+
+def _job_panel(job_id: int, results: bool):
+    with JobQueue(JOB_QUEUE) as queue:
+        job = queue.get(job_id)
+        payloads = _new_events(queue, job_id) if results else []
+    if job["status"] in FINISHED and st.session_state.get(f"job_status_{job_id}") not in FINISHED:
+        # Finished since the page was drawn: rerun it, which stops the polling and shows the result
+        st.rerun()
+    if job["status"] == "queued":
+        st.info(f"Job {job_id} ({job['kind']}) is waiting for a worker...")
+    elif job["status"] == "running":
+        st.progress(min(max(job["progress"] or 0.0, 0.0), 1.0), text=f"Job {job_id}: {job['message'] or 'running'}")
+    elif job["status"] == "failed":
+        st.error(f"Job {job_id} failed: {job['error']}")
+    elif job["status"] == "cancelled":
+        st.warning(f"Job {job_id} was cancelled.")
+    if job["status"] not in FINISHED and st.button("Cancel", key=f"cancel_job_{job_id}"):
+        with JobQueue(JOB_QUEUE) as queue:
+            queue.cancel(job_id)
+    if payloads:
+        st.dataframe(pd.DataFrame(payloads), use_container_width=True)
+
+def show_job(job_id: int, results: bool = False) -> dict:
     """
-    Fetch KNMI daily data and compute precipitation and evapotranspiration (Hargreaves).
+    Status of a job, refreshed every POLL_SECONDS until it finished.
+
+    Parameters:
+    - job_id (int): Job in the queue
+    - results (bool): Also show the results it streams, as a table that grows while it runs
+
+    Returns:
+    - job (dict): The job as it was when the page was drawn (see JobQueue.get)
     """
-    url = "https://www.daggegevens.knmi.nl/klimatologie/daggegevens"
-    params = {
-        "start": start_date,
-        "end": end_date,
-        "stns": str(station),
-        "vars": "Q:RH:TN:TX:TG",
-        "fmt": "csv"
-    }
-    response = requests.post(url, data=params)
-    response.raise_for_status()
-    csv_data = "\n".join(
-        line for line in response.text.splitlines() if not line.startswith("#")
-    )
-    knmi_df = pd.read_csv(StringIO(csv_data), header=None)
-    knmi_df.columns = ["STN", "DATE", "Q", "RH", "TN", "TX", "TG"]
-    knmi_df["DATE"] = pd.to_datetime(knmi_df["DATE"], format="%Y%m%d")
-    knmi_df["Q"] = knmi_df["Q"] * 0.01
-    knmi_df["RH"] = knmi_df["RH"] / 10.0
-    knmi_df["TN"] = knmi_df["TN"] / 10.0
-    knmi_df["TX"] = knmi_df["TX"] / 10.0
-    knmi_df["TG"] = knmi_df["TG"] / 10.0
-    knmi_df.rename(columns={
-        "Q": "Radiation",
-        "RH": "Precipitation",
-        "TN": "Tmin",
-        "TX": "Tmax",
-        "TG": "Tavg"
-    }, inplace=True)
-    def hargreaves_pet(row):
-        t_avg, t_max, t_min, ra = row["Tavg"], row["Tmax"], row["Tmin"], row["Radiation"]
-        if np.isnan(t_avg) or np.isnan(t_max) or np.isnan(t_min) or np.isnan(ra):
-            return np.nan
-        return 0.0023 * (t_avg + 17.8) * np.sqrt(t_max - t_min) * ra
-    knmi_df["ET"] = knmi_df.apply(hargreaves_pet, axis=1)
-    knmi_df = knmi_df.set_index("DATE")
-    prec = (knmi_df['Precipitation']).astype(float)
-    evap = (knmi_df['ET']).astype(float)
-    return prec, evap
+    with JobQueue(JOB_QUEUE) as queue:
+        job = queue.get(job_id)
+    if job is None:
+        st.error(f"Job {job_id} is not in the queue.")
+        return {"status": "failed"}
+    st.session_state[f"job_status_{job_id}"] = job["status"]
+    run_every = None if job["status"] in FINISHED else POLL_SECONDS
+    st.fragment(_job_panel, run_every=run_every)(job_id, results)
+    return job
@@ -0,0 +1,71 @@
+# Benchmark: loading binary .pasz model files against ps.io.load of .pas files
+#
+#   python -m benchmarks.bench_modelfile --copies 25
+import argparse
+import filecmp
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import pastas as ps
+from pastas.io import pas
+
+from pastas_wv2030.config import MODELS_DIR
+from pastas_wv2030.modelfile import ModelFile, load_model, pas_to_pasz, pasz_to_pas
+
+
+def timed(func, files):
+    start = time.perf_counter()
+    for path in files:
+        func(path)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark .pasz against .pas model files.")
+    parser.add_argument("--input-dir", type=Path, default=MODELS_DIR)
+    parser.add_argument("--copies", type=int, default=25, help="Copies of every model, to time many files")
+    args = parser.parse_args(argv)
+    ps.set_log_level("ERROR")
+
+    sources = sorted(args.input_dir.glob("*.pas"))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        pas_files, deflated, stored = [], [], []
+        for i in range(args.copies):
+            for src in sources:
+                pas_files.append(shutil.copy(src, tmp / f"{src.stem}_{i}.pas"))
+        for src in sources:
+            deflated.append(pas_to_pasz(src, tmp / f"{src.stem}.pasz"))
+            stored.append(pas_to_pasz(src, tmp / f"{src.stem}.stored.pasz", compression=zipfile.ZIP_STORED))
+            # The round trip must give back the same .pas file
+            assert filecmp.cmp(src, pasz_to_pas(deflated[-1], tmp / f"{src.stem}.roundtrip.pas"), shallow=False)
+        deflated, stored = deflated * args.copies, stored * args.copies
+        print(f"{len(pas_files)} models ({len(sources)} files x {args.copies} copies)")
+
+        sizes = {
+            ".pas": sum(Path(p).stat().st_size for p in pas_files),
+            ".pasz (deflated)": sum(p.stat().st_size for p in deflated),
+            ".pasz (stored)": sum(p.stat().st_size for p in stored),
+        }
+        t_pas = timed(ps.io.load, pas_files)
+        # Reading the data apart from building the model (the stress models recompute their stresses)
+        timings = {
+            "pas.load, data only": (timed(pas.load, pas_files), sizes[".pas"]),
+            "ModelFile.data": (timed(lambda p: ModelFile(p).data(), deflated), sizes[".pasz (deflated)"]),
+            "ps.io.load (.pas)": (t_pas, sizes[".pas"]),
+            "load_model (deflated)": (timed(load_model, deflated), sizes[".pasz (deflated)"]),
+            "load_model (stored)": (timed(load_model, stored), sizes[".pasz (stored)"]),
+            "parameters + stats only": (timed(lambda p: (ModelFile(p).parameters, ModelFile(p).stats), deflated),
+                                        sizes[".pasz (deflated)"]),
+        }
+    print(f"{'':<26}{'total':>10}{'per model':>12}{'speedup':>10}{'disk':>10}")
+    for label, (seconds, size) in timings.items():
+        print(f"{label:<26}{seconds:9.2f}s{1000 * seconds / len(pas_files):10.1f}ms"
+              f"{t_pas / seconds:9.1f}x{size / 2**20:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Benchmark: vectorized PET kernels against the former row-wise DataFrame.apply path
+#
+#   python -m benchmarks.bench_pet --stations 10 --years 40
+import argparse
+import time
+
+import numpy as np
+
+from pastas_wv2030.knmi_server import synthetic_knmi_frame
+from pastas_wv2030.pet import pet_from_frame, pet_wide
+
+
+def hargreaves_pet(row):
+    # The implementation that used to be copied into every fetch_knmi_prec_evap
+    t_avg, t_max, t_min, ra = row["Tavg"], row["Tmax"], row["Tmin"], row["Radiation"]
+    if np.isnan(t_avg) or np.isnan(t_max) or np.isnan(t_min) or np.isnan(ra):
+        return np.nan
+    return 0.0023 * (t_avg + 17.8) * np.sqrt(t_max - t_min) * ra
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PET kernels against DataFrame.apply.")
+    parser.add_argument("--stations", type=int, default=10)
+    parser.add_argument("--years", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    knmi_df = synthetic_knmi_frame(range(args.stations), "1980-01-01",
+                                   f"{1979 + args.years}-12-31")
+    # Sprinkle missing values, as in real KNMI records
+    rng = np.random.default_rng(1)
+    knmi_df.loc[rng.random(len(knmi_df)) < 0.01, "Tmax"] = np.nan
+    print(f"{args.stations} stations x {args.years} years = {len(knmi_df):,} station-days")
+
+    t_apply, expected = best_of(lambda: knmi_df.apply(hargreaves_pet, axis=1), 1)
+    t_long, long = best_of(lambda: pet_from_frame(knmi_df), args.repeat)
+    t_wide, wide = best_of(lambda: pet_wide(knmi_df), args.repeat)
+    t_makkink, _ = best_of(lambda: pet_wide(knmi_df, "makkink"), args.repeat)
+
+    np.testing.assert_allclose(long.values, expected.values, equal_nan=True)
+    np.testing.assert_allclose(wide.stack(future_stack=True).values,
+                               expected.set_axis(knmi_df.set_index(["DATE", "STN"]).index).sort_index().values,
+                               equal_nan=True)
+
+    print(f"{'apply (row-wise)':<24}{t_apply:10.3f} s")
+    print(f"{'hargreaves, long frame':<24}{t_long:10.4f} s  ({t_apply / t_long:,.0f}x)")
+    print(f"{'hargreaves, 2-D wide':<24}{t_wide:10.4f} s  ({t_apply / t_wide:,.0f}x)")
+    print(f"{'makkink, 2-D wide':<24}{t_makkink:10.4f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Benchmark: adaptive model selection (selection.run_selection) against fitting the full grid
+#
+#   python -m benchmarks.bench_selection --pattern "86349-1 HB011*" --wells 1
+import argparse
+import time
+
+import pastas as ps
+
+from pastas_wv2030.batch import RECHARGE_MODELS, RESPONSE_FUNCTIONS, make_jobs, run_batch
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, OUTPUT_SHEETS
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+from pastas_wv2030.selection import CRITERIA, run_selection
+
+
+class SolveCounter:
+    """Counts the ml.solve calls made in this process (so run with max_workers=1)."""
+
+    def __init__(self):
+        self.calls = 0
+        self._solve = ps.Model.solve
+
+    def __enter__(self):
+        counter = self
+
+        def solve(ml, *args, **kwargs):
+            counter.calls += 1
+            return counter._solve(ml, *args, **kwargs)
+
+        ps.Model.solve = solve
+        return self
+
+    def __exit__(self, *exc):
+        ps.Model.solve = self._solve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark adaptive model selection against the full grid.")
+    parser.add_argument("--pattern", default="*.csv", help="Glob pattern for the head CSVs")
+    parser.add_argument("--wells", type=int, default=2)
+    parser.add_argument("--recharge", nargs="+", default=list(RECHARGE_MODELS), choices=list(RECHARGE_MODELS))
+    parser.add_argument("--rfunc", nargs="+", default=list(RESPONSE_FUNCTIONS), choices=list(RESPONSE_FUNCTIONS))
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--criterion", default="AIC", choices=CRITERIA)
+    args = parser.parse_args(argv)
+    ps.set_log_level("ERROR")
+
+    prec, evap = read_timeseries_csv(DEFAULT_PREC_FILE), read_timeseries_csv(DEFAULT_EVAP_FILE)
+    heads = {}
+    for path in sorted(OUTPUT_SHEETS.glob(args.pattern)):
+        head = aggregate_daily(read_head_csv(path), "median").dropna()
+        if len(head) > 180:  # half a year of data, so every variant can be fitted
+            heads[path.stem] = head
+        if len(heads) == args.wells:
+            break
+    jobs = make_jobs(heads, args.recharge, args.rfunc, tarso=False)
+    print(f"{len(jobs)} models on {len(heads)} wells")
+    # Compile the numba kernels of the recharge models outside the timings
+    run_batch({k: heads[k] for k in list(heads)[:1]}, prec, evap, jobs[:1], max_workers=1)
+
+    with SolveCounter() as counter:
+        start = time.perf_counter()
+        grid, _ = run_batch(heads, prec, evap, jobs, max_workers=1)
+        grid_time, grid_solves = time.perf_counter() - start, counter.calls
+    with SolveCounter() as counter:
+        start = time.perf_counter()
+        selected, _, screening = run_selection(heads, prec, evap, jobs, args.top_k, args.criterion, max_workers=1)
+        select_time, select_solves = time.perf_counter() - start, counter.calls
+
+    print(f"{'':<10}{'wall time':>12}{'ml.solve':>10}{'nfev':>8}")
+    print(f"{'grid':<10}{grid_time:11.1f}s{grid_solves:10d}{int(grid['nfev'].sum()):8d}")
+    print(f"{'selection':<10}{select_time:11.1f}s{select_solves:10d}"
+          f"{int(screening['nfev'].sum() + selected['nfev'].sum()):8d}")
+    print(f"screening: {int(screening['solves'].sum())} of {len(screening)} variants fitted, "
+          f"{screening['solve_time'].sum():.1f} s")
+
+    best = grid.sort_values(args.criterion).groupby("file").head(1).set_index("file")
+    chosen = selected[selected["chosen"]].set_index("file")
+    for file in heads:
+        print(f"{file}: grid best {best.at[file, 'model']} ({best.at[file, args.criterion]:.1f}), "
+              f"chosen {chosen.at[file, 'model']} ({chosen.at[file, args.criterion]:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Benchmark: chunked daily aggregation (streaming.read_daily_heads) against the wide-frame loading of
+# MONTECARLO_Test_Batch (read every export whole, pd.concat(axis=1), then resample)
+#
+#   python -m benchmarks.bench_streaming --wells 4 --years 1
+import argparse
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pastas_wv2030.config import INPUT_DIR
+from pastas_wv2030.streaming import read_daily_heads
+
+
+def measure(func):
+    """Run func twice: once for the time, once under tracemalloc for the peak memory."""
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+def wide_beemster(paths):
+    # The loading cells of MONTECARLO_Test_Batch
+    head_series = []
+    for path in paths:
+        df = pd.read_excel(path, header=None, skiprows=1, usecols=[0, 1], names=["timestamp", "head"],
+                           engine="openpyxl")
+        df["timestamp"] = pd.to_datetime(df["timestamp"], dayfirst=True, errors="raise")
+        df.set_index("timestamp", inplace=True)
+        df = df[~df.index.duplicated(keep="first")]
+        head_series.append(df["head"].rename(path.stem))
+    heads_df = pd.concat(head_series, axis=1) / 100
+    return heads_df.resample("D").mean()
+
+
+def wide_csv(paths):
+    head_series = []
+    for path in paths:
+        df = pd.read_csv(path, parse_dates=["Timestamp"], index_col="Timestamp")
+        head_series.append(df["head"][~df.index.duplicated(keep="first")].rename(path.stem))
+    return pd.concat(head_series, axis=1).resample("D").mean()
+
+
+def write_logger_csvs(folder: Path, wells: int, years: float, seed: int = 0) -> list:
+    """Minute logger series with staggered periods, so the wide frame is mostly empty."""
+    rng = np.random.default_rng(seed)
+    n = int(years * 365.25 * 1440)
+    paths = []
+    for i in range(wells):
+        index = pd.date_range(pd.Timestamp("2015-01-01") + pd.Timedelta(days=200 * i), periods=n, freq="min")
+        head = -1.5 + 0.3 * np.sin(np.arange(n) / (1440 * 58)) + rng.normal(0, 0.01, n).cumsum() / 100
+        path = folder / f"logger_{i}.csv"
+        pd.DataFrame({"Timestamp": index.strftime("%Y-%m-%d %H:%M:%S"), "head": head.round(4)}).to_csv(
+            path, index=False)
+        paths.append(path)
+    return paths
+
+
+def report(name, wide, streamed):
+    (wide_df, wide_s, wide_mb), (heads, stream_s, stream_mb) = wide, streamed
+    differ = 0
+    for series_id, daily in heads.items():
+        expected = wide_df[series_id].dropna()
+        assert daily.index.equals(expected.index)
+        differ += int((~np.isclose(daily.to_numpy(), expected.to_numpy(), rtol=1e-12)).sum())
+    cells = wide_df.size
+    filled = sum(len(daily) for daily in heads.values())
+    print(f"{name}: {len(heads)} series, {filled} daily values ({cells} cells in the wide frame)")
+    if differ:
+        # Repeated hours at the end of summer time whose first row is empty: the notebook keeps
+        # the empty row of the duplicate timestamp, the streaming reader the measured one
+        print(f"  {differ} days differ (duplicate timestamps with an empty first row)")
+    print(f"  wide frame:  {wide_s:7.2f} s  peak {wide_mb:8.1f} MB")
+    print(f"  streaming:   {stream_s:7.2f} s  peak {stream_mb:8.1f} MB  (x{wide_mb / stream_mb:.1f} less memory)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark chunked daily aggregation of logger exports.")
+    parser.add_argument("--wells", type=int, default=4, help="Number of synthetic minute logger series")
+    parser.add_argument("--years", type=float, default=1, help="Length of every synthetic series")
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore")
+
+    paths = sorted((INPUT_DIR / "input_beemster").glob("*.xlsx"))
+    report("Beemster exports (hourly)", measure(lambda: wide_beemster(paths)),
+           measure(lambda: read_daily_heads([(p, "beemster") for p in paths], "mean", args.chunksize, 1)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_logger_csvs(Path(tmp), args.wells, args.years)
+        report(f"Synthetic loggers (minutes, {args.years:g} years)", measure(lambda: wide_csv(paths)),
+               measure(lambda: read_daily_heads([(p, "csv") for p in paths], "mean", args.chunksize, 1)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Benchmark: warm-started grid calibration (solve_well) against cold starts of every variant
+#
+#   python -m benchmarks.bench_warm_start --wells 2 --recharge Linear FlexModel
+import argparse
+import time
+
+import pastas as ps
+
+from pastas_wv2030.batch import RECHARGE_MODELS, RESPONSE_FUNCTIONS, make_jobs, run_batch
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, OUTPUT_SHEETS
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark warm against cold starts of the model grid.")
+    parser.add_argument("--pattern", default="*.csv", help="Glob pattern for the head CSVs")
+    parser.add_argument("--wells", type=int, default=2)
+    parser.add_argument("--recharge", nargs="+", default=["Linear", "FlexModel"], choices=list(RECHARGE_MODELS))
+    parser.add_argument("--rfunc", nargs="+", default=list(RESPONSE_FUNCTIONS), choices=list(RESPONSE_FUNCTIONS))
+    parser.add_argument("--no-noise", action="store_true")
+    parser.add_argument("--two-step", action="store_true", help="Warm runs solve without noise model first")
+    args = parser.parse_args(argv)
+    ps.set_log_level("ERROR")
+
+    prec, evap = read_timeseries_csv(DEFAULT_PREC_FILE), read_timeseries_csv(DEFAULT_EVAP_FILE)
+    heads = {}
+    for path in sorted(OUTPUT_SHEETS.glob(args.pattern)):
+        head = aggregate_daily(read_head_csv(path), "median").dropna()
+        if len(head) > 180:  # half a year of data, so every variant can be fitted
+            heads[path.stem] = head
+        if len(heads) == args.wells:
+            break
+    jobs = make_jobs(heads, args.recharge, args.rfunc, tarso=False, noise=not args.no_noise)
+    print(f"{len(jobs)} models on {len(heads)} wells")
+    # Compile the numba kernels of the recharge models outside the timings
+    run_batch({k: heads[k] for k in list(heads)[:1]}, prec, evap, jobs[:1], max_workers=1, warm_start=False)
+
+    results = {}
+    for label, warm_start in (("cold", False), ("warm", True)):
+        start = time.perf_counter()
+        df, _ = run_batch(heads, prec, evap, jobs, max_workers=1, warm_start=warm_start,
+                          two_step=args.two_step)
+        results[label] = (time.perf_counter() - start, df.set_index("model"))
+
+    print(f"{'':<8}{'wall time':>12}{'nfev':>8}{'failed':>8}{'median EVP':>12}")
+    for label, (seconds, df) in results.items():
+        print(f"{label:<8}{seconds:11.1f}s{int(df['nfev'].sum()):8d}{df['error'].notna().sum():8d}"
+              f"{df['EVP'].median():12.2f}")
+    (t_cold, cold), (t_warm, warm) = results["cold"], results["warm"]
+    diff = (warm["EVP"] - cold["EVP"]).dropna()
+    print(f"saved: {t_cold - t_warm:.1f} s ({1 - t_warm / t_cold:.0%}), "
+          f"{int(cold['nfev'].sum() - warm['nfev'].sum())} function evaluations "
+          f"({1 - warm['nfev'].sum() / cold['nfev'].sum():.0%})")
+    print(f"EVP warm - cold: {(diff > 0.1).sum()} better, {(diff < -0.1).sum()} worse, "
+          f"{(diff.abs() <= 0.1).sum()} equal (within 0.1)")
+    columns = ["EVP", "nfev", "solve_time"]
+    print((warm[columns].join(cold[columns], lsuffix="_warm", rsuffix="_cold")).round(2)
+          .to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+# Benchmark suite for the data pipeline and calibration hot paths, on the bundled input_files.
+# Every run is written to benchmarks/results/ as JSON; compare two runs to find regressions.
+#
+#   python -m benchmarks.suite                       # everything (a few minutes)
+#   python -m benchmarks.suite --filter "io.*" "pet.*"
+#   python -m benchmarks.suite --compare benchmarks/results/<older run>.json
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pastas as ps
+
+from pastas_wv2030.batch import RECHARGE_MODELS, RESPONSE_FUNCTIONS, build_model, make_jobs, run_batch
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, INPUT_DIR, PROJECT_ROOT
+from pastas_wv2030.forecast import DELTA_SCENARIOS, complete_years, simulate_scenarios, year_plan
+from pastas_wv2030.ingest import parse_file
+from pastas_wv2030.knmi import parse_knmi_csv
+from pastas_wv2030.knmi_server import synthetic_knmi_frame, to_knmi_csv
+from pastas_wv2030.modelfile import dump_model, load_model
+from pastas_wv2030.pet import pet_wide
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+from pastas_wv2030.streaming import stream_file
+from pastas_wv2030.uncertainty import prediction_bands
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+# A change of more than this fraction in the median time is reported by --compare
+THRESHOLD = 0.2
+
+# Raw head data of one well (hourly, non-ISO dates) and the well used for the model fits
+HEAD_CSV = INPUT_DIR / "input_head" / "13_7_HB28_PB1.csv"
+SOURCES = {
+    "fugro": INPUT_DIR / "raw_batch_fugro" / "Fugro_Hoorn_Zuiderdijk.xlsx",
+    "geoloket": INPUT_DIR / "raw_batch_geoloket" / "88111-1.xlsx",
+    "beemster": INPUT_DIR / "input_beemster" / "BE0049_00_INST_B_GMW_PB1_F-365.xlsx",
+}
+
+CASES = {}
+
+
+def benchmark(name: str, repeat: int = 5, warmup: bool = True):
+    """
+    Register a benchmark.
+
+    The decorated function does the (untimed) setup and returns the function to time.
+
+    Parameters:
+    - name (str): Dotted name, e.g. 'io.read_head_csv'
+    - repeat (int): Number of timed calls
+    - warmup (bool): Call once before timing (imports, caches, numba compilation)
+    """
+    def register(setup):
+        CASES[name] = {"setup": setup, "repeat": repeat, "warmup": warmup}
+        return setup
+    return register
+
+
+_fixtures = {}
+
+
+def fixture(name: str):
+    """Shared inputs, loaded once per suite run."""
+    if name not in _fixtures:
+        if name == "stresses":
+            _fixtures[name] = read_timeseries_csv(DEFAULT_PREC_FILE), read_timeseries_csv(DEFAULT_EVAP_FILE)
+        elif name == "head":
+            _fixtures[name] = read_head_csv(HEAD_CSV)
+        elif name == "daily_head":
+            _fixtures[name] = aggregate_daily(fixture("head"), "median").dropna()
+        elif name == "knmi":
+            # KNMI data in the daggegevens layout: 10 stations x 25 years
+            _fixtures[name] = synthetic_knmi_frame(range(10), "2000-01-01", "2024-12-31")
+    return _fixtures[name]
+
+
+# Data pipeline
+
+@benchmark("io.read_stress_csv")
+def read_stress_csv():
+    return lambda: (read_timeseries_csv(DEFAULT_PREC_FILE), read_timeseries_csv(DEFAULT_EVAP_FILE))
+
+
+@benchmark("io.read_head_csv", repeat=3)
+def read_head():
+    return lambda: read_head_csv(HEAD_CSV)
+
+
+@benchmark("knmi.parse_csv")
+def knmi_parse_csv():
+    text = to_knmi_csv(fixture("knmi"))
+    return lambda: parse_knmi_csv(text)
+
+
+@benchmark("pet.hargreaves")
+def pet_hargreaves():
+    knmi_df = fixture("knmi")
+    return lambda: pet_wide(knmi_df, "hargreaves")
+
+
+@benchmark("pet.makkink")
+def pet_makkink():
+    knmi_df = fixture("knmi")
+    return lambda: pet_wide(knmi_df, "makkink")
+
+
+for _layout, _path in SOURCES.items():
+    benchmark(f"ingest.{_layout}", repeat=3)(lambda path=_path, layout=_layout: lambda: parse_file(path, layout))
+
+
+for _layout, _path in SOURCES.items():
+    benchmark(f"stream.{_layout}_daily", repeat=3)(lambda path=_path, layout=_layout: lambda: stream_file(path, layout))
+
+
+for _aggregation in ("mean", "median", "max"):
+    benchmark(f"resample.daily_{_aggregation}")(
+        lambda aggregation=_aggregation: (lambda head=fixture("head"): aggregate_daily(head, aggregation)))
+
+
+# Calibration
+
+def _solve_case(recharge: str, rfunc: str):
+    def setup():
+        prec, evap = fixture("stresses")
+        head = fixture("daily_head")
+
+        def solve():
+            # Building is part of the case: it validates the stresses for every model
+            ml = build_model(head, prec, evap, recharge, rfunc, noise=True)
+            ml.solve(tmin=head.index.min(), tmax=head.index.max(), solver=ps.LeastSquares(), report=False)
+            return ml
+        return solve
+    return setup
+
+
+for _recharge in RECHARGE_MODELS:
+    for _rfunc in RESPONSE_FUNCTIONS:
+        benchmark(f"solve.{_recharge}_{_rfunc}", repeat=1)(_solve_case(_recharge, _rfunc))
+benchmark("solve.Tarso_Exponential", repeat=1)(_solve_case("Tarso", "Exponential"))
+
+
+@benchmark("grid.one_well", repeat=1, warmup=False)
+def grid_one_well():
+    prec, evap = fixture("stresses")
+    heads = {HEAD_CSV.stem: fixture("daily_head")}
+    jobs = make_jobs(heads)
+    return lambda: run_batch(heads, prec, evap, jobs, max_workers=1)
+
+
+# Model files
+
+def _solved_model():
+    if "model" not in _fixtures:
+        _fixtures["model"] = _solve_case("FlexModel", "Exponential")()()
+    return _fixtures["model"]
+
+
+@benchmark("pas.save")
+def pas_save():
+    ml = _solved_model()
+    path = Path(tempfile.mkdtemp()) / "model.pas"
+    return lambda: ml.to_file(path)
+
+
+@benchmark("pas.load")
+def pas_load():
+    path = Path(tempfile.mkdtemp()) / "model.pas"
+    _solved_model().to_file(path)
+    return lambda: ps.io.load(path)
+
+
+@benchmark("pasz.save")
+def pasz_save():
+    ml = _solved_model()
+    path = Path(tempfile.mkdtemp()) / "model.pasz"
+    return lambda: dump_model(ml, path)
+
+
+@benchmark("pasz.load")
+def pasz_load():
+    path = dump_model(_solved_model(), Path(tempfile.mkdtemp()) / "model.pasz")
+    return lambda: load_model(path)
+
+
+# Forecasts: 200 resampled 10-year futures of the solved FlexModel
+
+@benchmark("forecast.batched")
+def forecast_batched():
+    ml = _solved_model()
+    plan = year_plan(complete_years(*fixture("stresses")), 200, 10)
+    return lambda: simulate_scenarios(ml, plan, factors=DELTA_SCENARIOS["dry"])
+
+
+# Monte Carlo uncertainty: 10,000 parameter sets of the solved FlexModel in one batched pass
+
+@benchmark("uncertainty.ensemble_10000", repeat=1)
+def uncertainty_ensemble():
+    ml = _solved_model()
+    return lambda: prediction_bands(ml, 10_000, seed=0)
+
+
+def environment() -> dict:
+    """Versions and machine, stored with every run so results are comparable."""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": {"pastas": ps.__version__, "numpy": np.__version__, "pandas": pd.__version__},
+    }
+
+
+def run_case(name: str) -> dict:
+    case = CASES[name]
+    func = case["setup"]()
+    if case["warmup"]:
+        func()
+    timings = []
+    for _ in range(case["repeat"]):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings), "mean": statistics.fmean(timings),
+            "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0, "repeat": len(timings)}
+
+
+def compare(results: dict, baseline: dict, threshold: float = THRESHOLD) -> list:
+    """
+    Compare the median times of two runs.
+
+    Returns:
+    - regressions (list of str): Benchmarks that became more than threshold slower
+    """
+    regressions = []
+    print(f"\nCompared to {baseline['environment'].get('commit')} ({baseline['environment'].get('date')}):")
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"  {name:<36}{old['median']:10.4f}s ->{result['median']:10.4f}s  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and store the timings as JSON.")
+    parser.add_argument("--filter", nargs="+", default=["*"], help="Glob patterns of the benchmarks to run")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="JSON file (default: benchmarks/results/<date>_<commit>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="Earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Relative change in the median time that counts as a regression")
+    args = parser.parse_args(argv)
+    ps.set_log_level("ERROR")
+    warnings.simplefilter("ignore")
+
+    names = [name for name in CASES if any(fnmatch.fnmatch(name, pattern) for pattern in args.filter)]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    env = environment()
+    results = {"environment": env, "results": {}}
+    for name in names:
+        try:
+            result = run_case(name)
+        except Exception as e:
+            print(f"{name:<36}FAILED: {e}")
+            continue
+        results["results"][name] = result
+        print(f"{name:<36}{result['median']:10.4f}s  (min {result['min']:.4f}s, n={result['repeat']})", flush=True)
+
+    output = args.output or RESULTS_DIR / f"{env['date'][:19].replace(':', '')}_{env['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=1))
+    print(f"Results saved to: {output}")
+
+    if args.compare is not None:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks slower than {args.compare.name}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Precomputed daily/weekly/monthly aggregates of the archived series, updated incrementally
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pastas_wv2030.archive import SeriesArchive, series_key
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = {"daily": "D", "weekly": "W", "monthly": "MS"}
+STATISTICS = ["mean", "median", "max", "min", "count"]
+
+
+def compute_aggregates(series: pd.Series, freq: str = "D") -> pd.DataFrame:
+    """
+    Aggregate a raw series per period.
+
+    Every period is labelled with its start (also for weeks), so the last label
+    tells from where a tail must be recomputed. Periods without data are left out.
+
+    Returns:
+    - agg (pd.DataFrame): One row per period, one column per statistic in STATISTICS
+    """
+    agg = series.resample(freq, label="left", closed="left").agg(STATISTICS)
+    agg = agg[agg["count"] > 0]
+    return agg.astype({"count": "int64"})
+
+
+def _agg_path(archive: SeriesArchive, series_id: str, freq: str):
+    return archive.root / "agg" / freq / f"{series_key(series_id)}.parquet"
+
+
+def _read_agg(path):
+    """Stored aggregates and the (version, n) of the raw series they were computed from."""
+    if not path.exists():
+        return None, None
+    table = pq.read_table(path)
+    meta = table.schema.metadata or {}
+    state = meta.get(b"raw_version", b"").decode(), int(meta.get(b"raw_n", b"-1"))
+    return table.to_pandas(), state
+
+
+def _write_agg(path, agg: pd.DataFrame, version: str, n: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(agg)
+    table = table.replace_schema_metadata({**table.schema.metadata,
+                                           b"raw_version": str(version).encode(),
+                                           b"raw_n": str(n).encode()})
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def update_aggregates(archive: SeriesArchive, series_id: str, freqs=("D", "W", "MS")) -> dict:
+    """
+    Bring the stored aggregates of one series up to date.
+
+    If only a tail was appended since the last update, just the last (possibly
+    incomplete) period and the new periods are recomputed from the raw rows;
+    if the series was replaced, everything is recomputed.
+
+    Returns:
+    - agg (dict): freq -> aggregates frame
+    """
+    meta = archive.index.loc[series_id]
+    version, n = str(meta.get("version")), int(meta["n"])
+    raw = None
+    result = {}
+    for freq in freqs:
+        path = _agg_path(archive, series_id, freq)
+        agg, state = _read_agg(path)
+        if agg is not None and state == (version, n):
+            result[freq] = agg
+            continue
+
+        if agg is not None and not agg.empty and state[0] == version and state[1] < n:
+            # Only a tail was appended: recompute from the start of the last stored period
+            since = agg.index.max()
+            tail = archive.load(series_id, start=since)
+            agg = pd.concat([agg[agg.index < since], compute_aggregates(tail, freq)])
+            logger.debug("%s [%s]: updated from %s", series_id, freq, since)
+        else:
+            if raw is None:
+                raw = archive.load(series_id)
+            agg = compute_aggregates(raw, freq)
+        _write_agg(path, agg, version, n)
+        result[freq] = agg
+    return result
+
+
+def load_aggregate(archive: SeriesArchive, series_id: str, freq: str = "D", stat: str = "mean") -> pd.Series:
+    """
+    One precomputed statistic of a series, e.g. the daily median.
+
+    The aggregates are (incrementally) updated first when they are missing or stale.
+    """
+    agg = update_aggregates(archive, series_id, freqs=(freq,))[freq]
+    return agg[stat].rename(series_id)
+
+
+def _update_one(root, series_id, freqs):
+    update_aggregates(SeriesArchive(root), series_id, freqs)
+
+
+def update_all(archive: SeriesArchive, freqs=("D", "W", "MS"), max_workers: int | None = None):
+    """Update the aggregates of every series in the archive, in parallel."""
+    series_ids = archive.ids()
+    if (max_workers or os.cpu_count()) == 1:
+        for series_id in series_ids:
+            update_aggregates(archive, series_id, freqs)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(_update_one, [archive.root] * len(series_ids), series_ids, [freqs] * len(series_ids),
+                      chunksize=8))
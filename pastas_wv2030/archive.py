@@ -0,0 +1,174 @@
+# Columnar archive of all (head) series, one Parquet dataset indexed by series ID
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+INDEX_COLUMNS = ["series_id", "source", "file", "sheet", "column", "unit", "start", "end", "n", "key", "version"]
+
+
+def sanitize_column_name(col_name: str) -> str:
+    """Make a name safe for use in file names (as in DATA_FUGRO_to_csv)."""
+    # Replace all non-alphanumeric characters with underscores
+    safe_name = re.sub(r'[^\w\-]', '_', col_name)
+    # Remove multiple underscores
+    safe_name = re.sub(r'__+', '_', safe_name)
+    # Strip leading/trailing underscores
+    return safe_name.strip('_')
+
+
+def series_key(series_id: str) -> str:
+    """Folder name of a series: readable, with a short hash so distinct IDs never collide."""
+    digest = hashlib.sha1(series_id.encode()).hexdigest()[:8]
+    return f"{sanitize_column_name(series_id)}-{digest}"
+
+
+class SeriesArchive:
+    """
+    Parquet archive with every series stored once, plus an index with metadata.
+
+    Layout:
+    - index.parquet: one row per series (INDEX_COLUMNS)
+    - raw/<key>/part-NNNNN.parquet: timestamp/value rows of one series; appended
+      data is written as a new part, so existing parts are never rewritten
+    - agg/<freq>/<key>.parquet: precomputed aggregates (see pastas_wv2030.aggregate)
+
+    The version in the index changes whenever a series is replaced (not when it
+    is appended to), so derived data can tell a new tail from a rewrite.
+
+    Loading a series by ID only touches its own folder.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._index = None
+
+    @property
+    def index(self) -> pd.DataFrame:
+        """Metadata of all series, indexed by series_id."""
+        if self._index is None:
+            path = self.root / "index.parquet"
+            if path.exists():
+                self._index = pd.read_parquet(path)
+            else:
+                self._index = pd.DataFrame(columns=INDEX_COLUMNS).set_index("series_id")
+        return self._index
+
+    def ids(self) -> list:
+        return list(self.index.index)
+
+    def __contains__(self, series_id):
+        return series_id in self.index.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def series_dir(self, series_id: str) -> Path:
+        return self.root / "raw" / series_key(series_id)
+
+    def parts(self, series_id: str) -> list:
+        return sorted(self.series_dir(series_id).glob("part-*.parquet"))
+
+    def write_series(self, series_id: str, series: pd.Series, meta: dict | None = None) -> dict:
+        """
+        Store a series, replacing any earlier version, and return its index row.
+
+        The index is updated in memory; call flush to write it.
+        """
+        series = _clean(series)
+        folder = self.series_dir(series_id)
+        folder.mkdir(parents=True, exist_ok=True)
+        for part in folder.glob("part-*.parquet"):
+            part.unlink()
+        _write_part(folder / "part-00000.parquet", series)
+        row = _index_row(series_id, series, meta)
+        self.update_index([row])
+        return row
+
+    def append_series(self, series_id: str, series: pd.Series) -> pd.Series:
+        """
+        Append the rows of series after the current end of a stored series.
+
+        Returns:
+        - appended (pd.Series): The rows that were actually new
+        """
+        if series_id not in self:
+            raise KeyError(f"Series not in archive: {series_id}")
+        end = self.index.at[series_id, "end"]
+        new = _clean(series)
+        new = new[new.index > end]
+        if new.empty:
+            return new
+        parts = self.parts(series_id)
+        number = int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+        _write_part(self.series_dir(series_id) / f"part-{number:05d}.parquet", new)
+
+        row = self.index.loc[series_id].to_dict()
+        row.update(series_id=series_id, end=new.index.max(), n=int(row["n"]) + len(new))
+        self.update_index([row])
+        self.flush()
+        return new
+
+    def load(self, series_id: str, start=None, end=None) -> pd.Series:
+        """Load one series by ID, optionally only the rows between start and end."""
+        parts = self.parts(series_id)
+        if not parts:
+            raise KeyError(f"Series not in archive: {series_id}")
+        filters = []
+        if start is not None:
+            filters.append(("timestamp", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("timestamp", "<=", pd.Timestamp(end)))
+        table = pq.read_table([str(p) for p in parts] if len(parts) > 1 else str(parts[0]),
+                              filters=filters or None)
+        df = table.to_pandas()
+        return pd.Series(df["value"].values, index=pd.DatetimeIndex(df["timestamp"].values, name="Timestamp"),
+                         name=series_id)
+
+    def load_many(self, series_ids) -> dict:
+        return {series_id: self.load(series_id) for series_id in series_ids}
+
+    def update_index(self, rows):
+        """Add or replace index rows (in memory; call flush to write them)."""
+        new = pd.DataFrame(rows, columns=INDEX_COLUMNS).set_index("series_id")
+        index = self.index
+        self._index = pd.concat([index.drop(new.index, errors="ignore"), new]) if len(index) else new
+        self._index = self._index.sort_index()
+
+    def flush(self):
+        """Write the index atomically."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / "index.parquet.tmp"
+        self.index.to_parquet(tmp)
+        os.replace(tmp, self.root / "index.parquet")
+
+
+def _clean(series: pd.Series) -> pd.Series:
+    series = pd.to_numeric(series, errors="coerce").dropna()
+    series.index = pd.DatetimeIndex(series.index)
+    series = series[~series.index.duplicated(keep="first")]
+    return series.sort_index().astype("float64")
+
+
+def _write_part(path: Path, series: pd.Series):
+    table = pa.table({"timestamp": series.index.values.astype("datetime64[ns]"), "value": series.values})
+    pq.write_table(table, path)
+
+
+def _index_row(series_id: str, series: pd.Series, meta: dict | None) -> dict:
+    row = dict.fromkeys(INDEX_COLUMNS)
+    row.update(meta or {})
+    row.update(
+        series_id=series_id,
+        start=series.index.min() if len(series) else pd.NaT,
+        end=series.index.max() if len(series) else pd.NaT,
+        n=len(series),
+        key=series_key(series_id),
+        version=uuid.uuid4().hex,
+    )
+    return row
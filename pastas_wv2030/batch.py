@@ -0,0 +1,499 @@
+# Parallel batch calibration of the recharge × response model grid
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+import pastas as ps
+
+from pastas_wv2030.profiling import ProfileLog, StageTimer, configure, merge_records, profile_job
+from pastas_wv2030.store import SOLVER_SETTINGS, RunStore, job_key, series_hash
+
+logger = logging.getLogger(__name__)
+
+# Component classes rather than instances: every job builds its own components,
+# so no (mutable) recharge model or response function is shared between models.
+RECHARGE_MODELS = {
+    "Linear": ps.rch.Linear,
+    "FlexModel": ps.rch.FlexModel,
+    "Berendrecht": ps.rch.Berendrecht,
+    "Direct": None,
+}
+RESPONSE_FUNCTIONS = {
+    "Exponential": ps.Exponential,
+    "Gamma": ps.Gamma,
+    "DoubleExponential": ps.DoubleExponential,
+    "Hantush": ps.Hantush,
+    "FourParam": ps.FourParam,
+}
+
+# Warm starts within the grid of one well: the response function whose solution is the
+# starting point, and parameters that are named differently (child suffix: parent suffix)
+# or start from a value that makes the child (nearly) equal to the parent
+WARM_STARTS = {
+    "Gamma": ("Exponential", {}),  # Gamma with n=1 is the Exponential
+    "DoubleExponential": ("Exponential", {"a1": "a"}),
+    "Hantush": ("Exponential", {"b": 1e-3}),  # Hantush with b -> 0 is the Exponential
+    # Not FourParam: started from the Gamma it needs about twice the (expensive, numerically
+    # integrated) evaluations of a cold start
+}
+# Warm starts stay off by default: a child started from a parent that explains (almost) nothing, as the
+# FlexModel and Berendrecht Exponentials on several wells do, ends in the same optimum without tripping
+# either guard (see benchmarks/bench_warm_start.py)
+# A warm fit whose EVP (%) is this much below that of the model it started from is solved cold as well
+WARM_START_EVP_DROP = 10.0
+# Warmup of ml.solve; the stresses are cut to the head period plus this warmup
+WARMUP = pd.Timedelta(3650, "D")
+
+METRIC_COLUMNS = ["EVP", "R2", "RMSE", "AIC", "BIC"]
+RESULT_COLUMNS = ["file", "model", "RechargeModel", "RechargeRfunc", *METRIC_COLUMNS, "nfev", "solve_time",
+                  "error"]
+DIAGNOSTICS_COLUMNS = ["model", "Test", "Checks", "Statistic", "P-value", "Reject H0 ($\\alpha$=0.05)"]
+
+# Stresses shared by all jobs in a worker process, set once by _init_worker
+_worker_stresses = {}
+
+
+def well_stress(stress, file: str) -> pd.Series:
+    """The stress of one well: stress is either one series for all wells or a dict of series per well."""
+    return stress[file] if isinstance(stress, dict) else stress
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    """One model fit: a head series combined with a recharge model and response function."""
+
+    file: str
+    recharge: str
+    rfunc: str
+    noise: bool = True
+
+    @property
+    def model_name(self) -> str:
+        return f"{self.file}_{self.recharge}_{self.rfunc}"
+
+
+def make_jobs(files, recharge_models=None, response_functions=None, tarso=True, noise=True) -> list[BatchJob]:
+    """
+    Build the job list for the full recharge × response grid.
+
+    Parameters:
+    - files (iterable of str): Names of the head series
+    - recharge_models (list of str): Keys of RECHARGE_MODELS, defaults to all
+    - response_functions (list of str): Keys of RESPONSE_FUNCTIONS, defaults to all
+    - tarso (bool): Also fit a TarsoModel (Exponential only) per series
+    - noise (bool): Add an ArNoiseModel to every model
+
+    Returns:
+    - jobs (list of BatchJob)
+    """
+    recharge_models = list(RECHARGE_MODELS) if recharge_models is None else recharge_models
+    response_functions = list(RESPONSE_FUNCTIONS) if response_functions is None else response_functions
+
+    jobs = []
+    for file in files:
+        for rch_name in recharge_models:
+            for rfunc_name in response_functions:
+                jobs.append(BatchJob(file, rch_name, rfunc_name, noise))
+        if tarso:
+            jobs.append(BatchJob(file, "Tarso", "Exponential", noise))
+    return jobs
+
+
+def build_model(head: pd.Series, prec: pd.Series, evap: pd.Series, recharge: str, rfunc: str,
+                noise: bool = True, name: str | None = None) -> ps.Model:
+    """
+    Build (but do not solve) a Pastas model for one recharge/response combination.
+
+    'Direct' convolves the net input prec - evap with the response function and
+    'Tarso' builds a TarsoModel, which only supports the Exponential response.
+    """
+    ml = ps.Model(head, name=name)
+    if recharge == "Tarso":
+        sm = ps.TarsoModel(
+            prec=prec,
+            evap=evap,
+            oseries=head,  # lets Tarso auto-set dmin/dmax
+            rfunc=ps.Exponential(),
+            name="tarso"
+        )
+    elif RECHARGE_MODELS[recharge] is None:
+        net_input = (prec - evap).rename("recharge")
+        sm = ps.StressModel(net_input, rfunc=RESPONSE_FUNCTIONS[rfunc](), name="direct", settings="prec")
+    else:
+        sm = ps.RechargeModel(
+            prec=prec,
+            evap=evap,
+            recharge=RECHARGE_MODELS[recharge](),
+            rfunc=RESPONSE_FUNCTIONS[rfunc](),
+            name="rch"
+        )
+    ml.add_stressmodel(sm)
+    if noise:
+        ml.add_noisemodel(ps.ArNoiseModel())
+    return ml
+
+
+def model_metrics(ml: ps.Model) -> dict:
+    """Goodness-of-fit statistics of a solved model, as reported by the batch notebooks."""
+    stats = ml.stats
+    return {
+        "EVP": stats.evp(),
+        "R2": stats.rsq(),
+        "RMSE": stats.rmse(),
+        "AIC": stats.aic(),
+        "BIC": stats.bic()
+    }
+
+
+def model_diagnostics(ml: ps.Model, name: str) -> pd.DataFrame:
+    """Residual diagnostics of a solved model in the long format of diagnostics_df."""
+    diag = ml.stats.diagnostics(alpha=0.05).copy()
+    diag["model"] = name
+    return diag.reset_index().rename(columns={"index": "Test"})
+
+
+def prepare_stresses(head: pd.Series, prec: pd.Series, evap: pd.Series, warmup: pd.Timedelta = WARMUP):
+    """
+    Cut the stresses to the period one well needs (its head period plus the warmup)
+    on their common dates, once for all variants of that well.
+
+    Returns:
+    - prec, evap (pd.Series): Aligned daily stresses
+    """
+    index = prec.index.intersection(evap.index)
+    index = index[(index >= head.index.min() - warmup) & (index <= head.index.max())]
+    return prec.reindex(index).astype(float), evap.reindex(index).astype(float)
+
+
+def warm_start_parameters(ml: ps.Model, optimal: pd.Series, aliases: dict | None = None) -> int:
+    """
+    Use the optimal parameters of a related model as the initial parameters of ml.
+
+    Parameters are matched by name, or by the names in aliases (e.g. {"a1": "a"}
+    maps rch_a1 to rch_a; a number is used as is); values are clipped to pmin/pmax.
+
+    Returns:
+    - n (int): Number of parameters that were set
+    """
+    aliases = aliases or {}
+    n = 0
+    for name, p in ml.parameters.iterrows():
+        prefix, _, suffix = name.rpartition("_")
+        alias = aliases.get(suffix, suffix)
+        if isinstance(alias, (int, float)):
+            value = alias
+        else:
+            value = optimal.get(name if name in optimal.index else f"{prefix}_{alias}")
+        if not p["vary"] or value is None or not np.isfinite(value):
+            continue
+        pmin = p["pmin"] if pd.notna(p["pmin"]) else -np.inf
+        pmax = p["pmax"] if pd.notna(p["pmax"]) else np.inf
+        ml.set_parameter(name, initial=float(np.clip(value, pmin, pmax)))
+        n += 1
+    return n
+
+
+def solve_job(job: BatchJob, head: pd.Series, prec: pd.Series, evap: pd.Series, warm: tuple | None = None,
+              two_step: bool = False):
+    """
+    Build and solve the model for one job.
+
+    A failing fit does not raise; it is reported through the 'error' field so a
+    batch keeps running.
+
+    Parameters:
+    - warm (tuple): (optimal parameters, aliases) of a related solved model to start from,
+      see warm_start_parameters
+    - two_step (bool): Solve without noise model first and start the fit with ArNoiseModel
+      from that solution
+
+    Returns:
+    - row (dict): One row of the results frame, plus the time per stage (build, solve, metrics,
+      diagnostics) and the peak memory when it is traced (see profiling.StageTimer)
+    - diagnostics (pd.DataFrame | None): Diagnostics rows, None if the fit failed
+    - parameters (pd.Series | None): Optimal parameters, None if the fit failed
+    """
+    row = {"file": job.file, "model": job.model_name, "RechargeModel": job.recharge, "RechargeRfunc": job.rfunc}
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        with profile_job(job.model_name):
+            two_step = two_step and job.noise
+            with timer.stage("build"):
+                ml = build_model(head, prec, evap, job.recharge, job.rfunc, noise=job.noise and not two_step,
+                                 name=job.model_name)
+                if warm is not None:
+                    warm_start_parameters(ml, *warm)
+            with timer.stage("solve"):
+                ml.solve(tmin=head.index.min(), tmax=head.index.max(), solver=ps.LeastSquares(), report=False)
+                nfev = ml.solver.nfev
+                if two_step:
+                    noise_free = ml.parameters["optimal"]
+                    ml.add_noisemodel(ps.ArNoiseModel())
+                    # The noise parameter of the warm-start model is a better guess than the default
+                    warm_start_parameters(ml, noise_free if warm is None else noise_free.combine_first(warm[0]))
+                    ml.solve(tmin=head.index.min(), tmax=head.index.max(), solver=ps.LeastSquares(), report=False)
+                    nfev += ml.solver.nfev
+            with timer.stage("metrics"):
+                row.update(model_metrics(ml))
+            with timer.stage("diagnostics"):
+                diagnostics = model_diagnostics(ml, job.model_name)
+        # obj_func is not a results column, but lets solve_well compare nested models
+        row.update(nfev=nfev, solve_time=time.perf_counter() - start, obj_func=ml.solver.obj_func, error=None,
+                   **timer.record())
+        return row, diagnostics, ml.parameters["optimal"]
+    except Exception as e:
+        logger.warning("Model %s failed: %s", job.model_name, e)
+        return {**failed_row(job, e), **timer.record()}, None, None
+
+
+def _warm_start_depth(rfunc: str) -> int:
+    return 1 + _warm_start_depth(WARM_STARTS[rfunc][0]) if rfunc in WARM_STARTS else 0
+
+
+def solve_well(jobs: list, head: pd.Series, prec: pd.Series, evap: pd.Series, known: dict | None = None,
+               warm_start: bool = False, two_step: bool = False) -> list:
+    """
+    Solve all jobs of one well, preparing the stresses once.
+
+    With warm_start, jobs are solved in the order of WARM_STARTS and start
+    from an earlier solution: a model with noise model from the noise-free
+    solution of the same model when there is one, otherwise from the solution of
+    its parent response function (e.g. Gamma from Exponential, with the same
+    recharge model and noise choice). Every child can reproduce its parent, so a
+    warm fit that ends with a higher objective function than its parent got
+    stuck and is solved again from the default initial parameters. The objective
+    function alone does not catch a warm fit that ends in a degenerate optimum (e.g.
+    a noise model that absorbs the whole signal at a slightly lower objective), so a
+    warm fit whose EVP is more than WARM_START_EVP_DROP below that of the model it
+    started from is also solved cold, and the fit with the higher EVP is kept.
+
+    Parameters:
+    - jobs (list of BatchJob): Jobs of one well
+    - known (dict): (recharge, rfunc, noise) -> (objective function, optimal parameters, EVP) of
+      models solved earlier (e.g. loaded from the run store); the EVP may be NaN when unknown
+    - warm_start (bool): Use warm starts; False (the default) solves every job independently
+    - two_step (bool): See solve_job; only used with warm_start
+
+    Returns:
+    - results (list of tuple): (job, row, diagnostics, parameters) per job
+    """
+    prec, evap = prepare_stresses(head, prec, evap)
+    solved = dict(known or {})
+    results = []
+    for job in sorted(jobs, key=lambda job: (_warm_start_depth(job.rfunc), job.noise)) if warm_start else jobs:
+        warm, parent_obj, start_evp = None, None, np.nan
+        if warm_start:
+            parent = (job.recharge, WARM_STARTS[job.rfunc][0], job.noise) if job.rfunc in WARM_STARTS else None
+            if job.noise and (job.recharge, job.rfunc, False) in solved:
+                _, optimal, start_evp = solved[job.recharge, job.rfunc, False]
+                warm = (optimal, {})
+            elif parent in solved:
+                parent_obj, optimal, start_evp = solved[parent]
+                warm = (optimal, WARM_STARTS[job.rfunc][1])
+        row, diag, params = solve_job(job, head, prec, evap, warm, two_step=warm_start and two_step)
+        stuck = warm is not None and (row["error"] is not None or
+                                      (parent_obj is not None and row["obj_func"] > 1.01 * parent_obj))
+        degenerate = warm is not None and row["error"] is None and row["EVP"] < start_evp - WARM_START_EVP_DROP
+        if stuck or degenerate:
+            logger.info("Warm start of %s ended %s; solving it cold", job.model_name,
+                        "above its parent" if stuck else f"at EVP {row['EVP']:.1f} (started from {start_evp:.1f})")
+            retry = solve_job(job, head, prec, evap, two_step=two_step)
+            if retry[0]["error"] is not None:
+                worse = True
+            elif row["error"] is not None:
+                worse = False
+            elif degenerate:
+                worse = retry[0]["EVP"] <= row["EVP"]
+            else:
+                worse = retry[0]["obj_func"] >= row["obj_func"]
+            best = (row, diag, params) if worse else retry
+            if best[0]["error"] is None:
+                # Both fits count for the cost of this model
+                nfev = sum(r["nfev"] or 0 for r in (row, retry[0]))
+                solve_time = sum(r["solve_time"] or 0 for r in (row, retry[0]))
+                best[0].update(nfev=nfev, solve_time=solve_time, **merge_records(row, retry[0]))
+            row, diag, params = best
+        if params is not None:
+            solved[job.recharge, job.rfunc, job.noise] = (row["obj_func"], params, row["EVP"])
+        results.append((job, row, diag, params))
+    return results
+
+
+def failed_row(job: BatchJob, error) -> dict:
+    """Results row for a job that could not be solved."""
+    return {"file": job.file, "model": job.model_name, "RechargeModel": job.recharge,
+            "RechargeRfunc": job.rfunc, **dict.fromkeys(METRIC_COLUMNS), "nfev": None, "solve_time": None,
+            "error": str(error)}
+
+
+def _init_worker(prec, evap, profile: dict | None = None):
+    # Send the (long) stress series to every worker once instead of with every job; per-well
+    # dicts are pickled with every distinct series once, however many wells share it
+    ps.set_log_level("ERROR")
+    _worker_stresses["prec"] = prec
+    _worker_stresses["evap"] = evap
+    if profile is not None:
+        configure(**profile)
+
+
+def _run_well(jobs: list, head: pd.Series, known: dict, warm_start: bool, two_step: bool):
+    file = jobs[0].file
+    return solve_well(jobs, head, well_stress(_worker_stresses["prec"], file),
+                      well_stress(_worker_stresses["evap"], file), known, warm_start, two_step)
+
+
+def results_frames(rows: list, diagnostics: list):
+    """Assemble collected rows into the results_df and diagnostics_df frames."""
+    results_df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    results_df = results_df.sort_values(["file", "EVP"], ascending=[True, False]).reset_index(drop=True)
+    diagnostics = [d for d in diagnostics if d is not None]
+    if diagnostics:
+        diagnostics_df = pd.concat(diagnostics, ignore_index=True).loc[:, DIAGNOSTICS_COLUMNS]
+    else:
+        diagnostics_df = pd.DataFrame(columns=DIAGNOSTICS_COLUMNS)
+    return results_df, diagnostics_df
+
+
+def run_batch(heads: dict, prec: pd.Series | dict, evap: pd.Series | dict, jobs: list | None = None,
+              max_workers: int | None = None, store: RunStore | None = None, retry_failed: bool = False,
+              warm_start: bool = False, two_step: bool = False, log: ProfileLog | None = None,
+              known: dict | None = None, progress=None):
+    """
+    Fit all jobs on a process pool, one well per task.
+
+    Parameters:
+    - heads (dict): Mapping of series name to (daily) head series
+    - prec (pd.Series | dict): Precipitation, shared by all models, or a dict with the
+      precipitation of every well (see stations.well_stresses)
+    - evap (pd.Series | dict): Evaporation, shared by all models or per well
+    - jobs (list of BatchJob): Defaults to the full grid from make_jobs
+    - max_workers (int): Number of worker processes, defaults to all cores;
+      1 runs in the current process
+    - store (RunStore): Optional run store; jobs already in it are not refitted
+      and every new result is checkpointed as soon as its well is done
+    - retry_failed (bool): Refit jobs that are stored with an error
+    - warm_start (bool): Start related models from each other's solution, see solve_well (off by
+      default); warm and cold results are stored under different keys
+    - two_step (bool): Solve models with noise model without it first, see solve_job
+    - log (ProfileLog): Optional profiling log; every fit is logged with its stage times and
+      nfev, and the memory tracing and job profiling options of the log are applied in the workers
+    - known (dict): file -> {(recharge, rfunc, noise): (objective function, optimal parameters, EVP)} of
+      earlier solutions to warm start from (e.g. the screening fits of selection.run_selection);
+      solutions in the store take precedence
+    - progress (callable): Called as progress(n_done, n_jobs, row) after every new result (e.g. by the
+      job worker, see pastas_wv2030.jobs); an exception raised by it stops the batch
+
+    Returns:
+    - results_df (pd.DataFrame): One row per job with EVP, R2, RMSE, AIC, BIC, nfev, solve_time and error
+    - diagnostics_df (pd.DataFrame): stats.diagnostics of all successful fits
+    """
+    if jobs is None:
+        jobs = make_jobs(heads)
+    max_workers = max_workers or os.cpu_count()
+
+    rows, diagnostics = [], []
+    keys = {}
+    known = {file: dict(solutions) for file, solutions in (known or {}).items()}
+    if store is not None:
+        settings = {**SOLVER_SETTINGS, "warm_start": True, "two_step": two_step} if warm_start else SOLVER_SETTINGS
+        files = {job.file for job in jobs}
+        head_hashes = {file: series_hash(heads[file]) for file in files}
+        hashes = {}  # by object, as many wells share the same stress series
+        for stress in (prec, evap):
+            for series in (stress.values() if isinstance(stress, dict) else [stress]):
+                if id(series) not in hashes:
+                    hashes[id(series)] = series_hash(series)
+        stress_hashes = {file: hashes[id(well_stress(prec, file))] + hashes[id(well_stress(evap, file))]
+                         for file in files}
+        keys = {job: job_key(job, head_hashes[job.file], stress_hashes[job.file], settings) for job in jobs}
+        status = store.status(keys.values())
+        done = [job for job in jobs if keys[job] in status and not (retry_failed and status[keys[job]])]
+        rows, diagnostics = store.get(keys[job] for job in done)
+        done = set(done)
+        jobs = [job for job in jobs if job not in done]
+        if warm_start:
+            # Stored solutions are good starting points for the remaining models of a well, also
+            # the noise-free solutions (e.g. from a --no-noise run) of models now solved with noise
+            candidates = {job: keys[job] for job in done}
+            for job in jobs:
+                if job.noise:
+                    noise_free = replace(job, noise=False)
+                    candidates[noise_free] = job_key(noise_free, head_hashes[job.file], stress_hashes[job.file],
+                                                     settings)
+            for job, key in candidates.items():
+                params = store.parameters(key)
+                if params is not None:
+                    (row,), _ = store.get([key])
+                    # Results stored before obj_func was recorded only serve as warm start
+                    obj_func = row.get("obj_func", np.inf)
+                    evp = row.get("EVP")
+                    known.setdefault(job.file, {})[job.recharge, job.rfunc, job.noise] = (
+                        obj_func, params, np.nan if evp is None else evp)
+        logger.info("%d models loaded from %s, %d to solve", len(done), store.path, len(jobs))
+
+    wells = {}
+    for job in jobs:
+        wells.setdefault(job.file, []).append(job)
+    n_done = 0
+
+    def collect(job, row, diag, params, checkpoint=True):
+        nonlocal n_done
+        n_done += 1
+        rows.append(row)
+        diagnostics.append(diag)
+        if store is not None and checkpoint:
+            # The noise choice is not a results column, but the model index needs it
+            store.put(keys[job], {**row, "noise": job.noise}, diag, params)
+        if log is not None:
+            log.model(job, row)
+        logger.info("[%d/%d] %s", n_done, len(jobs), job.model_name)
+        if progress is not None:
+            progress(n_done, len(jobs), row)
+
+    start = time.perf_counter()
+    profile = log.settings if log is not None else None
+    if max_workers == 1:
+        # The options of an open log already apply to this process
+        for file, well_jobs in wells.items():
+            for result in solve_well(well_jobs, heads[file], well_stress(prec, file), well_stress(evap, file),
+                                     known.get(file), warm_start, two_step):
+                collect(*result)
+    elif wells:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(prec, evap, profile)) as pool:
+            futures = {pool.submit(_run_well, well_jobs, heads[file], known.get(file), warm_start, two_step):
+                           well_jobs
+                       for file, well_jobs in wells.items()}
+            try:
+                for future in as_completed(futures):
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # The worker itself died (e.g. out of memory): report, but do not
+                        # checkpoint, so the jobs are tried again on the next run
+                        logger.error("Well %s crashed: %s", futures[future][0].file, e)
+                        results = [(job, failed_row(job, e), None, None) for job in futures[future]]
+                        for result in results:
+                            collect(*result, checkpoint=False)
+                        continue
+                    for result in results:
+                        collect(*result)
+            except BaseException:
+                # Stopped (interrupted or cancelled): do not start the wells that are still pending
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    solved = [row for row in rows[len(rows) - len(jobs):] if row.get("nfev") is not None]
+    if solved:
+        logger.info("Solved %d models (%s start) in %.1f s: %d function evaluations, %.1f s solving",
+                    len(solved), "warm" if warm_start else "cold", time.perf_counter() - start,
+                    sum(row["nfev"] for row in solved), sum(row["solve_time"] for row in solved))
+    if log is not None:
+        log.write("batch", models=len(jobs), solved=len(solved), workers=max_workers, warm_start=warm_start,
+                  seconds=time.perf_counter() - start)
+    return results_frames(rows, diagnostics)
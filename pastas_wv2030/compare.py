@@ -0,0 +1,273 @@
+# Model comparison index: metrics, diagnostics, parameters and simulations of all solved models
+import json
+import logging
+import os
+import sqlite3
+import time
+from io import StringIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+import pastas as ps
+
+from pastas_wv2030.batch import METRIC_COLUMNS, model_diagnostics, model_metrics
+
+logger = logging.getLogger(__name__)
+
+PAS_PATTERNS = ("*_Best_Fit.pas", "*_Tarso.pas")
+MODEL_COLUMNS = ["model_id", "source", "path", "file", "model", "RechargeModel", "RechargeRfunc", "noise",
+                 *METRIC_COLUMNS, "tmin", "tmax", "nobs", "error", "stamp"]
+
+
+def _model_structure(ml: ps.Model) -> tuple:
+    """(recharge model, response function) names in the naming of batch.make_jobs."""
+    sm = next(iter(ml.stressmodels.values()))
+    if isinstance(sm, ps.TarsoModel):
+        return "Tarso", sm.rfunc._name
+    if isinstance(sm, ps.RechargeModel):
+        return sm.recharge._name, sm.rfunc._name
+    return "Direct", sm.rfunc._name
+
+
+def summarize_pas(path) -> dict:
+    """
+    Everything the comparison tab needs from one .pas file, so it is loaded only once.
+
+    Returns:
+    - record (dict): 'row' (MODEL_COLUMNS), 'diagnostics' and 'parameters' frames,
+      and the daily observed and simulated heads as 'series'
+    """
+    path = Path(path)
+    ps.set_log_level("ERROR")
+    ml = ps.io.load(path)
+    recharge, rfunc = _model_structure(ml)
+    file = path.stem
+    for suffix in ("_Best_Fit", "_Tarso"):
+        file = file.removesuffix(suffix)
+    row = {"model_id": str(path.resolve()), "source": "pas", "path": str(path), "file": file, "model": path.stem,
+           "RechargeModel": recharge, "RechargeRfunc": rfunc, "noise": ml.noisemodel is not None,
+           **model_metrics(ml), "tmin": str(ml.settings["tmin"]), "tmax": str(ml.settings["tmax"]),
+           "nobs": int(ml.observations().size), "error": None}
+    series = pd.DataFrame({"observed": ml.observations(), "simulated": ml.simulate()})
+    return {
+        "row": row,
+        "diagnostics": model_diagnostics(ml, path.stem),
+        "parameters": ml.parameters[["optimal", "stderr"]],
+        "series": series,
+    }
+
+
+class ModelIndex:
+    """
+    SQLite index over solved models from .pas files and batch run stores.
+
+    Every model is summarised once (metrics, diagnostics, parameters and, for
+    .pas files, the observed and simulated heads); later updates only process
+    new or changed files and runs added to a store since the last update.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.con = sqlite3.connect(self.path)
+        self.con.executescript(
+            """CREATE TABLE IF NOT EXISTS models (
+                model_id TEXT PRIMARY KEY, source TEXT, path TEXT, file TEXT, model TEXT,
+                RechargeModel TEXT, RechargeRfunc TEXT, noise INTEGER,
+                EVP REAL, R2 REAL, RMSE REAL, AIC REAL, BIC REAL,
+                tmin TEXT, tmax TEXT, nobs INTEGER, error TEXT, stamp TEXT
+            );
+            CREATE TABLE IF NOT EXISTS diagnostics (model_id TEXT, data TEXT);
+            CREATE TABLE IF NOT EXISTS parameters (model_id TEXT, name TEXT, optimal REAL, stderr REAL);
+            CREATE TABLE IF NOT EXISTS series (model_id TEXT PRIMARY KEY, data TEXT);
+            CREATE TABLE IF NOT EXISTS sync (source TEXT PRIMARY KEY, watermark REAL);
+            CREATE INDEX IF NOT EXISTS diagnostics_model ON diagnostics (model_id);
+            CREATE INDEX IF NOT EXISTS parameters_model ON parameters (model_id);
+            CREATE INDEX IF NOT EXISTS models_file ON models (file);"""
+        )
+        self.con.commit()
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.con.execute("SELECT COUNT(*) FROM models").fetchone()[0]
+
+    def _delete(self, model_id: str):
+        for table in ("models", "diagnostics", "parameters", "series"):
+            self.con.execute(f"DELETE FROM {table} WHERE model_id = ?", (model_id,))
+
+    def _put(self, row: dict, diagnostics=None, parameters=None, series=None):
+        model_id = row["model_id"]
+        self._delete(model_id)
+        self.con.execute(f"INSERT INTO models VALUES ({','.join('?' * len(MODEL_COLUMNS))})",
+                         [row.get(col) for col in MODEL_COLUMNS])
+        if diagnostics is not None:
+            self.con.execute("INSERT INTO diagnostics VALUES (?, ?)",
+                             (model_id, diagnostics.to_json(orient="records")))
+        if parameters is not None:
+            self.con.executemany("INSERT INTO parameters VALUES (?, ?, ?, ?)",
+                                 [(model_id, name, p.get("optimal"), p.get("stderr"))
+                                  for name, p in parameters.iterrows()])
+        if series is not None:
+            self.con.execute("INSERT INTO series VALUES (?, ?)", (model_id, series.to_json(orient="split",
+                                                                                            date_format="iso")))
+
+    def update_from_pas(self, folders, patterns=PAS_PATTERNS, max_workers: int | None = None) -> int:
+        """
+        Index new and changed .pas files and drop models whose file was removed.
+
+        A file is recognised as unchanged by its size and modification time.
+
+        Returns:
+        - n (int): Number of (re)indexed files
+        """
+        files = {}
+        for folder in [folders] if isinstance(folders, (str, Path)) else folders:
+            for pattern in patterns:
+                for path in Path(folder).glob(pattern):
+                    stat = path.stat()
+                    files[str(path.resolve())] = (path, f"{stat.st_size}-{stat.st_mtime_ns}")
+        known = dict(self.con.execute("SELECT model_id, stamp FROM models WHERE source = 'pas'"))
+        todo = {model_id: (path, stamp) for model_id, (path, stamp) in files.items() if known.get(model_id) != stamp}
+        for model_id in set(known) - set(files):
+            self._delete(model_id)
+        logger.info("%d .pas files up to date, %d to index", len(files) - len(todo), len(todo))
+
+        def store(model_id, path, stamp, record=None, error=None):
+            if record is None:
+                logger.warning("Could not index %s: %s", path, error)
+                row = {"model_id": model_id, "source": "pas", "path": str(path), "model": path.stem,
+                       "error": str(error), "stamp": stamp}
+                self._put(row)
+            else:
+                record["row"]["stamp"] = stamp
+                self._put(record["row"], record["diagnostics"], record["parameters"], record["series"])
+            self.con.commit()
+
+        if (max_workers or os.cpu_count()) == 1 or len(todo) < 2:
+            for model_id, (path, stamp) in todo.items():
+                try:
+                    store(model_id, path, stamp, summarize_pas(path))
+                except Exception as e:
+                    store(model_id, path, stamp, error=e)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = {pool.submit(summarize_pas, path): (model_id, path, stamp)
+                           for model_id, (path, stamp) in todo.items()}
+                for future in as_completed(futures):
+                    model_id, path, stamp = futures[future]
+                    try:
+                        store(model_id, path, stamp, future.result())
+                    except Exception as e:
+                        store(model_id, path, stamp, error=e)
+        self.con.commit()
+        return len(todo)
+
+    def update_from_store(self, store_path) -> int:
+        """
+        Index the runs added to a batch run store (store.RunStore) since the last update.
+
+        A store keeps the fits of earlier inputs (e.g. before a head series was
+        extended) under their own keys; only the most recent run of every file,
+        model and noise choice is kept in the index.
+
+        Returns:
+        - n (int): Number of new runs
+        """
+        store_path = Path(store_path)
+        if not store_path.exists():
+            return 0
+        source = str(store_path.resolve())
+        found = self.con.execute("SELECT watermark FROM sync WHERE source = ?", (source,)).fetchone()
+        watermark = found[0] if found else 0.0
+        store = sqlite3.connect(store_path)
+        try:
+            runs = store.execute("SELECT key, result, diagnostics, parameters, created FROM runs "
+                                 "WHERE created > ? ORDER BY created", (watermark,)).fetchall()
+        finally:
+            store.close()
+        for key, result, diagnostics, parameters, created in runs:
+            row = json.loads(result)
+            row.update(model_id=key, source="store", path=source, stamp=str(created))
+            diag = pd.DataFrame(json.loads(diagnostics)) if diagnostics else None
+            params = (pd.Series(json.loads(parameters), dtype=float).rename("optimal").to_frame()
+                      if parameters else None)
+            if row.get("noise") is None and params is not None:
+                # Runs stored before the noise choice was recorded: a noise model adds noise_alpha
+                row["noise"] = "noise_alpha" in params.index
+            self._put(row, diag, params)
+            watermark = max(watermark, created)
+        stale = self.con.execute(
+            """SELECT model_id FROM models AS m WHERE source = 'store' AND path = ? AND EXISTS
+               (SELECT 1 FROM models AS n WHERE n.source = 'store' AND n.path = m.path AND n.file = m.file
+                AND n.model = m.model AND n.noise IS m.noise AND CAST(n.stamp AS REAL) > CAST(m.stamp AS REAL))""",
+            (source,)).fetchall()
+        for (model_id,) in stale:
+            self._delete(model_id)
+        self.con.execute("INSERT OR REPLACE INTO sync VALUES (?, ?)", (source, watermark))
+        self.con.commit()
+        logger.info("%d new runs from %s, %d replaced runs dropped", len(runs), store_path, len(stale))
+        return len(runs)
+
+    def metrics(self, include_failed: bool = False) -> pd.DataFrame:
+        """The metrics table of all indexed models, one row per model."""
+        query = "SELECT * FROM models" + ("" if include_failed else " WHERE error IS NULL")
+        df = pd.read_sql_query(query, self.con).set_index("model_id")
+        df["noise"] = df["noise"].astype("boolean")
+        return df
+
+    def diagnostics(self, model_ids=None) -> pd.DataFrame:
+        """Diagnostics in the long format of diagnostics_df, with a model_id column."""
+        rows = self.con.execute("SELECT model_id, data FROM diagnostics").fetchall()
+        wanted = None if model_ids is None else set(model_ids)
+        frames = [pd.DataFrame(json.loads(data)).assign(model_id=model_id)
+                  for model_id, data in rows if wanted is None or model_id in wanted]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def p_values(self) -> pd.DataFrame:
+        """P-value of every diagnostic test, one row per model and one column per test."""
+        diag = self.diagnostics()
+        if diag.empty:
+            return diag
+        return diag.pivot_table(index="model_id", columns="Test", values="P-value", aggfunc="first")
+
+    def parameters(self) -> pd.DataFrame:
+        """Optimal parameters, one row per model and one column per parameter name."""
+        df = pd.read_sql_query("SELECT model_id, name, optimal FROM parameters", self.con)
+        return df.pivot_table(index="model_id", columns="name", values="optimal", aggfunc="first")
+
+    def table(self) -> pd.DataFrame:
+        """Metrics, diagnostic P-values and parameters side by side, for ranking and filtering."""
+        table = self.metrics()
+        p_values = self.p_values()
+        if len(p_values):
+            table = table.join(p_values.add_prefix("p_"))
+        return table.join(self.parameters())
+
+    def series(self, model_id: str) -> pd.DataFrame | None:
+        """Observed and simulated heads stored for a model (only for .pas files)."""
+        found = self.con.execute("SELECT data FROM series WHERE model_id = ?", (model_id,)).fetchone()
+        if found is None:
+            return None
+        df = pd.read_json(StringIO(found[0]), orient="split")
+        df.index = pd.to_datetime(df.index)
+        return df
+
+
+def update_index(index_path, pas_folders=(), stores=(), max_workers: int | None = None) -> ModelIndex:
+    """Open (or create) the model index and bring it up to date with the given sources."""
+    start = time.perf_counter()
+    index = ModelIndex(index_path)
+    n_pas = index.update_from_pas(pas_folders, max_workers=max_workers) if pas_folders else 0
+    n_runs = sum(index.update_from_store(path) for path in stores)
+    logger.info("Model index: %d .pas files and %d runs updated in %.1f s (%d models)",
+                n_pas, n_runs, time.perf_counter() - start, len(index))
+    return index
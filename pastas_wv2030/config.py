@@ -0,0 +1,43 @@
+# Centralized configuration for pastas_wv2030
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+INPUT_DIR = PROJECT_ROOT / "input_files"
+OUTPUT_DIR = PROJECT_ROOT / "output_files"
+
+INPUT_PREC = INPUT_DIR / "input_prec"
+INPUT_EVAP = INPUT_DIR / "input_evap"
+OUTPUT_SHEETS = OUTPUT_DIR / "output_sheets"
+
+DEFAULT_PREC_FILE = INPUT_PREC / "prec_station_249.csv"
+DEFAULT_EVAP_FILE = INPUT_EVAP / "evap_station_249.csv"
+
+# Local caches (KNMI downloads, derived data); safe to delete
+CACHE_DIR = PROJECT_ROOT / "cache"
+
+KNMI_API_URL = "https://www.daggegevens.knmi.nl/klimatologie/daggegevens"
+
+# Columnar archive with every ingested series (see pastas_wv2030.archive)
+ARCHIVE_DIR = OUTPUT_DIR / "series_archive"
+
+# Solved models (.pas) and the comparison index over them (see pastas_wv2030.compare)
+MODELS_DIR = OUTPUT_DIR / "models_beemster"
+BATCH_STORE = OUTPUT_DIR / "batch" / "runs.sqlite"
+MODEL_INDEX = CACHE_DIR / "model_index.sqlite"
+
+# Validation report of all input series and its per-file cache (see pastas_wv2030.validation)
+VALIDATION_REPORT = OUTPUT_DIR / "data_validation.json"
+VALIDATION_CACHE = CACHE_DIR / "validation.json"
+
+# Well locations and local rain gauges for the choice of stresses per well (see pastas_wv2030.stations)
+WELL_LOCATIONS = INPUT_DIR / "well_locations.csv"
+GAUGES_FILE = INPUT_PREC / "gauges.csv"
+STATION_SELECTION = OUTPUT_DIR / "station_selection.csv"
+
+# Delta-change factors of the forcing scenarios of the forecasts (see pastas_wv2030.forecast)
+SCENARIOS_FILE = INPUT_DIR / "scenarios.csv"
+
+# Job queue of the app and the worker service (see pastas_wv2030.jobs); job outputs go in <queue folder>/<id>
+JOBS_DIR = OUTPUT_DIR / "jobs"
+JOB_QUEUE = JOBS_DIR / "jobs.sqlite"
@@ -0,0 +1,265 @@
+# Return periods (terugkeertijden) of high groundwater levels: block maxima / peaks over threshold,
+# GEV / GPD fitted with L-moments for many series at once
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.special import gamma as gamma_fn
+from scipy.stats import genextreme, genpareto
+
+from pastas_wv2030.store import series_hash
+
+logger = logging.getLogger(__name__)
+
+RETURN_PERIODS = (2, 5, 10, 25, 50, 100)
+PARAMETER_COLUMNS = ["distribution", "shape", "loc", "scale", "threshold", "rate", "n"]
+
+
+def annual_maxima(heads, index=None, year_start: int = 4, min_coverage: float = 0.8) -> pd.DataFrame:
+    """
+    Maximum head per (hydrological) year for many series at once.
+
+    Parameters:
+    - heads (pd.DataFrame | np.ndarray): Daily heads (e.g. daily maxima), one column per series; an array is
+      (members x time), as returned by uncertainty.simulate_ensemble, and needs index
+    - index (pd.DatetimeIndex): Time steps of an array
+    - year_start (int): First month of the year; 4 is the hydrological year (April - March)
+    - min_coverage (float): Years with fewer days of data than this fraction are left out
+
+    Returns:
+    - maxima (pd.DataFrame): One row per year (labelled by its start), one column per series
+    """
+    if not isinstance(heads, pd.DataFrame):
+        heads = pd.DataFrame(np.asarray(heads).T, index=index)
+    grouped = heads.groupby((heads.index - pd.DateOffset(months=year_start - 1)).year)
+    # A partly covered (first or last) year would bias the maxima low
+    coverage = grouped.count() / 365.25
+    return grouped.max().where(coverage >= min_coverage)
+
+
+def peaks_over_threshold(series: pd.Series, threshold: float | None = None, quantile: float = 0.95,
+                         run: int = 7) -> pd.Series:
+    """
+    Declustered peaks over a threshold: the maximum of every cluster of exceedances,
+    where clusters are separated by at least `run` steps below the threshold.
+
+    Parameters:
+    - series (pd.Series): Daily heads
+    - threshold (float): Threshold; defaults to the given quantile of the series
+    - quantile (float): Quantile used when no threshold is given
+    - run (int): Minimum gap (in time steps) between independent clusters
+
+    Returns:
+    - peaks (pd.Series): Cluster maxima, with attrs['threshold'] set
+    """
+    series = series.dropna()
+    if threshold is None:
+        threshold = float(series.quantile(quantile))
+    values = series.to_numpy(dtype=float)
+    above = np.flatnonzero(values > threshold)
+    if len(above) == 0:
+        peaks = series.iloc[:0]
+    else:
+        # A new cluster starts where the gap to the previous exceedance exceeds run steps
+        cluster = np.cumsum(np.r_[True, np.diff(above) > run])
+        order = np.lexsort((values[above], cluster))
+        last = np.r_[np.flatnonzero(np.diff(cluster[order])), len(order) - 1]
+        peaks = series.iloc[above[order[last]]]
+    peaks.attrs["threshold"] = threshold
+    return peaks
+
+
+def lmoments(samples) -> tuple:
+    """
+    Sample L-moments (l1, l2, t3) of every column, ignoring NaN.
+
+    Parameters:
+    - samples (array_like): (observations x series)
+
+    Returns:
+    - l1, l2, t3, n (np.ndarray): One value per column
+    """
+    x = np.sort(np.asarray(samples, dtype=float), axis=0)  # NaN sorts to the end
+    n = np.sum(~np.isnan(x), axis=0).astype(float)
+    j = np.arange(x.shape[0], dtype=float)[:, np.newaxis]  # rank - 1
+    x = np.nan_to_num(x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Unbiased probability-weighted moments b0, b1, b2 (Hosking 1990)
+        b0 = x.sum(axis=0) / n
+        b1 = (j / (n - 1) * x).sum(axis=0) / n
+        b2 = (j * (j - 1) / ((n - 1) * (n - 2)) * x).sum(axis=0) / n
+        l1 = b0
+        l2 = 2 * b1 - b0
+        t3 = (6 * b2 - 6 * b1 + b0) / l2
+    return l1, l2, t3, n
+
+
+def fit_gev(maxima) -> pd.DataFrame:
+    """
+    GEV fitted with L-moments to every column of a block-maxima table (Hosking 1985).
+
+    Returns:
+    - params (pd.DataFrame): One row per column; shape/loc/scale as scipy.stats.genextreme
+    """
+    maxima = pd.DataFrame(maxima)
+    l1, l2, t3, n = lmoments(maxima.to_numpy())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c = 2 / (3 + t3) - np.log(2) / np.log(3)
+        k = 7.8590 * c + 2.9554 * c ** 2
+        small = np.abs(k) < 1e-6
+        g = gamma_fn(1 + k)
+        scale = np.where(small, l2 / np.log(2), l2 * k / ((1 - 2.0 ** -k) * g))
+        loc = np.where(small, l1 - np.euler_gamma * scale, l1 - scale * (1 - g) / k)
+    params = pd.DataFrame({"distribution": "gev", "shape": np.where(small, 0.0, k), "loc": loc, "scale": scale,
+                           "threshold": np.nan, "rate": 1.0, "n": n.astype(int)}, index=maxima.columns)
+    params.loc[params["n"] < 3, ["shape", "loc", "scale"]] = np.nan
+    return params
+
+
+def fit_gpd(peaks: dict, years: dict) -> pd.DataFrame:
+    """
+    GPD fitted with L-moments to the excesses over the threshold of every series.
+
+    Parameters:
+    - peaks (dict): series name -> peaks_over_threshold result
+    - years (dict): series name -> observed period in years (for the rate of peaks)
+
+    Returns:
+    - params (pd.DataFrame): One row per series; shape/scale as scipy.stats.genpareto,
+      loc equals the threshold and rate is the number of peaks per year
+    """
+    names = list(peaks)
+    excess = pd.DataFrame({name: pd.Series(p.to_numpy() - p.attrs["threshold"]) for name, p in peaks.items()})
+    l1, l2, _, n = lmoments(excess.reindex(columns=names).to_numpy())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = l1 / l2 - 2  # Hosking's k; scipy's shape is -k
+        scale = (1 + k) * l1
+    threshold = np.array([peaks[name].attrs["threshold"] for name in names])
+    rate = np.array([len(peaks[name]) / years[name] if years[name] > 0 else np.nan for name in names])
+    params = pd.DataFrame({"distribution": "gpd", "shape": -k, "loc": threshold, "scale": scale,
+                           "threshold": threshold, "rate": rate, "n": n.astype(int)}, index=names)
+    params.loc[params["n"] < 3, ["shape", "scale"]] = np.nan
+    return params
+
+
+def return_levels(params: pd.DataFrame, return_periods=RETURN_PERIODS) -> pd.DataFrame:
+    """
+    Head that is exceeded on average once per return period (in years).
+
+    Returns:
+    - levels (pd.DataFrame): One row per fitted series, one column per return period
+    """
+    T = np.asarray(return_periods, dtype=float)[np.newaxis, :]
+    shape = params["shape"].to_numpy(dtype=float)[:, np.newaxis]
+    loc = params["loc"].to_numpy(dtype=float)[:, np.newaxis]
+    scale = params["scale"].to_numpy(dtype=float)[:, np.newaxis]
+    rate = params["rate"].to_numpy(dtype=float)[:, np.newaxis]
+    is_gev = (params["distribution"] == "gev").to_numpy()[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Non-exceedance probability per block (GEV) or per peak (GPD)
+        p_block = 1 - 1 / T
+        p_peak = 1 - 1 / (rate * T)
+        levels = np.where(is_gev, genextreme.ppf(p_block, shape, loc, scale),
+                          genpareto.ppf(p_peak, shape, loc, scale))
+    return pd.DataFrame(levels, index=params.index, columns=list(return_periods))
+
+
+def plotting_positions(extremes: pd.Series, rate: float = 1.0) -> pd.DataFrame:
+    """
+    Empirical return periods (Weibull plotting positions) of annual maxima, or of
+    peaks over threshold occurring `rate` times per year.
+    """
+    values = extremes.dropna().sort_values(ascending=False).to_numpy()
+    rank = np.arange(1, len(values) + 1)
+    return pd.DataFrame({"return_period": (len(values) + 1) / rank / rate, "head": values})
+
+
+def ensemble_return_levels(ensemble, index, return_periods=RETURN_PERIODS, quantiles=(0.05, 0.5, 0.95),
+                           **kwargs) -> pd.DataFrame:
+    """
+    Return levels of every member of a simulated ensemble in one vectorized fit,
+    summarised as quantiles over the members.
+
+    Parameters:
+    - ensemble (np.ndarray): (members x time), e.g. from uncertainty.simulate_ensemble
+    - index (pd.DatetimeIndex): Time steps of the ensemble
+    - kwargs: Passed to annual_maxima
+
+    Returns:
+    - bands (pd.DataFrame): One row per return period, one column per quantile
+    """
+    levels = return_levels(fit_gev(annual_maxima(ensemble, index, **kwargs)), return_periods)
+    return levels.quantile(list(quantiles)).T
+
+
+def fit_series(heads: dict, distribution: str = "gev", year_start: int = 4, min_coverage: float = 0.8,
+               quantile: float = 0.95, run: int = 7) -> pd.DataFrame:
+    """
+    Fit GEV (annual maxima) or GPD (peaks over threshold) to many head series at once.
+
+    Parameters:
+    - heads (dict): series name -> daily head series
+    - distribution (str): 'gev' or 'gpd'
+    - year_start, min_coverage: See annual_maxima
+    - quantile, run: See peaks_over_threshold
+
+    Returns:
+    - params (pd.DataFrame): One row per series (PARAMETER_COLUMNS)
+    """
+    if not heads:
+        return pd.DataFrame(columns=PARAMETER_COLUMNS)
+    if distribution == "gev":
+        wide = pd.concat({name: s.resample("D").max() for name, s in heads.items()}, axis=1)
+        return fit_gev(annual_maxima(wide, year_start=year_start, min_coverage=min_coverage))
+    if distribution == "gpd":
+        peaks, years = {}, {}
+        for name, s in heads.items():
+            daily = s.resample("D").max().dropna()
+            peaks[name] = peaks_over_threshold(daily, quantile=quantile, run=run)
+            years[name] = len(daily) / 365.25
+        return fit_gpd(peaks, years)
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+def cached_fit(heads: dict, cache_path, **settings) -> pd.DataFrame:
+    """
+    fit_series with a cache: series whose data and settings did not change are not refitted.
+
+    Fits are stored in a Parquet file, keyed by the content hash of the series
+    and the settings, so e.g. the Streamlit tab only fits new or changed wells.
+
+    Parameters:
+    - heads (dict): series name -> daily head series
+    - cache_path (str | Path): Parquet file with earlier fits
+    - settings: Passed to fit_series
+
+    Returns:
+    - params (pd.DataFrame): One row per series (PARAMETER_COLUMNS)
+    """
+    cache_path = Path(cache_path)
+    settings_key = json.dumps(settings, sort_keys=True)
+    keys = {name: hashlib.sha256(f"{series_hash(s)}|{settings_key}".encode()).hexdigest()
+            for name, s in heads.items()}
+    cache = pd.read_parquet(cache_path) if cache_path.exists() else pd.DataFrame(columns=["key"] + PARAMETER_COLUMNS)
+    cache = cache.set_index("key")
+
+    missing = {name: s for name, s in heads.items() if keys[name] not in cache.index}
+    if missing:
+        logger.info("Fitting %d of %d series", len(missing), len(heads))
+        fitted = fit_series(missing, **settings)
+        fitted.index = [keys[name] for name in fitted.index]
+        fitted = fitted[~fitted.index.duplicated()]  # identical series share a key
+        cache = pd.concat([cache[~cache.index.isin(fitted.index)], fitted]) if len(cache) else fitted
+        cache.index.name = "key"
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(".parquet.tmp")
+        cache[PARAMETER_COLUMNS].reset_index().to_parquet(tmp)
+        os.replace(tmp, cache_path)
+
+    params = cache.loc[[keys[name] for name in heads], PARAMETER_COLUMNS]
+    params.index = list(heads)
+    return params
@@ -0,0 +1,316 @@
+# Forecasts of solved models under many forcing scenarios, simulated in one batched convolution per model
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pastas as ps
+from scipy.fft import irfft, next_fast_len, rfft
+
+from pastas_wv2030.config import SCENARIOS_FILE
+from pastas_wv2030.modelfile import SUFFIX, load_model
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Monthly delta-change factors (January to December) on the precipitation and evaporation of the
+# resampled years. 'dry' and 'wet' are stress tests, not climate projections; the official
+# (WV2030) scenarios are read from SCENARIOS_FILE, see delta_scenarios.
+DELTA_SCENARIOS = {
+    "reference": {"prec": [1.0] * 12, "evap": [1.0] * 12},
+    "dry": {"prec": [1.0, 1.0, 1.0, 0.9, 0.85, 0.8, 0.8, 0.8, 0.85, 0.95, 1.0, 1.0],
+            "evap": [1.0, 1.0, 1.0, 1.05, 1.1, 1.1, 1.1, 1.1, 1.05, 1.0, 1.0, 1.0]},
+    "wet": {"prec": [1.15, 1.15, 1.1, 1.05, 1.05, 1.05, 1.05, 1.05, 1.05, 1.1, 1.15, 1.15],
+            "evap": [1.0] * 12},
+}
+
+
+def read_delta_scenarios(path) -> dict:
+    """
+    Delta-change scenarios from a CSV with the columns scenario, variable ('prec' or 'evap'),
+    month (1-12) and factor; a variable without rows keeps factor 1.
+
+    Returns:
+    - scenarios (dict): name -> {'prec': 12 factors, 'evap': 12 factors}, as DELTA_SCENARIOS
+    """
+    df = pd.read_csv(path, dtype={"scenario": str, "variable": str})
+    scenarios = {}
+    for name, rows in df.groupby("scenario", sort=False):
+        scenarios[name] = {}
+        for variable in ("prec", "evap"):
+            factors = rows[rows["variable"] == variable].set_index("month")["factor"]
+            scenarios[name][variable] = factors.reindex(range(1, 13), fill_value=1.0).astype(float).tolist()
+    return scenarios
+
+
+def delta_scenarios(path=SCENARIOS_FILE) -> dict:
+    """DELTA_SCENARIOS and the scenarios in the scenario file (when it exists), see read_delta_scenarios."""
+    scenarios = dict(DELTA_SCENARIOS)
+    if path is not None and Path(path).exists():
+        scenarios.update(read_delta_scenarios(path))
+    return scenarios
+
+
+def complete_years(*series: pd.Series, min_days: int = 365) -> list:
+    """Calendar years with a value on at least min_days days in every series."""
+    years = None
+    for s in series:
+        counts = s.dropna().groupby(s.dropna().index.year).size()
+        complete = set(counts.index[counts >= min_days])
+        years = complete if years is None else years & complete
+    return sorted(years or [])
+
+
+def year_plan(years, n: int = 200, horizon: int = 10, seed: int | None = 0) -> np.ndarray:
+    """
+    Synthetic futures from resampled historical years: for n scenarios the historical
+    year that is repeated in every future year.
+
+    Returns:
+    - plan (np.ndarray): n x horizon array of calendar years
+    """
+    if len(years) == 0:
+        raise ValueError("No complete historical years to resample")
+    return np.random.default_rng(seed).choice(np.asarray(years), size=(n, horizon))
+
+
+def _leap_position(index: pd.DatetimeIndex) -> np.ndarray:
+    """Day of the year (0-365) in a leap year calendar, so 1 March is the same position in every year."""
+    position = index.dayofyear.to_numpy() - 1
+    return position + ((~index.is_leap_year) & (position >= 59))
+
+
+def scenario_forcing(series: pd.Series, plan: np.ndarray, index: pd.DatetimeIndex, factors=None) -> np.ndarray:
+    """
+    Daily forcing of every scenario in a plan: the values of the planned historical year on
+    the same calendar day (29 February of a non-leap year repeats 28 February).
+
+    Parameters:
+    - series (pd.Series): Historical daily series
+    - plan (np.ndarray): See year_plan; one column per future year, counted from index[0].year
+    - index (pd.DatetimeIndex): Future days
+    - factors (list of float): Monthly delta-change factors, see DELTA_SCENARIOS
+
+    Returns:
+    - forcing (np.ndarray): n x len(index)
+    """
+    years = np.unique(plan)
+    series = series.dropna()
+    table = np.full((len(years), 366), np.nan)
+    for i, year in enumerate(years):
+        values = series[series.index.year == year]
+        table[i, _leap_position(values.index)] = values.to_numpy(dtype=float)
+        if not pd.Timestamp(year=int(year), month=1, day=1).is_leap_year:
+            table[i, 59] = table[i, 58]
+    offset = index.year.to_numpy() - index[0].year
+    if offset.max() >= plan.shape[1]:
+        raise ValueError(f"The plan covers {plan.shape[1]} years, the forecast {offset.max() + 1}")
+    forcing = table[np.searchsorted(years, plan)[:, offset], _leap_position(index)]
+    if factors is not None:
+        forcing = forcing * np.asarray(factors, dtype=float)[index.month.to_numpy() - 1]
+    if np.isnan(forcing).any():
+        raise ValueError(f"{series.name}: missing days in the resampled years")
+    return forcing
+
+
+def _check_supported(ml: ps.Model):
+    if ml.settings["freq"] != "D":
+        raise ValueError(f"{ml.name}: only daily models can be forecast")
+    for sm in ml.stressmodels.values():
+        if type(sm) not in (ps.StressModel, ps.RechargeModel):
+            raise ValueError(f"{ml.name}: {type(sm).__name__} {sm.name} cannot be forecast")
+        if type(sm) is ps.RechargeModel and sm.temp is not None:
+            raise ValueError(f"{ml.name}: recharge with temperature (snow) cannot be forecast")
+
+
+def simulate_scenarios(ml: ps.Model, plan: np.ndarray, start=None, days: int | None = None, factors=None,
+                       chunk_size: int = 256):
+    """
+    Simulate a solved model forward for many forcing scenarios at once.
+
+    The recharge of every scenario is computed on the historical stresses of the
+    model warmup before start followed by the scenario forcing, and convolved with the response
+    block of the optimal parameters in one batched FFT per chunk of scenarios,
+    instead of calling ml.simulate for every scenario. The constant and a transform
+    (e.g. ThresholdTransform) are applied to all scenarios at once.
+
+    A RechargeModel gets the resampled precipitation and evaporation (with the
+    delta-change factors); a StressModel (the 'Direct' net precipitation of
+    batch.build_model) gets its own stress resampled and no factors.
+
+    Parameters:
+    - ml (ps.Model): Solved daily model with RechargeModel/StressModel components
+    - plan (np.ndarray): Historical year of every future year per scenario, see year_plan
+    - start (str | pd.Timestamp): First forecast day, defaults to the day after the stresses end
+    - days (int): Length of the forecast, defaults to the years in the plan
+    - factors (dict): {'prec': 12 factors, 'evap': 12 factors}, see DELTA_SCENARIOS
+    - chunk_size (int): Scenarios per batch; bounds the working memory
+
+    Returns:
+    - ensemble (np.ndarray): Heads, scenarios x days
+    - index (pd.DatetimeIndex): Forecast days
+    """
+    _check_supported(ml)
+    if start is None:
+        start = min(s.series_original.index[-1] for sm in ml.stressmodels.values() for s in sm.stress)
+        start += pd.Timedelta(1, "D")
+    start = pd.Timestamp(start).normalize()
+    if days is None:
+        days = int((start + pd.DateOffset(years=plan.shape[1] - 1, month=12, day=31) - start).days) + 1
+    index = pd.date_range(start, periods=days, freq="D")
+    warmup = pd.Timedelta(ml.settings["warmup"])
+    heads = np.zeros((len(plan), days))
+
+    for sm in ml.stressmodels.values():
+        p = ml.get_parameters(sm.name)
+        # As ml.simulate(tmin=start), which simulates from start - warmup: the block is cut off
+        # at that length, and a nonlinear recharge model starts from its initial state there
+        block = sm._get_block(p[:sm.rfunc.nparam], 1.0, start - warmup, index[-1])
+        history = warmup.days
+        if type(sm) is ps.StressModel or isinstance(sm.recharge, ps.rch.Linear):
+            history = min(history, len(block))
+        sm.update_stress(tmin=start - pd.Timedelta(history, "D"), tmax=start - pd.Timedelta(1, "D"), freq="D")
+        if type(sm) is ps.RechargeModel:
+            past = {"prec": sm.prec.series, "evap": sm.evap.series}
+            future = {variable: scenario_forcing(s.series_original, plan, index,
+                                                 None if factors is None else factors[variable])
+                      for variable, s in (("prec", sm.prec), ("evap", sm.evap))}
+        else:
+            if factors is not None and any(f != 1 for values in factors.values() for f in values):
+                raise ValueError(f"{ml.name}: delta-change factors need separate precipitation and evaporation")
+            past = {"stress": sm.stress[0].series}
+            future = {"stress": scenario_forcing(sm.stress[0].series_original, plan, index)}
+        n_past = len(next(iter(past.values())))
+        nfft = next_fast_len(n_past + days + len(block) - 1, real=True)
+        block_spectrum = rfft(block, nfft)
+
+        for i0 in range(0, len(plan), chunk_size):
+            chunk = {variable: np.hstack([np.broadcast_to(past[variable].to_numpy(dtype=float),
+                                                          (len(values[i0:i0 + chunk_size]), n_past)),
+                                          values[i0:i0 + chunk_size]])
+                     for variable, values in future.items()}
+            if type(sm) is ps.StressModel:
+                stress = chunk["stress"]
+            elif isinstance(sm.recharge, ps.rch.Linear):
+                stress = sm.recharge.simulate(chunk["prec"], chunk["evap"], p[-sm.recharge.nparam:])
+            else:
+                p_rch = p[-sm.recharge.nparam:]
+                stress = np.stack([sm.recharge.simulate(prec=prec, evap=evap, p=p_rch, temp=None)
+                                   for prec, evap in zip(chunk["prec"], chunk["evap"])])
+            simulated = irfft(rfft(stress, nfft, axis=1) * block_spectrum, nfft, axis=1)
+            heads[i0:i0 + len(stress)] += simulated[:, n_past:n_past + days]
+        sm.update_stress(tmin=ml.settings["tmin"], tmax=ml.settings["tmax"], freq="D")
+
+    if ml.constant:
+        heads += ml.get_parameters(ml.constant.name)[0]
+    if ml.transform is not None:
+        heads = ml.transform.simulate(heads, ml.get_parameters(ml.transform.name))
+    return heads, index
+
+
+def forecast_bands(ml: ps.Model, plan: np.ndarray, scenarios=("reference",), start=None, quantiles=QUANTILES,
+                   deltas: dict | None = None, chunk_size: int = 256) -> pd.DataFrame:
+    """
+    Percentile bands of the forecast of one model for every delta-change scenario.
+
+    Parameters:
+    - ml (ps.Model): Solved model, see simulate_scenarios
+    - plan (np.ndarray): Resampled historical years, see year_plan
+    - scenarios (list of str): Delta-change scenarios applied to every resampled future
+    - start (str | pd.Timestamp): First forecast day, see simulate_scenarios
+    - quantiles (tuple of float): Quantiles of the bands
+    - deltas (dict): Available scenarios, defaults to delta_scenarios()
+
+    Returns:
+    - bands (pd.DataFrame): Index the forecast days, columns (scenario, quantile); delta-change
+      scenarios are left out for a model on net precipitation (the 'Direct' StressModel)
+    """
+    deltas = delta_scenarios() if deltas is None else deltas
+    net_stress = any(type(sm) is ps.StressModel for sm in ml.stressmodels.values())
+    frames = {}
+    for scenario in scenarios:
+        if scenario not in deltas:
+            raise ValueError(f"Unknown scenario {scenario}, use one of {list(deltas)}")
+        if net_stress and any(f != 1 for factors in deltas[scenario].values() for f in factors):
+            logger.warning("%s: scenario %s skipped, the model has no separate precipitation and evaporation",
+                           ml.name, scenario)
+            continue
+        ensemble, index = simulate_scenarios(ml, plan, start, factors=deltas[scenario], chunk_size=chunk_size)
+        frames[scenario] = pd.DataFrame(np.quantile(ensemble, quantiles, axis=0).T, index=index,
+                                        columns=list(quantiles))
+    return pd.concat(frames, axis=1, names=["scenario", "quantile"])
+
+
+def load_solved_model(model) -> ps.Model:
+    """A ps.Model as is, or loaded from a .pas or .pasz file."""
+    if isinstance(model, ps.Model):
+        return model
+    return load_model(model) if Path(model).suffix == SUFFIX else ps.io.load(model)
+
+
+def _forecast_file(model, plan, scenarios, start, quantiles, deltas) -> pd.DataFrame:
+    ps.set_log_level("ERROR")
+    return forecast_bands(load_solved_model(model), plan, scenarios, start, quantiles, deltas)
+
+
+def forecast_wells(models: dict, n: int = 200, horizon: int = 10, scenarios=("reference",), start=None,
+                   quantiles=QUANTILES, seed: int | None = 0, deltas: dict | None = None,
+                   max_workers: int | None = None) -> dict:
+    """
+    Forecast bands of many wells under the same synthetic futures.
+
+    Every scenario uses the same resampled historical years in all wells (drawn from
+    the years that are complete in the stresses of every model), so a dry future is
+    dry everywhere.
+
+    Parameters:
+    - models (dict): name -> ps.Model, or the path of a .pas or .pasz file
+    - n (int): Resampled futures per scenario
+    - horizon (int): Years to forecast (the first year is the rest of the start year)
+    - scenarios, start, quantiles, deltas: See forecast_bands
+    - seed (int): Seed of the resampling
+    - max_workers (int): Worker processes, defaults to all cores; 1 runs in-process
+
+    Returns:
+    - bands (dict): name -> bands (see forecast_bands); models that cannot be forecast are logged and left out
+    """
+    deltas = delta_scenarios() if deltas is None else deltas
+    loaded = {name: load_solved_model(model) for name, model in models.items()}
+    years = None
+    for ml in loaded.values():
+        stresses = [s.series_original for sm in ml.stressmodels.values() for s in sm.stress]
+        complete = set(complete_years(*stresses))
+        years = complete if years is None else years & complete
+    plan = year_plan(sorted(years or []), n, horizon, seed)
+
+    bands = {}
+    if (max_workers or os.cpu_count()) == 1 or len(models) < 2:
+        for name, ml in loaded.items():
+            try:
+                bands[name] = forecast_bands(ml, plan, scenarios, start, quantiles, deltas)
+            except Exception as e:
+                logger.error("Forecast of %s failed: %s", name, e)
+    else:
+        # The workers load the model files themselves
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_forecast_file, models[name], plan, scenarios, start, quantiles, deltas): name
+                       for name in loaded}
+            for future in as_completed(futures):
+                try:
+                    bands[futures[future]] = future.result()
+                except Exception as e:
+                    logger.error("Forecast of %s failed: %s", futures[future], e)
+    return {name: bands[name] for name in models if name in bands}
+
+
+def bands_frame(bands: dict) -> pd.DataFrame:
+    """The bands of forecast_wells as one long table: well, scenario, date and one column per quantile."""
+    frames = [b.stack("scenario", future_stack=True).rename_axis(["date", "scenario"]).reset_index().assign(well=name)
+              for name, b in bands.items()]
+    if not frames:
+        return pd.DataFrame(columns=["well", "scenario", "date"])
+    df = pd.concat(frames, ignore_index=True).rename_axis(columns=None)
+    return df[["well", "scenario", "date", *[c for c in df.columns if c not in ("well", "scenario", "date")]]]
@@ -0,0 +1,201 @@
+# Ingestion of the Fugro, Geoloket and Beemster exports into the series archive
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from pastas_wv2030.archive import SeriesArchive, sanitize_column_name
+from pastas_wv2030.config import INPUT_DIR, OUTPUT_SHEETS
+
+logger = logging.getLogger(__name__)
+
+
+def _to_series(timestamps, values, dayfirst: bool = False) -> pd.Series:
+    """Build a float series from raw cell values, dropping empty and non-numeric cells."""
+    values = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=float)
+    if len(timestamps) and isinstance(timestamps[0], str):
+        try:
+            # Beemster exports are 'dd-mm-yyyy HH:MM:SS'; an explicit format is much faster
+            index = pd.to_datetime(timestamps, format="%d-%m-%Y %H:%M:%S" if dayfirst else None)
+        except ValueError:
+            index = pd.to_datetime(timestamps, dayfirst=dayfirst, errors="coerce")
+    else:
+        index = pd.to_datetime(timestamps, errors="coerce")
+    keep = ~np.isnan(values) & ~pd.isna(index)
+    return pd.Series(values[keep], index=pd.DatetimeIndex(index[keep]))
+
+
+def read_fugro_workbook(path) -> list:
+    """
+    Read a Vista Data Vision export: 6 metadata rows, a header row with 'Time'
+    and one column per sensor; the first data row is discarded (as in DATA_FUGRO_to_csv).
+
+    Returns:
+    - series (list of (series_id, pd.Series, meta))
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    rows = ws.iter_rows(values_only=True)
+    for _ in range(6):
+        next(rows)
+    header = [str(h) if h is not None else None for h in next(rows)]
+    next(rows)  # polluted first row
+    ncol = len(header)
+    columns = [[] for _ in range(ncol)]
+    for row in rows:
+        if row[0] is None:
+            continue
+        row = tuple(row) + (None,) * (ncol - len(row))
+        for i in range(ncol):
+            columns[i].append(row[i])
+    wb.close()
+
+    result = []
+    for i, col in enumerate(header):
+        if i == 0 or col is None or col == "Time":
+            continue
+        series = _to_series(columns[0], columns[i])
+        unit = re.search(r"\[([^\[\]]*[a-zA-Z][^\[\]]*)\]", col)
+        meta = {"source": "fugro", "file": Path(path).name, "sheet": ws.title, "column": col,
+                "unit": unit.group(1) if unit else None}
+        result.append((sanitize_column_name(col), series, meta))
+    return result
+
+
+def read_geoloket_workbook(path) -> list:
+    """
+    Read a multi-sheet Geoloket export. Every sheet holds one well: the first
+    cell is its name, row 2 the header; 'Waterniveau (m NAP)' is used as head.
+    Sheets without that column are skipped (as in DATA_GEOLOKET_to_csv).
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    result = []
+    for ws in wb.worksheets:
+        rows = ws.iter_rows(values_only=True)
+        try:
+            name = str(next(rows)[0]).strip()
+            header = [str(h) if h is not None else "" for h in next(rows)]
+        except StopIteration:
+            continue
+        ts_col = next((i for i, col in enumerate(header) if "Timestamp" in col), None)
+        wn_col = next((i for i, col in enumerate(header) if "Waterniveau (m NAP)" in col), None)
+        if ts_col is None or wn_col is None:
+            logger.info("%s - Sheet %s: required columns not found", Path(path).name, ws.title)
+            continue
+        timestamps, values = [], []
+        for row in rows:
+            if len(row) > max(ts_col, wn_col):
+                timestamps.append(row[ts_col])
+                values.append(row[wn_col])
+        meta = {"source": "geoloket", "file": Path(path).name, "sheet": ws.title,
+                "column": header[wn_col], "unit": "m NAP"}
+        result.append((name, _to_series(timestamps, values), meta))
+    wb.close()
+    return result
+
+
+def read_beemster_workbook(path) -> list:
+    """
+    Read a Beemster export: a header row, then day-first timestamp strings and
+    heads in cm, which are converted to m (as in MONTECARLO_Test_Batch).
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    timestamps, values = [], []
+    for row in ws.iter_rows(min_row=2, max_col=2, values_only=True):
+        if len(row) == 2 and row[0] is not None:
+            timestamps.append(row[0])
+            values.append(row[1])
+    wb.close()
+    series = _to_series(timestamps, values, dayfirst=True) / 100
+    meta = {"source": "beemster", "file": Path(path).name, "sheet": ws.title, "column": "head", "unit": "m"}
+    return [(Path(path).stem, series, meta)]
+
+
+def read_output_sheet(path) -> list:
+    """Read one of the per-series CSVs in output_files/output_sheets."""
+    df = pd.read_csv(path, parse_dates=["Timestamp"])
+    series = _to_series(df["Timestamp"].values, df["head"].values)
+    meta = {"source": "csv", "file": Path(path).name, "sheet": None, "column": "head", "unit": None}
+    return [(Path(path).stem, series, meta)]
+
+
+LAYOUTS = {
+    "fugro": read_fugro_workbook,
+    "geoloket": read_geoloket_workbook,
+    "beemster": read_beemster_workbook,
+    "csv": read_output_sheet,
+}
+
+
+def default_sources(include_csv: bool = False) -> list:
+    """
+    The raw exports in input_files, as (path, layout) pairs.
+
+    Parameters:
+    - include_csv (bool): Also ingest the CSVs in output_files/output_sheets
+    """
+    sources = []
+    for folder, layout, pattern in [
+        (INPUT_DIR / "raw_batch_fugro", "fugro", "*.xlsx"),
+        (INPUT_DIR / "raw_batch_geoloket", "geoloket", "*.xlsx"),
+        (INPUT_DIR / "input_beemster", "beemster", "*.xlsx"),
+    ] + ([(OUTPUT_SHEETS, "csv", "*.csv")] if include_csv else []):
+        sources += [(path, layout) for path in sorted(folder.glob(pattern))]
+    return sources
+
+
+def parse_file(path, layout: str) -> list:
+    """Parse one file with the reader of its layout; see LAYOUTS."""
+    return LAYOUTS[layout](path)
+
+
+def ingest(sources, archive_root, max_workers: int | None = None) -> SeriesArchive:
+    """
+    Parse all sources in parallel and write every series once into the archive.
+
+    When several sources contain the same series ID, the one listed last wins,
+    so e.g. corrected CSVs can be listed after the raw exports.
+
+    Parameters:
+    - sources (list of (path, layout)): See default_sources and LAYOUTS
+    - archive_root (str | Path): Archive folder
+    - max_workers (int): Worker processes, defaults to all cores; 1 runs in-process
+
+    Returns:
+    - archive (SeriesArchive)
+    """
+    archive = SeriesArchive(archive_root)
+    written_by = {}
+
+    def write(order, parsed):
+        for series_id, series, meta in parsed:
+            if written_by.get(series_id, -1) > order:
+                continue
+            archive.write_series(series_id, series, meta)
+            written_by[series_id] = order
+
+    if (max_workers or os.cpu_count()) == 1:
+        for order, (path, layout) in enumerate(sources):
+            try:
+                write(order, parse_file(path, layout))
+            except Exception as e:
+                logger.error("Failed to ingest %s: %s", path, e)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(parse_file, path, layout): (order, path)
+                       for order, (path, layout) in enumerate(sources)}
+            for future in as_completed(futures):
+                order, path = futures[future]
+                try:
+                    write(order, future.result())
+                except Exception as e:
+                    logger.error("Failed to ingest %s: %s", path, e)
+    archive.flush()
+    logger.info("%d series from %d files in %s", len(written_by), len(sources), archive.root)
+    return archive
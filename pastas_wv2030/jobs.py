@@ -0,0 +1,515 @@
+# Local job queue (SQLite) and worker service, so the app can hand calibrations, batches and reports to a
+# separate process and poll their progress instead of solving in the Streamlit script thread
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from pastas_wv2030.aggregate import load_aggregate
+from pastas_wv2030.archive import SeriesArchive
+from pastas_wv2030.batch import RECHARGE_MODELS, RESPONSE_FUNCTIONS, build_model, make_jobs, run_batch
+from pastas_wv2030.config import BATCH_STORE
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+from pastas_wv2030.reports import generate_reports
+from pastas_wv2030.selection import run_selection
+from pastas_wv2030.store import RunStore
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED = ("done", "failed", "cancelled")
+# Seconds between worker heartbeats; a running job whose worker was silent for STALE_AFTER is requeued
+HEARTBEAT = 5.0
+STALE_AFTER = 60.0
+# A job whose worker died this many times is marked failed instead of requeued
+MAX_ATTEMPTS = 3
+# Seconds between progress reports (and cancel checks) from inside a solve
+SOLVE_REPORT_EVERY = 1.0
+
+
+class JobCancelled(Exception):
+    """Raised in a running job when it was cancelled from the queue."""
+
+
+def job_hash(kind: str, params: dict) -> str:
+    """Key of a job: jobs with the same kind and parameters give the same result."""
+    payload = json.dumps({"kind": kind, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _loads(text):
+    return None if text is None else json.loads(text)
+
+
+class JobQueue:
+    """
+    SQLite job queue shared by the app (submit, poll, cancel) and the workers (claim, report).
+
+    Every job is a row in 'jobs'; the partial results a job streams while it runs
+    (e.g. one row per solved model) are rows in 'events', read back in order with
+    events(job_id, after). The database runs in WAL mode, so readers never wait
+    for a worker that is writing.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit; claim() opens its own write transaction
+        self.con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.executescript(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT,
+                key TEXT,
+                params TEXT,
+                owner TEXT,
+                status TEXT,
+                progress REAL,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                attempts INTEGER DEFAULT 0,
+                cancel INTEGER DEFAULT 0,
+                created REAL,
+                started REAL,
+                finished REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+            CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key);
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER,
+                created REAL,
+                payload TEXT
+            );
+            CREATE INDEX IF NOT EXISTS events_job ON events (job_id, id);
+            CREATE TABLE IF NOT EXISTS workers (
+                name TEXT PRIMARY KEY,
+                pid INTEGER,
+                job_id INTEGER,
+                started REAL,
+                heartbeat REAL
+            )"""
+        )
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so two workers never claim the same job
+        self.con.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.con.execute("ROLLBACK")
+            raise
+        self.con.execute("COMMIT")
+
+    # -- app side
+
+    def submit(self, kind: str, params: dict, owner: str | None = None, reuse: bool = True) -> int:
+        """
+        Queue a job.
+
+        Parameters:
+        - kind (str): One of JOB_KINDS
+        - params (dict): JSON-serializable parameters of the job (see the run_* functions)
+        - owner (str): Who submitted it (e.g. the app session); workers take turns between owners
+        - reuse (bool): Return the id of a queued, running or finished identical job instead of
+          queueing it again (failed and cancelled jobs are always resubmitted)
+
+        Returns:
+        - job_id (int)
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind}, use one of {list(JOB_KINDS)}")
+        key = job_hash(kind, params)
+        if reuse:
+            found = self.con.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running', 'done') "
+                "ORDER BY id DESC LIMIT 1", (key,)).fetchone()
+            if found is not None:
+                return found[0]
+        cursor = self.con.execute(
+            "INSERT INTO jobs (kind, key, params, owner, status, progress, created) "
+            "VALUES (?, ?, ?, ?, 'queued', 0, ?)",
+            (kind, key, json.dumps(params, default=str), owner, time.time()))
+        return cursor.lastrowid
+
+    def get(self, job_id: int) -> dict | None:
+        """The job as a dict (params and result decoded), None if it does not exist."""
+        cursor = self.con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        found = cursor.fetchone()
+        if found is None:
+            return None
+        job = dict(zip([c[0] for c in cursor.description], found))
+        job["params"], job["result"] = _loads(job["params"]), _loads(job["result"])
+        return job
+
+    def list(self, owner: str | None = None, status=None, limit: int = 100) -> pd.DataFrame:
+        """Most recent jobs (without params and result), optionally of one owner or with given statuses."""
+        query, args = "SELECT id, kind, owner, status, progress, message, error, worker, created, started, " \
+                      "finished FROM jobs WHERE 1 = 1", []
+        if owner is not None:
+            query += " AND owner = ?"
+            args.append(owner)
+        if status is not None:
+            status = [status] if isinstance(status, str) else list(status)
+            query += f" AND status IN ({','.join('?' * len(status))})"
+            args += status
+        df = pd.read_sql_query(query + " ORDER BY id DESC LIMIT ?", self.con, params=args + [limit])
+        for col in ("created", "started", "finished"):
+            df[col] = pd.to_datetime(df[col], unit="s")
+        return df.set_index("id")
+
+    def events(self, job_id: int, after: int = 0) -> list:
+        """Partial results of a job after event id 'after', as (event_id, payload) in order."""
+        rows = self.con.execute("SELECT id, payload FROM events WHERE job_id = ? AND id > ? ORDER BY id",
+                                (job_id, after))
+        return [(event_id, json.loads(payload)) for event_id, payload in rows]
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued job, or ask the worker to stop a running one; False if it already finished."""
+        with self._transaction():
+            found = self.con.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if found is None or found[0] in FINISHED:
+                return False
+            if found[0] == "queued":
+                self.con.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ?",
+                                 (time.time(), job_id))
+            else:
+                self.con.execute("UPDATE jobs SET cancel = 1 WHERE id = ?", (job_id,))
+        return True
+
+    def workers(self, alive_within: float = STALE_AFTER) -> pd.DataFrame:
+        """Workers that sent a heartbeat in the last alive_within seconds."""
+        df = pd.read_sql_query("SELECT * FROM workers WHERE heartbeat > ? ORDER BY started", self.con,
+                               params=[time.time() - alive_within])
+        return df.set_index("name")
+
+    # -- worker side
+
+    def claim(self, worker: str) -> dict | None:
+        """
+        Take the next queued job for a worker and mark it running.
+
+        Owners take turns: the job is taken from the owner with the fewest running
+        jobs, oldest first, so one user's long list of jobs does not hold up the others.
+        """
+        with self._transaction():
+            found = self.con.execute(
+                """SELECT id FROM jobs AS j WHERE status = 'queued' ORDER BY
+                   (SELECT COUNT(*) FROM jobs AS r WHERE r.status = 'running' AND r.owner IS j.owner), id
+                   LIMIT 1""").fetchone()
+            if found is None:
+                return None
+            self.con.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, started = ?, "
+                "progress = 0, message = NULL WHERE id = ?", (worker, time.time(), found[0]))
+        return self.get(found[0])
+
+    def progress(self, job_id: int, fraction: float | None = None, message: str | None = None,
+                 payload: dict | None = None):
+        """
+        Report progress of a running job, and optionally stream a partial result.
+
+        Raises:
+        - JobCancelled: The job was cancelled in the meantime
+        """
+        if payload is not None:
+            self.con.execute("INSERT INTO events (job_id, created, payload) VALUES (?, ?, ?)",
+                             (job_id, time.time(), json.dumps(payload, default=str)))
+        self.con.execute("UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message) "
+                         "WHERE id = ?", (fraction, message, job_id))
+        if self.con.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+            raise JobCancelled(f"Job {job_id} was cancelled")
+
+    def finish(self, job_id: int, result=None, error: str | None = None, status: str | None = None):
+        """Mark a job done (with its result), failed (with an error) or cancelled."""
+        status = status or ("done" if error is None else "failed")
+        self.con.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, progress = "
+            "CASE WHEN ? = 'done' THEN 1 ELSE progress END WHERE id = ?",
+            (status, json.dumps(result, default=str), error, time.time(), status, job_id))
+
+    def heartbeat(self, worker: str, job_id: int | None = None):
+        self.con.execute(
+            "INSERT INTO workers (name, pid, job_id, started, heartbeat) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET job_id = excluded.job_id, heartbeat = excluded.heartbeat",
+            (worker, os.getpid(), job_id, time.time(), time.time()))
+
+    def requeue_stale(self, stale_after: float = STALE_AFTER) -> int:
+        """
+        Requeue the running jobs of workers that stopped sending heartbeats (killed, crashed or
+        the machine went down); after MAX_ATTEMPTS tries a job is marked failed instead.
+
+        Returns:
+        - n (int): Number of jobs requeued or failed
+        """
+        with self._transaction():
+            stale = self.con.execute(
+                """SELECT id, attempts FROM jobs WHERE status = 'running' AND worker NOT IN
+                   (SELECT name FROM workers WHERE heartbeat > ?)""", (time.time() - stale_after,)).fetchall()
+            for job_id, attempts in stale:
+                if attempts >= MAX_ATTEMPTS:
+                    self.con.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                                     (f"Worker stopped {attempts} times while running this job", time.time(),
+                                      job_id))
+                else:
+                    self.con.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?", (job_id,))
+        if stale:
+            logger.warning("Requeued %d jobs of stopped workers", len(stale))
+        return len(stale)
+
+
+class JobContext:
+    """
+    What a running job sees of the queue: progress reports, streamed results and its output
+    folder, <queue folder>/<job id>, so queues in different folders never share outputs.
+    """
+
+    def __init__(self, queue: JobQueue, job: dict):
+        self.queue = queue
+        self.job_id = job["id"]
+        self.params = job["params"]
+        self.output_dir = queue.path.parent / str(self.job_id)
+
+    def progress(self, fraction: float | None = None, message: str | None = None, payload: dict | None = None):
+        self.queue.progress(self.job_id, fraction, message, payload)
+
+    def solve_callback(self, fraction: float | None = None):
+        """
+        Callback for ml.solve that reports the number of function evaluations at most every
+        SOLVE_REPORT_EVERY seconds, so a cancelled job stops in the middle of a (slow) solve.
+        """
+        state = {"nfev": 0, "last": time.monotonic()}
+
+        def callback(p):
+            state["nfev"] += 1
+            if time.monotonic() - state["last"] >= SOLVE_REPORT_EVERY:
+                state["last"] = time.monotonic()
+                self.progress(fraction, f"Solving model ({state['nfev']} function evaluations)")
+        return callback
+
+
+# -- job kinds; every run_* function takes a JobContext and returns the (JSON-serializable) result
+
+
+def _read_head(spec: dict) -> pd.Series:
+    """Head series of a job: {'path': csv} or {'archive': root, 'id': series_id}, with 'aggregation'."""
+
+    aggregation = spec.get("aggregation", "median")
+    if "archive" in spec:
+        archive = SeriesArchive(spec["archive"])
+        if aggregation == "original":
+            return archive.load(spec["id"])
+        return load_aggregate(archive, spec["id"], "D", aggregation)
+    # Observed head CSVs come as (date, value) files or as the Timestamp/head sheets of the loggers
+    path = Path(spec["path"])
+    head = read_head_csv(path) if "Timestamp" in pd.read_csv(path, nrows=0).columns else read_timeseries_csv(path)
+    return aggregate_daily(head, aggregation)
+
+
+def run_calibration(ctx: JobContext) -> dict:
+    """
+    Solve one model, as the Kalibratie tab did in the script thread.
+
+    Parameters (ctx.params):
+    - head (dict): See _read_head
+    - prec, evap (str): Stress CSVs
+    - recharge, rfunc (str): Model variant, see batch.build_model
+    - noise (bool): Add an ArNoiseModel
+
+    Returns:
+    - result (dict): Path of the saved model ('model'), its EVP and the optimal parameters
+    """
+    params = ctx.params
+    ctx.progress(0.1, "Reading series")
+    head = _read_head(params["head"])
+    prec, evap = read_timeseries_csv(params["prec"]), read_timeseries_csv(params["evap"])
+    ctx.progress(0.2, "Solving model")
+    ml = build_model(head, prec, evap, params["recharge"], params["rfunc"], noise=params["noise"],
+                     name="Kalibratie")
+    ml.solve(report=False, callback=ctx.solve_callback(0.2))
+    ctx.output_dir.mkdir(parents=True, exist_ok=True)
+    path = ctx.output_dir / "model.pas"
+    ml.to_file(str(path))
+    return {"model": str(path), "EVP": ml.stats.evp(), "parameters": ml.parameters["optimal"].to_dict()}
+
+
+def run_batch_job(ctx: JobContext) -> dict:
+    """
+    Fit the model grid (or the best variants, with 'select') on many head series and stream one
+    row per model; results already in the run store are reused.
+
+    Parameters (ctx.params):
+    - heads (list of dict): Head series, see _read_head
+    - prec, evap (str): Stress CSVs
+    - recharge, rfunc (list of str): Grid, defaults to all variants of batch.make_jobs
+    - tarso, noise (bool): See batch.make_jobs
+    - select (int): Screen all variants and fully fit the best 'select' per well (selection.run_selection)
+    - workers (int): Number of processes
+    - store (str): Run store, defaults to config.BATCH_STORE
+
+    Returns:
+    - result (dict): Paths of results_df.csv and diagnostics_df.csv, and the number of solved and failed models
+    """
+    params = ctx.params
+    prec, evap = read_timeseries_csv(params["prec"]), read_timeseries_csv(params["evap"])
+    heads = {}
+    for i, spec in enumerate(params["heads"]):
+        ctx.progress(0.05 * i / len(params["heads"]), f"Reading {i + 1}/{len(params['heads'])}")
+        head = _read_head(spec)
+        heads[spec.get("id") or Path(spec["path"]).stem] = head
+    jobs = make_jobs(heads, params.get("recharge") or list(RECHARGE_MODELS),
+                     params.get("rfunc") or list(RESPONSE_FUNCTIONS), tarso=params.get("tarso", True),
+                     noise=params.get("noise", True))
+
+    def progress(n_done, n_jobs, row):
+        ctx.progress(0.05 + 0.95 * n_done / n_jobs, f"{n_done}/{n_jobs} models", payload=row)
+
+    ctx.output_dir.mkdir(parents=True, exist_ok=True)
+    with RunStore(params.get("store") or BATCH_STORE) as store:
+        kwargs = dict(max_workers=params.get("workers"), store=store, progress=progress)
+        if params.get("select"):
+            results_df, diagnostics_df, screening_df = run_selection(
+                heads, prec, evap, jobs, params["select"], noise=params.get("noise", True), **kwargs)
+            screening_df.to_csv(ctx.output_dir / "screening_df.csv", index=False)
+        else:
+            results_df, diagnostics_df = run_batch(heads, prec, evap, jobs, **kwargs)
+    results_df.to_csv(ctx.output_dir / "results_df.csv", index=False)
+    diagnostics_df.to_csv(ctx.output_dir / "diagnostics_df.csv", index=False)
+    n_failed = int(results_df["error"].notna().sum())
+    return {"results": str(ctx.output_dir / "results_df.csv"),
+            "diagnostics": str(ctx.output_dir / "diagnostics_df.csv"),
+            "solved": len(results_df) - n_failed, "failed": n_failed}
+
+
+def run_report_job(ctx: JobContext) -> dict:
+    """
+    Render the HTML reports of many head CSVs (reports.generate_reports) and stream one event per report.
+
+    Parameters (ctx.params):
+    - files (list of str): Head CSVs
+    - prec, evap (str): Stress CSVs
+    - output_dir (str): Report folder
+    - aggregation (str), force (bool), workers (int): See reports.generate_reports
+
+    Returns:
+    - counts (dict): Number of 'rendered', 'skipped' and 'failed' reports
+    """
+    params = ctx.params
+    prec, evap = read_timeseries_csv(params["prec"]), read_timeseries_csv(params["evap"])
+    output_dir = Path(params["output_dir"])
+    n = {"done": 0}
+
+    def progress(path, error):
+        n["done"] += 1
+        ctx.progress(n["done"] / len(params["files"]), f"{n['done']} reports",
+                     payload={"file": path.stem, "html": str(output_dir / f"{path.stem}.html"),
+                              "error": None if error is None else str(error)})
+
+    return generate_reports(params["files"], prec, evap, output_dir, params.get("aggregation", "median"),
+                            max_workers=params.get("workers"), force=params.get("force", False),
+                            progress=progress)
+
+
+JOB_KINDS = {
+    "calibration": run_calibration,
+    "batch": run_batch_job,
+    "report": run_report_job,
+}
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _heartbeats(path, name: str, current: dict, stop: threading.Event):
+    # Own connection: sqlite3 connections are not shared between threads
+    with JobQueue(path) as queue:
+        while not stop.wait(HEARTBEAT):
+            queue.heartbeat(name, current.get("job_id"))
+
+
+def run_job(queue: JobQueue, job: dict):
+    """Run one claimed job and record its result, error or cancellation."""
+    logger.info("Job %d (%s) started", job["id"], job["kind"])
+    start = time.perf_counter()
+    try:
+        result = JOB_KINDS[job["kind"]](JobContext(queue, job))
+    except JobCancelled:
+        queue.finish(job["id"], status="cancelled")
+        logger.info("Job %d cancelled", job["id"])
+    except Exception as e:
+        logger.exception("Job %d failed", job["id"])
+        queue.finish(job["id"], error=f"{type(e).__name__}: {e}")
+    else:
+        queue.finish(job["id"], result)
+        logger.info("Job %d done in %.1f s", job["id"], time.perf_counter() - start)
+
+
+def run_worker(path, poll: float = 1.0, once: bool = False, max_jobs: int | None = None,
+               name: str | None = None):
+    """
+    Worker service: claim and run jobs from the queue at path until stopped.
+
+    Several workers (on the same machine or on a shared disk) can serve one queue; each
+    runs one job at a time, and batch and report jobs use their own process pools.
+
+    Parameters:
+    - path (Path): Queue database
+    - poll (float): Seconds between looks at an empty queue
+    - once (bool): Stop when the queue is empty
+    - max_jobs (int): Stop after this many jobs
+    - name (str): Worker name, defaults to host-pid
+
+    Returns:
+    - n_jobs (int): Number of jobs run
+    """
+    name = name or worker_name()
+    current, stop = {}, threading.Event()
+    n_jobs = 0
+    with JobQueue(path) as queue:
+        queue.heartbeat(name)
+        beat = threading.Thread(target=_heartbeats, args=(path, name, current, stop), daemon=True)
+        beat.start()
+        logger.info("Worker %s serving %s", name, queue.path)
+        try:
+            while max_jobs is None or n_jobs < max_jobs:
+                queue.requeue_stale()
+                job = queue.claim(name)
+                if job is None:
+                    if once:
+                        break
+                    time.sleep(poll)
+                    continue
+                current["job_id"] = job["id"]
+                queue.heartbeat(name, job["id"])
+                try:
+                    run_job(queue, job)
+                finally:
+                    current["job_id"] = None
+                n_jobs += 1
+        finally:
+            stop.set()
+            # Gone immediately, so its running job (if interrupted) is requeued by the next worker
+            queue.con.execute("DELETE FROM workers WHERE name = ?", (name,))
+    return n_jobs
@@ -0,0 +1,299 @@
+# KNMI daily data client backed by an on-disk per-station cache
+import json
+import logging
+import os
+import re
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import requests
+
+from pastas_wv2030.config import CACHE_DIR, KNMI_API_URL
+from pastas_wv2030.pet import pet_from_frame
+
+logger = logging.getLogger(__name__)
+
+# KNMI variable -> (column name, factor to the units used in this project)
+KNMI_VARS = {
+    "Q": ("Radiation", 0.01),
+    "RH": ("Precipitation", 0.1),
+    "TN": ("Tmin", 0.1),
+    "TX": ("Tmax", 0.1),
+    "TG": ("Tavg", 0.1),
+}
+KNMI_COLUMNS = [name for name, _ in KNMI_VARS.values()]
+
+# Automatic weather stations in and around Noord-Holland: number -> (name, lon, lat).
+# Coordinates as in the header of a daggegevens response; the headers of every download
+# are kept in the cache (see read_station_cache) and take precedence over this table.
+KNMI_STATIONS = {
+    209: ("IJmond", 4.518, 52.465),
+    215: ("Voorschoten", 4.437, 52.141),
+    225: ("IJmuiden", 4.555, 52.463),
+    235: ("De Kooy", 4.781, 52.928),
+    240: ("Schiphol", 4.790, 52.318),
+    242: ("Vlieland", 4.921, 53.241),
+    249: ("Berkhout", 4.979, 52.644),
+    251: ("Hoorn Terschelling", 5.346, 53.392),
+    257: ("Wijk aan Zee", 4.603, 52.506),
+    260: ("De Bilt", 5.180, 52.100),
+    267: ("Stavoren", 5.384, 52.898),
+    269: ("Lelystad", 5.520, 52.458),
+    270: ("Leeuwarden", 5.752, 53.224),
+    273: ("Marknesse", 5.888, 52.703),
+}
+
+# Station line of a daggegevens header: "# 249         4.979       52.644      -2.40       Berkhout"
+_STATION_LINE = re.compile(r"^#\s*(\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+(?:\.\d+)?)\s+(\S.*?)\s*$")
+
+# KNMI publishes daily data with a delay of a few days. Days this recent that are
+# missing from a response are not marked as cached, so they are fetched again later.
+RECENT_DAYS = 7
+
+
+def parse_knmi_csv(text: str) -> pd.DataFrame:
+    """
+    Parse a daggegevens CSV response into a frame in project units.
+
+    Returns:
+    - knmi_df (pd.DataFrame): Columns STN, DATE, Radiation, Precipitation, Tmin, Tmax, Tavg
+    """
+    csv_data = "\n".join(
+        line for line in text.splitlines() if line.strip() and not line.startswith("#")
+    )
+    columns = ["STN", "DATE", *KNMI_COLUMNS]
+    if not csv_data:
+        return pd.DataFrame(columns=columns).astype({"STN": int, "DATE": "datetime64[ns]"})
+
+    knmi_df = pd.read_csv(StringIO(csv_data), header=None, names=["STN", "DATE", *KNMI_VARS],
+                          skipinitialspace=True)
+    knmi_df["DATE"] = pd.to_datetime(knmi_df["DATE"].astype(str), format="%Y%m%d")
+    for var, (name, factor) in KNMI_VARS.items():
+        knmi_df[name] = pd.to_numeric(knmi_df.pop(var), errors="coerce") * factor
+    return knmi_df[columns]
+
+
+def parse_knmi_stations(text: str) -> dict:
+    """
+    Station coordinates from the header of a daggegevens CSV response.
+
+    Returns:
+    - stations (dict): station number -> {'name', 'lon', 'lat', 'alt'}
+    """
+    stations = {}
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            break
+        match = _STATION_LINE.match(line)
+        if match:
+            stn, lon, lat, alt, name = match.groups()
+            stations[int(stn)] = {"name": name, "lon": float(lon), "lat": float(lat), "alt": float(alt)}
+    return stations
+
+
+def read_station_cache(cache_dir=None) -> dict:
+    """Station coordinates of all downloads so far (see parse_knmi_stations), keyed by station number."""
+    path = (Path(cache_dir) if cache_dir is not None else CACHE_DIR / "knmi") / "stations.json"
+    if not path.exists():
+        return {}
+    return {int(stn): meta for stn, meta in json.loads(path.read_text()).items()}
+
+
+def _update_station_cache(cache_dir: Path, stations: dict):
+    known = read_station_cache(cache_dir)
+    if not stations or all(known.get(stn) == meta for stn, meta in stations.items()):
+        return
+    known.update(stations)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / "stations.json"
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({str(stn): meta for stn, meta in sorted(known.items())}, indent=1))
+    os.replace(tmp, path)
+
+
+def download_knmi_daily(stations, start, end, url: str = KNMI_API_URL) -> pd.DataFrame:
+    """
+    Download daily data for one or more stations in a single request.
+
+    Parameters:
+    - stations (list of int): KNMI station numbers
+    - start, end (str | pd.Timestamp): First and last day (inclusive)
+    - url (str): daggegevens endpoint, e.g. a local stand-in server in tests
+
+    Returns:
+    - knmi_df (pd.DataFrame): See parse_knmi_csv; attrs['stations'] holds the station
+      coordinates of the response header (see parse_knmi_stations)
+    """
+    params = {
+        "start": pd.Timestamp(start).strftime("%Y%m%d"),
+        "end": pd.Timestamp(end).strftime("%Y%m%d"),
+        "stns": ":".join(str(stn) for stn in stations),
+        "vars": ":".join(KNMI_VARS),
+        "fmt": "csv"
+    }
+    response = requests.post(url, data=params, timeout=120)
+    response.raise_for_status()
+    knmi_df = parse_knmi_csv(response.text)
+    knmi_df.attrs["stations"] = parse_knmi_stations(response.text)
+    return knmi_df
+
+
+def _cache_paths(cache_dir: Path, station: int):
+    return cache_dir / f"knmi_{station}.parquet", cache_dir / f"knmi_{station}.json"
+
+
+def _read_cache(cache_dir: Path, station: int):
+    """Cached frame (indexed by DATE) and covered (start, end) intervals of one station."""
+    data_path, meta_path = _cache_paths(cache_dir, station)
+    if not meta_path.exists():
+        return None, []
+    meta = json.loads(meta_path.read_text())
+    # Caches written before holes were tracked have a single start and end
+    spans = meta["intervals"] if "intervals" in meta else [[meta["start"], meta["end"]]]
+    coverage = [(pd.Timestamp(s), pd.Timestamp(e)) for s, e in spans]
+    data = pd.read_parquet(data_path) if data_path.exists() else pd.DataFrame(columns=KNMI_COLUMNS)
+    return data, coverage
+
+
+def _write_cache(cache_dir: Path, station: int, data: pd.DataFrame, coverage: list):
+    """Atomically replace the cached frame and covered intervals of one station."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    data_path, meta_path = _cache_paths(cache_dir, station)
+    tmp = data_path.with_suffix(".parquet.tmp")
+    data.to_parquet(tmp)
+    os.replace(tmp, data_path)
+    tmp = meta_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"intervals": [[s.isoformat(), e.isoformat()] for s, e in coverage]}))
+    os.replace(tmp, meta_path)
+
+
+def _merge_intervals(intervals) -> list:
+    """Sorted union of (start, end) day intervals; touching intervals are joined."""
+    day = pd.Timedelta(1, "D")
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + day:
+            merged[-1] = merged[-1][0], max(merged[-1][1], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _missing_ranges(coverage: list, start: pd.Timestamp, end: pd.Timestamp) -> list:
+    """Parts of [start, end] outside the covered intervals: before, between and after them."""
+    day = pd.Timedelta(1, "D")
+    missing = []
+    for covered_start, covered_end in _merge_intervals(coverage):
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if start < covered_start:
+            missing.append((start, covered_start - day))
+        start = covered_end + day
+    if start <= end:
+        missing.append((start, end))
+    return missing
+
+
+def fetch_knmi_daily(stations, start, end, cache_dir=None, offline: bool = False,
+                     url: str = KNMI_API_URL) -> pd.DataFrame:
+    """
+    Daily KNMI data for one or more stations, served from the local cache.
+
+    Only the date ranges that are not cached yet are downloaded, and stations
+    missing the same range are fetched together in one request.
+
+    Parameters:
+    - stations (int | list of int): KNMI station number(s)
+    - start, end (str | pd.Timestamp): First and last day, e.g. '20230101' or '2023-01-01'
+    - cache_dir (str | Path): Cache folder, defaults to CACHE_DIR / 'knmi'
+    - offline (bool): Never touch the network; return whatever is cached
+    - url (str): daggegevens endpoint
+
+    Returns:
+    - knmi_df (pd.DataFrame): Columns STN, DATE, Radiation, Precipitation, Tmin, Tmax, Tavg
+    """
+    stations = [int(stations)] if np.isscalar(stations) else [int(stn) for stn in stations]
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    cache_dir = Path(cache_dir) if cache_dir is not None else CACHE_DIR / "knmi"
+
+    cached = {stn: _read_cache(cache_dir, stn) for stn in stations}
+
+    # Group the stations by the ranges they miss, so each range is one request.
+    # There is nothing to download after today.
+    today = pd.Timestamp.today().normalize()
+    requests_by_range = {}
+    for stn, (_, coverage) in cached.items():
+        if start > today:
+            continue
+        for missing in _missing_ranges(coverage, start, min(end, today)):
+            requests_by_range.setdefault(missing, []).append(stn)
+
+    if requests_by_range and offline:
+        logger.warning("Offline: KNMI data not cached for %s", sorted(requests_by_range))
+    elif requests_by_range:
+        recent = today - pd.Timedelta(RECENT_DAYS, "D")
+        downloads = {stn: [] for stn in stations}
+        for (range_start, range_end), range_stations in requests_by_range.items():
+            knmi_df = download_knmi_daily(range_stations, range_start, range_end, url=url)
+            _update_station_cache(cache_dir, knmi_df.attrs.get("stations", {}))
+            for stn in range_stations:
+                rows = knmi_df[knmi_df["STN"] == stn]
+                # Do not mark recent days without data as covered
+                last = rows["DATE"].max() if not rows.empty else range_start - pd.Timedelta(1, "D")
+                covered_end = min(range_end, max(last, recent))
+                downloads[stn].append((rows, range_start, covered_end))
+
+        for stn, pieces in downloads.items():
+            if not pieces:
+                continue
+            data, coverage = cached[stn]
+            frames = [] if data is None or data.empty else [data]
+            frames += [rows.set_index("DATE")[KNMI_COLUMNS] for rows, _, _ in pieces if not rows.empty]
+            if not frames:
+                frames = [pd.DataFrame(columns=KNMI_COLUMNS, index=pd.DatetimeIndex([], name="DATE"), dtype=float)]
+            data = pd.concat(frames).sort_index()
+            data = data[~data.index.duplicated(keep="last")]
+            downloaded = [(s, e) for _, s, e in pieces if e >= s]
+            if downloaded:
+                coverage = _merge_intervals(coverage + downloaded)
+                _write_cache(cache_dir, stn, data, coverage)
+            cached[stn] = data, coverage
+
+    frames = []
+    for stn, (data, _) in cached.items():
+        if data is None or data.empty:
+            continue
+        frame = data.loc[start:end, KNMI_COLUMNS].reset_index(names="DATE")
+        frame.insert(0, "STN", stn)
+        frames.append(frame)
+    if not frames:
+        return parse_knmi_csv("")
+    return pd.concat(frames, ignore_index=True)
+
+
+def fetch_knmi_prec_evap(station: int, start_date: str, end_date: str, method: str = "hargreaves", **kwargs):
+    """
+    Fetch KNMI daily data and compute precipitation and evapotranspiration.
+
+    Parameters:
+    - station (int): KNMI station number (e.g., 249 for Berkhout)
+    - start_date (str): Start date in 'YYYYMMDD' or 'YYYY-MM-DD' format
+    - end_date (str): End date in 'YYYYMMDD' or 'YYYY-MM-DD' format
+    - method (str): PET method from pastas_wv2030.pet.PET_METHODS
+    - kwargs: Passed on to fetch_knmi_daily (cache_dir, offline, url)
+
+    Returns:
+    - prec (pd.Series): Precipitation series in mm/day (float64)
+    - evap (pd.Series): Evapotranspiration series in mm/day (float64)
+    """
+    knmi_df = fetch_knmi_daily(station, start_date, end_date, **kwargs)
+    knmi_df["ET"] = pet_from_frame(knmi_df, method)
+    knmi_df = knmi_df.set_index("DATE")
+
+    prec = knmi_df["Precipitation"].astype(float)
+    evap = knmi_df["ET"].astype(float)
+    return prec, evap
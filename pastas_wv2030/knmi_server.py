@@ -0,0 +1,115 @@
+# Local stand-in for the KNMI daggegevens endpoint, for tests and offline work
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import numpy as np
+import pandas as pd
+
+from pastas_wv2030.knmi import KNMI_STATIONS, KNMI_VARS
+
+
+def synthetic_knmi_frame(stations, start, end, seed: int = 0) -> pd.DataFrame:
+    """
+    Plausible daily KNMI data in project units, for tests and benchmarks.
+
+    Returns:
+    - knmi_df (pd.DataFrame): Columns STN, DATE, Radiation, Precipitation, Tmin, Tmax, Tavg
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, end, freq="D")
+    frames = []
+    for stn in stations:
+        season = np.sin(2 * np.pi * (dates.dayofyear.values - 110) / 365.25)
+        tavg = 10.0 + 7.0 * season + rng.normal(0, 2.5, dates.size)
+        spread = rng.uniform(2.0, 10.0, dates.size)
+        frames.append(pd.DataFrame({
+            "STN": stn,
+            "DATE": dates,
+            "Radiation": np.clip(10.0 + 8.0 * season + rng.normal(0, 3.0, dates.size), 0.5, None),
+            "Precipitation": np.where(rng.random(dates.size) < 0.45, rng.gamma(0.8, 5.0, dates.size), 0.0),
+            "Tmin": tavg - spread / 2,
+            "Tmax": tavg + spread / 2,
+            "Tavg": tavg,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def to_knmi_csv(knmi_df: pd.DataFrame) -> str:
+    """
+    Format a frame in project units as a daggegevens CSV response (integer KNMI units),
+    with the coordinates of the stations in KNMI_STATIONS in the header.
+    """
+    lines = [
+        "# BRON: KONINKLIJK NEDERLANDS METEOROLOGISCH INSTITUUT (KNMI) - LOCAL STAND-IN",
+        "#",
+        "# STN         LON(east)   LAT(north)  ALT(m)      NAME",
+    ]
+    for stn in sorted(set(knmi_df["STN"])):
+        if stn in KNMI_STATIONS:
+            name, lon, lat = KNMI_STATIONS[stn]
+            lines.append(f"# {stn:<11} {lon:<11.3f} {lat:<11.3f} {0.0:<11.2f} {name}")
+    lines += ["#", "# STN,YYYYMMDD," + ",".join(f"{var:>5}" for var in KNMI_VARS)]
+    raw = {var: (knmi_df[name] / factor).round() for var, (name, factor) in KNMI_VARS.items()}
+    dates = knmi_df["DATE"].dt.strftime("%Y%m%d").values
+    for i, stn in enumerate(knmi_df["STN"].values):
+        values = ("" if np.isnan(raw[var].iat[i]) else str(int(raw[var].iat[i])) for var in KNMI_VARS)
+        lines.append(f"  {stn},{dates[i]}," + ",".join(f"{v:>5}" for v in values))
+    return "\n".join(lines) + "\n"
+
+
+class KNMIStandInServer(ThreadingHTTPServer):
+    """
+    HTTP server answering daggegevens POST requests from a local frame.
+
+    Every request is recorded in `requests` as (stations, start, end), so a test
+    can check what the cache actually downloaded.
+    """
+
+    def __init__(self, knmi_df: pd.DataFrame, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _KNMIHandler)
+        self.knmi_df = knmi_df
+        self.requests = []
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/klimatologie/daggegevens"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _KNMIHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        stations = [int(stn) for stn in form.get("stns", "").split(":") if stn]
+        start = pd.Timestamp(form["start"])
+        end = pd.Timestamp(form["end"])
+        self.server.requests.append((stations, start, end))
+
+        knmi_df = self.server.knmi_df
+        rows = knmi_df[knmi_df["STN"].isin(stations) & knmi_df["DATE"].between(start, end)]
+        body = to_knmi_csv(rows).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,257 @@
+# Binary model files (.pasz): the content of a .pas file as a small JSON header plus NumPy blocks in a zip
+import copy
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pastas as ps
+from pastas.io import pas
+from pastas.io.base import _load_model
+
+from pastas_wv2030.batch import model_metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the header or the blocks changes
+FORMAT_VERSION = 1
+SUFFIX = ".pasz"
+HEADER = "model.json"
+
+
+def _encode(obj, blocks: dict):
+    """
+    Make a .pas data dict JSON serializable; series are moved to blocks.
+
+    Series with the same content (e.g. the KNMI stresses in several stress
+    models) are stored once. A regular time index is stored as start, step
+    and length instead of as an array.
+    """
+    if isinstance(obj, dict):
+        return {key: _encode(value, blocks) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_encode(value, blocks) for value in obj]
+    if isinstance(obj, pd.Series) and isinstance(obj.index, pd.DatetimeIndex) and obj.dtype.kind in "fiub":
+        index = obj.index.as_unit("ns").asi8
+        values = obj.to_numpy()
+        block = hashlib.sha1(index.tobytes() + values.tobytes() + str(values.dtype).encode()).hexdigest()[:16]
+        ref = {"__series__": block, "name": _encode(obj.name, blocks)}
+        step = np.diff(index)
+        if len(index) > 1 and (step == step[0]).all():
+            ref["index"] = {"start": int(index[0]), "step": int(step[0]), "n": len(index)}
+            blocks[block] = {"values": values}
+        else:
+            blocks[block] = {"index": index, "values": values}
+        return ref
+    if isinstance(obj, pd.Series):
+        return {"__json_series__": obj.to_json(orient="split", date_format="iso", date_unit="ns")}
+    if isinstance(obj, pd.DataFrame):
+        return {"__frame__": {"index": obj.index.tolist(), "columns": obj.columns.tolist(),
+                              "dtypes": [str(dtype) for dtype in obj.dtypes],
+                              "data": _encode(obj.to_numpy(dtype=object).tolist(), blocks)}}
+    if isinstance(obj, pd.Timestamp):
+        return {"__timestamp__": obj.isoformat()}
+    if isinstance(obj, pd.Timedelta):
+        return {"__timedelta__": int(obj.value)}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _decode(obj, blocks):
+    """Inverse of _encode; blocks is called with a block id and returns its arrays."""
+    if isinstance(obj, list):
+        return [_decode(value, blocks) for value in obj]
+    if not isinstance(obj, dict):
+        return obj
+    if "__series__" in obj:
+        arrays = blocks(obj["__series__"])
+        if "index" in obj:
+            regular = obj["index"]
+            index = regular["start"] + regular["step"] * np.arange(regular["n"], dtype="int64")
+        else:
+            index = arrays["index"]
+        return pd.Series(arrays["values"], index=pd.DatetimeIndex(index.view("datetime64[ns]")), name=obj["name"])
+    if "__json_series__" in obj:
+        return pd.read_json(StringIO(obj["__json_series__"]), typ="series", orient="split")
+    if "__frame__" in obj:
+        frame = obj["__frame__"]
+        df = pd.DataFrame(_decode(frame["data"], blocks), index=frame["index"], columns=frame["columns"])
+        return df.astype(dict(zip(frame["columns"], frame["dtypes"])))
+    if "__timestamp__" in obj:
+        return pd.Timestamp(obj["__timestamp__"])
+    if "__timedelta__" in obj:
+        return pd.Timedelta(obj["__timedelta__"], "ns")
+    return {key: _decode(value, blocks) for key, value in obj.items()}
+
+
+def model_stats(ml: ps.Model) -> dict:
+    """Statistics stored in the header, so they can be read without building the model."""
+    return {**model_metrics(ml), "nobs": int(ml.observations().size),
+            "nfev": getattr(ml.solver, "nfev", None), "obj_func": getattr(ml.solver, "obj_func", None)}
+
+
+def dump_data(data: dict, path, stats: dict | None = None, compression: int = zipfile.ZIP_DEFLATED) -> Path:
+    """
+    Write a .pas data dict (pastas.io.pas.load, or ps.Model.to_dict) to a .pasz file.
+
+    Parameters:
+    - data (dict): Model data
+    - path (str | Path): Output file
+    - stats (dict): Statistics to store in the header (see model_stats)
+    - compression (int): zipfile compression of the blocks; ZIP_STORED is faster, ZIP_DEFLATED smaller
+
+    Returns:
+    - path (Path): The written file
+    """
+    path = Path(path)
+    blocks = {}
+    header = {"format": FORMAT_VERSION, "stats": stats or {}, "model": _encode(data, blocks)}
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with zipfile.ZipFile(tmp, "w", compression=compression, compresslevel=1) as zf:
+        zf.writestr(HEADER, json.dumps(header))
+        for block, arrays in blocks.items():
+            for name, array in arrays.items():
+                with zf.open(f"series/{block}/{name}.npy", "w") as f:
+                    np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+    os.replace(tmp, path)
+    return path
+
+
+def dump_model(ml: ps.Model, path, stats: bool = True, **kwargs) -> Path:
+    """Write a model to a .pasz file, like ml.to_file for .pas."""
+    data = ml.to_dict(series=True)
+    return dump_data(data, path, model_stats(ml) if stats else None, **kwargs)
+
+
+class ModelFile:
+    """
+    Lazy reader of a .pasz file.
+
+    Only the JSON header is read for the name, settings, parameters and
+    statistics; the series blocks are read when the data or the model is needed.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._header = None
+
+    @property
+    def header(self) -> dict:
+        if self._header is None:
+            with zipfile.ZipFile(self.path) as zf:
+                self._header = json.loads(zf.read(HEADER))
+            if self._header.get("format") != FORMAT_VERSION:
+                raise ValueError(f"{self.path} has format {self._header.get('format')}, expected {FORMAT_VERSION}")
+        return self._header
+
+    def _no_blocks(self, block):
+        raise KeyError(f"Series block {block} is not read with the header")
+
+    @property
+    def name(self) -> str:
+        return self.header["model"].get("name")
+
+    @property
+    def stats(self) -> dict:
+        """Statistics stored when the file was written (see model_stats)."""
+        return self.header["stats"]
+
+    @property
+    def settings(self) -> dict:
+        return _decode(self.header["model"]["settings"], self._no_blocks)
+
+    @property
+    def parameters(self) -> pd.DataFrame:
+        """Parameter table (initial, optimal, stderr, ...) without reading any series."""
+        return _decode(self.header["model"]["parameters"], self._no_blocks)
+
+    def data(self) -> dict:
+        """The complete model data, as pastas.io.pas.load returns it for the .pas file."""
+        with zipfile.ZipFile(self.path) as zf:
+            def read_block(block):
+                prefix = f"series/{block}/"
+                return {Path(name).stem: np.lib.format.read_array(zf.open(name), allow_pickle=False)
+                        for name in zf.namelist() if name.startswith(prefix)}
+
+            return _decode(copy.deepcopy(self.header["model"]), read_block)
+
+    def load(self) -> ps.Model:
+        """Build the Pastas model."""
+        return _load_model(self.data())
+
+
+def load_model(path) -> ps.Model:
+    """Load a model from a .pasz file, like ps.io.load for .pas."""
+    return ModelFile(path).load()
+
+
+def pas_to_pasz(src, dst=None, stats: bool = True, **kwargs) -> Path:
+    """
+    Convert a .pas file to .pasz (next to it by default).
+
+    The data is taken from the file as is, so converting back gives the same .pas
+    content; with stats the model is built once to compute the header statistics.
+    """
+    src = Path(src)
+    data = pas.load(src)
+    model_stats_ = model_stats(_load_model(copy.deepcopy(data))) if stats else None
+    return dump_data(data, dst or src.with_suffix(SUFFIX), model_stats_, **kwargs)
+
+
+def pasz_to_pas(src, dst=None) -> Path:
+    """Convert a .pasz file back to .pas (next to it by default)."""
+    src = Path(src)
+    dst = Path(dst or src.with_suffix(".pas"))
+    pas.dump(dst, ModelFile(src).data())
+    return dst
+
+
+def convert_folder(folder, pattern: str = "*.pas", output_dir=None, force: bool = False,
+                   max_workers: int | None = None) -> dict:
+    """
+    Convert all .pas files in a folder to .pasz, skipping files whose .pasz is newer.
+
+    Returns:
+    - counts (dict): Number of 'converted', 'skipped' and 'failed' files
+    """
+    output_dir = Path(output_dir or folder)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    files = sorted(Path(folder).glob(pattern))
+    todo = {}
+    for src in files:
+        dst = output_dir / f"{src.stem}{SUFFIX}"
+        if force or not dst.exists() or dst.stat().st_mtime_ns < src.stat().st_mtime_ns:
+            todo[src] = dst
+    counts = {"converted": 0, "skipped": len(files) - len(todo), "failed": 0}
+
+    def done(src, error=None):
+        if error is None:
+            counts["converted"] += 1
+        else:
+            counts["failed"] += 1
+            logger.error("Failed to convert %s: %s", src.name, error)
+
+    if (max_workers or os.cpu_count()) == 1:
+        for src, dst in todo.items():
+            try:
+                pas_to_pasz(src, dst)
+                done(src)
+            except Exception as e:
+                done(src, e)
+    elif todo:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(pas_to_pasz, src, dst): src for src, dst in todo.items()}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done(futures[future])
+                except Exception as e:
+                    done(futures[future], e)
+    return counts
@@ -0,0 +1,84 @@
+# Vectorized potential evapotranspiration (PET) kernels
+#
+# All kernels work on NumPy arrays of any shape: a single station (1-D) or many
+# stations at once (2-D, days x stations). Days with a missing input get NaN.
+import numpy as np
+import pandas as pd
+
+
+def hargreaves(tavg, tmax, tmin, radiation):
+    """
+    Hargreaves PET as used in the project since the first KNMI downloads.
+
+    Parameters:
+    - tavg, tmax, tmin (array_like): Daily mean, maximum and minimum temperature (°C)
+    - radiation (array_like): Global radiation (MJ/m2/day)
+
+    Returns:
+    - pet (np.ndarray): Evapotranspiration (mm/day)
+    """
+    tavg, tmax, tmin, radiation = np.broadcast_arrays(*(np.asarray(a, dtype=float)
+                                                        for a in (tavg, tmax, tmin, radiation)))
+    spread = tmax - tmin
+    # NaN inputs propagate; a negative spread (bad data) is masked instead of warned about
+    root = np.sqrt(spread, out=np.full(spread.shape, np.nan), where=spread >= 0)
+    return 0.0023 * (tavg + 17.8) * root * radiation
+
+
+def makkink(tavg, radiation):
+    """
+    Makkink reference evaporation, the formula KNMI uses for its EV24 series.
+
+    Parameters:
+    - tavg (array_like): Daily mean temperature (°C)
+    - radiation (array_like): Global radiation (MJ/m2/day)
+
+    Returns:
+    - pet (np.ndarray): Evaporation (mm/day)
+    """
+    tavg, radiation = np.broadcast_arrays(np.asarray(tavg, dtype=float), np.asarray(radiation, dtype=float))
+    # Slope of the saturation vapour pressure curve (kPa/°C)
+    es = 0.6108 * np.exp(17.27 * tavg / (tavg + 237.3))
+    slope = 4098.0 * es / (tavg + 237.3) ** 2
+    gamma = 0.0646 + 0.00006 * tavg  # psychrometric constant (kPa/°C)
+    latent_heat = 2.501 - 0.002361 * tavg  # MJ/kg
+    return 0.65 * slope / (slope + gamma) * radiation / latent_heat
+
+
+# Method name -> (kernel, KNMI frame columns passed to it in order)
+PET_METHODS = {
+    "hargreaves": (hargreaves, ("Tavg", "Tmax", "Tmin", "Radiation")),
+    "makkink": (makkink, ("Tavg", "Radiation")),
+}
+
+
+def register_pet_method(name: str, kernel, columns):
+    """Add a PET kernel, so it can be selected by name in pet_from_frame and pet_wide."""
+    PET_METHODS[name] = (kernel, tuple(columns))
+
+
+def pet_from_frame(knmi_df: pd.DataFrame, method: str = "hargreaves") -> pd.Series:
+    """
+    PET for every row of a KNMI frame (one or many stations in long format).
+
+    Returns:
+    - pet (pd.Series): Aligned with the rows of knmi_df
+    """
+    kernel, columns = PET_METHODS[method]
+    pet = kernel(*(knmi_df[col].to_numpy(dtype=float) for col in columns))
+    return pd.Series(pet, index=knmi_df.index, name="ET")
+
+
+def pet_wide(knmi_df: pd.DataFrame, method: str = "hargreaves") -> pd.DataFrame:
+    """
+    PET for many stations at once as a 2-D (DATE x STN) array.
+
+    Days that a station does not report are NaN.
+
+    Returns:
+    - pet (pd.DataFrame): Index DATE, one column per station
+    """
+    kernel, columns = PET_METHODS[method]
+    wide = knmi_df.pivot(index="DATE", columns="STN", values=list(columns))
+    pet = kernel(*(wide[col].to_numpy(dtype=float) for col in columns))
+    return pd.DataFrame(pet, index=wide.index, columns=wide[columns[0]].columns)
@@ -0,0 +1,155 @@
+# Plotly helpers for long (high-frequency) series: downsampling, WebGL traces and clipped KNMI overlays
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Points per trace after downsampling; a few thousand is about the resolution of a wide chart
+MAX_POINTS = 4000
+# Traces with more points than this are drawn with WebGL (Scattergl); below MAX_POINTS, so long
+# series are still drawn with WebGL after downsampling
+WEBGL_THRESHOLD = 2000
+
+
+def lttb(x, y, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last point and, per bucket, the point spanning the
+    largest triangle with its neighbours, so peaks and dips survive.
+
+    Parameters:
+    - x, y (array_like): Coordinates, x ascending (datetimes as int64 or float)
+    - n_out (int): Number of points to keep
+
+    Returns:
+    - idx (np.ndarray): Indices of the kept points, ascending
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = (x - x[0]) / max(x[-1] - x[0], 1.0)  # scale, so ns timestamps do not lose precision
+    # n_out - 2 buckets over the points between the first and the last one
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(int), n)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(edges[i + 1], edges[i + 2])
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def minmax(y, n_out: int) -> np.ndarray:
+    """
+    Min-max downsampling: the lowest and highest point of n_out / 2 equal buckets.
+
+    Returns:
+    - idx (np.ndarray): Indices of the kept points, ascending
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    nbuckets = n_out // 2
+    if n_out >= n or nbuckets < 1:
+        return np.arange(n)
+    bucket = np.arange(n) * nbuckets // n
+    order = np.lexsort((y, bucket))  # by bucket, then value
+    first = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    return np.unique(np.r_[order[first], order[last]])
+
+
+DOWNSAMPLERS = {
+    "lttb": lambda x, y, n_out: lttb(x, y, n_out),
+    "minmax": lambda x, y, n_out: minmax(y, n_out),
+}
+
+
+def clip(series: pd.Series, start=None, end=None) -> pd.Series:
+    """The part of a series between start and end (inclusive), e.g. the observation window."""
+    return series.loc[pd.Timestamp(start) if start is not None else None:
+                      pd.Timestamp(end) if end is not None else None]
+
+
+def downsample(series: pd.Series, max_points: int | None = MAX_POINTS, method: str = "lttb",
+               start=None, end=None) -> pd.Series:
+    """
+    Clip a series to the visible range and reduce it to at most max_points points.
+
+    Missing values are dropped first; None for max_points only clips.
+    """
+    series = clip(series.dropna(), start, end)
+    if max_points is None or len(series) <= max_points:
+        return series
+    x = series.index.asi8 if isinstance(series.index, pd.DatetimeIndex) else series.index.to_numpy()
+    return series.iloc[DOWNSAMPLERS[method](x, series.to_numpy(dtype=float), max_points)]
+
+
+def scatter_trace(series: pd.Series, max_points: int | None = MAX_POINTS, method: str = "lttb",
+                  start=None, end=None, webgl_threshold: int = WEBGL_THRESHOLD, **kwargs):
+    """
+    A line trace of a (downsampled) series; go.Scattergl when it still has many points.
+
+    Parameters:
+    - series (pd.Series): Series with a DatetimeIndex
+    - max_points (int | None): See downsample
+    - method (str): 'lttb' or 'minmax', see DOWNSAMPLERS
+    - start, end: Visible range; points outside it are not sent to the browser
+    - webgl_threshold (int): Number of points above which WebGL is used
+    - kwargs: Passed to the trace, e.g. name, yaxis, line
+
+    Returns:
+    - trace (go.Scatter | go.Scattergl)
+    """
+    data = downsample(series, max_points, method, start, end)
+    kwargs.setdefault("mode", "lines")
+    kwargs.setdefault("name", series.name)
+    trace = go.Scattergl if len(data) > webgl_threshold else go.Scatter
+    return trace(x=data.index, y=data.values, **kwargs)
+
+
+def knmi_traces(prec: pd.Series, evap: pd.Series, start=None, end=None, **kwargs) -> list:
+    """
+    Precipitation, evapotranspiration and recharge (prec - evap) traces, clipped to start/end.
+
+    Only the observation window is written to the figure, instead of the full
+    KNMI range cropped in view.
+    """
+    prec, evap = clip(prec, start, end), clip(evap, start, end)
+    recharge = (prec - evap).dropna()
+    kwargs.setdefault("line", dict(width=1.5))
+    return [scatter_trace(s, name=name, **kwargs) for s, name in [
+        (prec, "KNMI Precipitation"),
+        (evap, "KNMI Evapotranspiration"),
+        (recharge, "KNMI Recharge"),
+    ]]
+
+
+def head_report_figure(head: pd.Series, prec: pd.Series, evap: pd.Series, title: str,
+                       head_name: str = "head", max_points: int | None = MAX_POINTS) -> go.Figure:
+    """
+    The per-file figure of the PLOT_html_plots notebooks: KNMI series on the left
+    axis and the (aggregated) head on the right, limited to the observation window.
+    """
+    head = head.dropna()
+    start, end = head.index.min(), head.index.max()
+    fig = go.Figure(knmi_traces(prec, evap, start, end, yaxis="y1", max_points=max_points))
+    fig.add_trace(scatter_trace(head, max_points=max_points, name=head_name, yaxis="y2", line=dict(width=2)))
+    fig.update_layout(
+        title=title,
+        xaxis_title='Datum',
+        yaxis=dict(title='mm/dag (KNMI & Local)', side='left'),
+        yaxis2=dict(title=head_name, overlaying='y', side='right', showgrid=False),
+        legend_title='Variabele',
+        hovermode='x unified',
+        template='plotly_white',
+        width=1200,
+        height=600,
+        xaxis=dict(range=[start, end])
+    )
+    return fig
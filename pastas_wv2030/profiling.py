@@ -0,0 +1,234 @@
+# Optional instrumentation of batch runs: stage timers, peak memory, a JSONL event log and profiles of chosen jobs
+import cProfile
+import fnmatch
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+# Profiling settings of the current process; set with configure (run_batch also does so in its workers)
+_settings = {"memory": False, "jobs": None, "profile_dir": None, "profiler": "cprofile"}
+
+
+def configure(memory: bool = False, jobs: str | None = None, profile_dir=None, profiler: str = "cprofile"):
+    """
+    Set the profiling options of the current process.
+
+    Parameters:
+    - memory (bool): Trace memory allocations (tracemalloc) to report the peak memory per stage;
+      this slows the run down noticeably
+    - jobs (str): Glob pattern of the model names to profile, e.g. '13_7_HB28_PB1_FlexModel_Gamma'
+    - profile_dir (str | Path): Folder for the profiles (<model>.prof, or <model>.html for pyinstrument)
+    - profiler (str): 'cprofile' or 'pyinstrument' (must be installed)
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler}, use one of {PROFILERS}")
+    _settings.update(memory=memory, jobs=jobs, profile_dir=profile_dir, profiler=profiler)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+class StageTimer:
+    """
+    Wall time per stage of one unit of work (e.g. one model fit), and the peak
+    traced memory per stage when memory tracing is on (see configure).
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.peaks = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        memory = tracemalloc.is_tracing()
+        if memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+            if memory:
+                self.peaks[name] = max(self.peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+
+    def record(self) -> dict:
+        """Stage times (s) and, when traced, the peak memory (MB) for a results row or log event."""
+        record = {"stages": {name: round(seconds, 6) for name, seconds in self.times.items()}}
+        if self.peaks:
+            record["peak_memory_mb"] = round(max(self.peaks.values()) / 2**20, 3)
+            record["stage_memory_mb"] = {name: round(peak / 2**20, 3) for name, peak in self.peaks.items()}
+        return record
+
+
+def merge_records(*records: dict) -> dict:
+    """Add the stage times of several fits of the same model (e.g. a warm and a cold start)."""
+    stages, memory = {}, {}
+    for record in records:
+        for name, seconds in record.get("stages", {}).items():
+            stages[name] = stages.get(name, 0.0) + seconds
+        for name, peak in record.get("stage_memory_mb", {}).items():
+            memory[name] = max(memory.get(name, 0.0), peak)
+    merged = {"stages": stages}
+    if memory:
+        merged["peak_memory_mb"] = max(memory.values())
+        merged["stage_memory_mb"] = memory
+    return merged
+
+
+@contextmanager
+def profile_job(name: str):
+    """Profile the enclosed code when name matches the configured job pattern, otherwise do nothing."""
+    if _settings["jobs"] is None or not fnmatch.fnmatch(name, _settings["jobs"]):
+        yield
+        return
+    profile_dir = Path(_settings["profile_dir"] or ".")
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    if _settings["profiler"] == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            (profile_dir / f"{name}.html").write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(profile_dir / f"{name}.prof")
+
+
+class ProfileLog:
+    """
+    Structured log of a batch run: one JSON line per pipeline stage (reading,
+    resampling, writing) and per solved model (stage times, nfev, peak memory).
+
+    The profiling options (see configure) apply to the current process while the
+    log is open; run_batch passes them on to its workers.
+    """
+
+    def __init__(self, path, memory: bool = False, jobs: str | None = None, profile_dir=None,
+                 profiler: str = "cprofile"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.settings = {"memory": memory, "jobs": jobs, "profiler": profiler,
+                         "profile_dir": str(profile_dir or self.path.parent / "profiles")}
+        self.file = open(self.path, "w", encoding="utf-8")
+        configure(**self.settings)
+
+    def close(self):
+        self.file.close()
+        configure()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, event: str, **fields):
+        self.file.write(json.dumps({"event": event, "time": time.time(), **fields}, default=str) + "\n")
+        self.file.flush()
+
+    @contextmanager
+    def stage(self, stage: str, **fields):
+        """Time the enclosed code and log it as one stage event, e.g. stage('read', file=name)."""
+        timer = StageTimer()
+        try:
+            with timer.stage(stage):
+                yield
+        finally:
+            record = timer.record()
+            self.write("stage", stage=stage, seconds=record["stages"][stage],
+                       peak_memory_mb=record.get("peak_memory_mb"), **fields)
+
+    def model(self, job, row: dict):
+        """Log one model fit of run_batch (a BatchJob and its results row)."""
+        self.write("model", file=job.file, model=job.model_name, recharge=job.recharge, rfunc=job.rfunc,
+                   noise=job.noise, nfev=row.get("nfev"), solve_time=row.get("solve_time"),
+                   stages=row.get("stages", {}), peak_memory_mb=row.get("peak_memory_mb"),
+                   stage_memory_mb=row.get("stage_memory_mb"), error=row.get("error"))
+
+
+def read_log(path) -> pd.DataFrame:
+    """
+    Events of a ProfileLog file; the stage times and peak memory of model events
+    are expanded to stage_<name> and memory_<name> columns.
+    """
+    with open(path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    df = pd.DataFrame(events)
+    for column, prefix in (("stages", "stage_"), ("stage_memory_mb", "memory_")):
+        if column in df:
+            expanded = pd.DataFrame([v if isinstance(v, dict) else {} for v in df.pop(column)], index=df.index)
+            df = df.join(expanded.add_prefix(prefix))
+    return df
+
+
+def summarize_log(path, top: int = 10) -> dict:
+    """
+    Where the time of a batch run went.
+
+    Returns:
+    - summary (dict of pd.DataFrame):
+      'stages': total time, calls and peak memory per stage (pipeline and model stages),
+      'wells': the top slowest wells, 'variants': solve time and nfev per recharge/response/noise
+      combination (slowest first), 'models': the top slowest single models
+    """
+    df = read_log(path)
+    stage_events = df[df["event"] == "stage"] if "event" in df else df.iloc[:0]
+    models = df[df["event"] == "model"] if "event" in df else df.iloc[:0]
+    if "peak_memory_mb" not in df:
+        stage_events = stage_events.assign(peak_memory_mb=None)
+        models = models.assign(peak_memory_mb=None)
+
+    pipeline = stage_events.groupby("stage").agg(seconds=("seconds", "sum"), calls=("seconds", "size"),
+                                                 peak_memory_mb=("peak_memory_mb", "max"))
+    stage_columns = [c for c in models.columns if c.startswith("stage_")]
+    memory_columns = [c for c in models.columns if c.startswith("memory_")]
+    model_stages = pd.DataFrame({
+        "seconds": models[stage_columns].sum().rename(lambda c: c.removeprefix("stage_")),
+        "calls": models[stage_columns].notna().sum().rename(lambda c: c.removeprefix("stage_")),
+        "peak_memory_mb": models[memory_columns].max().rename(lambda c: c.removeprefix("memory_")),
+    })
+    stages = pd.concat([pipeline, model_stages]).sort_values("seconds", ascending=False)
+    stages["share"] = stages["seconds"] / stages["seconds"].sum()
+
+    time_column = "solve_time"
+    wells = models.groupby("file").agg(seconds=(time_column, "sum"), models=("model", "size"),
+                                       nfev=("nfev", "sum"), failed=("error", "count"),
+                                       slowest_model=(time_column, "max"))
+    variants = models.groupby(["recharge", "rfunc", "noise"]).agg(
+        seconds=(time_column, "sum"), mean_seconds=(time_column, "mean"), mean_nfev=("nfev", "mean"),
+        models=("model", "size"), failed=("error", "count"))
+    columns = ["model", time_column, "nfev", *stage_columns, "peak_memory_mb", "error"]
+    return {
+        "stages": stages,
+        "wells": wells.sort_values("seconds", ascending=False).head(top),
+        "variants": variants.sort_values("seconds", ascending=False),
+        "models": models.sort_values(time_column, ascending=False)[columns].head(top).set_index("model"),
+    }
+
+
+def format_summary(summary: dict) -> str:
+    """Plain-text tables of summarize_log, for the end of a run."""
+    titles = {"stages": "Time per stage", "wells": "Slowest wells", "variants": "Time per model variant",
+              "models": "Slowest models"}
+    parts = []
+    for key, title in titles.items():
+        df = summary[key]
+        if len(df):
+            parts.append(f"{title}:\n{df.round(3).to_string()}")
+    return "\n\n".join(parts)
@@ -0,0 +1,52 @@
+# Readers for the time series files used throughout the project
+from pathlib import Path
+
+import pandas as pd
+
+
+def read_timeseries_csv(path) -> pd.Series:
+    """
+    Read a two-column CSV (date, value) as a pandas Series.
+
+    The first column is always used as the date and the second as the value,
+    as is done for the KNMI precipitation and evaporation files.
+    """
+    df = pd.read_csv(path)
+    date_col = df.columns[0]
+    value_col = df.columns[1]
+    df[date_col] = pd.to_datetime(df[date_col])
+    series = df.set_index(date_col)[value_col].dropna()
+    return series.rename(Path(path).stem)
+
+
+def read_head_csv(path) -> pd.Series:
+    """
+    Read a head series from one of the CSVs in output_files/output_sheets.
+
+    Parameters:
+    - path (str | Path): CSV file with a 'Timestamp' and a 'head' column
+
+    Returns:
+    - head (pd.Series): Raw head series, named after the file
+    """
+    df = pd.read_csv(path, parse_dates=["Timestamp"])
+    df = df.set_index("Timestamp")
+    df = df[~df.index.duplicated(keep="first")]
+    head = pd.to_numeric(df["head"], errors="coerce").dropna()
+    return head.rename(Path(path).stem)
+
+
+def aggregate_daily(head: pd.Series, aggregation: str = "median") -> pd.Series:
+    """
+    Resample a (high-frequency) head series to daily values.
+
+    Parameters:
+    - head (pd.Series): Head series with a DatetimeIndex
+    - aggregation (str): 'mean', 'median' or 'max'; 'original' returns the input
+
+    Returns:
+    - head_daily (pd.Series): Daily series without empty days
+    """
+    if aggregation == "original":
+        return head.dropna()
+    return head.resample("D").agg(aggregation).dropna()
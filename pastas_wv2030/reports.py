@@ -0,0 +1,143 @@
+# Per-file HTML reports (KNMI vs head), rendered in parallel and only when their inputs changed
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+from pastas_wv2030.plotting import MAX_POINTS, head_report_figure
+from pastas_wv2030.readers import aggregate_daily, read_head_csv
+from pastas_wv2030.store import series_hash
+
+logger = logging.getLogger(__name__)
+
+# Bump when the figure layout changes, so all reports are rendered again
+REPORT_VERSION = 1
+MANIFEST = "reports.json"
+
+_worker_stresses = {}
+
+
+def report_signature(path, knmi_hash: str, aggregation: str, max_points) -> str:
+    """Fingerprint of everything a report depends on; the CSV is identified by size and mtime."""
+    stat = os.stat(path)
+    parts = [REPORT_VERSION, aggregation, max_points, knmi_hash, stat.st_size, stat.st_mtime_ns]
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+
+
+def render_report(path, prec: pd.Series, evap: pd.Series, output_dir, aggregation: str = "median",
+                  max_points: int | None = MAX_POINTS) -> Path:
+    """
+    Write the report of one head CSV to output_dir/<stem>.html.
+
+    The HTML refers to a plotly.min.js in the same folder instead of embedding it.
+    """
+    path = Path(path)
+    head = aggregate_daily(read_head_csv(path), aggregation)
+    label = "head" if aggregation == "original" else f"head (Daily {aggregation.capitalize()})"
+    title = f"KNMI vs Local Series ({label}): {path.stem}"
+    fig = head_report_figure(head, prec, evap, title, head_name=label, max_points=max_points)
+    out_html = Path(output_dir) / f"{path.stem}.html"
+    fig.write_html(out_html, include_plotlyjs="directory")
+    return out_html
+
+
+def _init_worker(prec: pd.Series, evap: pd.Series):
+    # The KNMI series are sent to every worker once, not with every file
+    _worker_stresses["prec"] = prec
+    _worker_stresses["evap"] = evap
+
+
+def _render(path, output_dir, aggregation, max_points):
+    render_report(path, _worker_stresses["prec"], _worker_stresses["evap"], output_dir, aggregation, max_points)
+
+
+def generate_reports(files, prec: pd.Series, evap: pd.Series, output_dir, aggregation: str = "median",
+                     max_points: int | None = MAX_POINTS, max_workers: int | None = None,
+                     force: bool = False, progress=None) -> dict:
+    """
+    Render the reports of many head CSVs, skipping those whose inputs did not change.
+
+    A manifest (reports.json) in output_dir records the signature of every
+    rendered report; a report is rendered again when its CSV, the KNMI series,
+    the aggregation or REPORT_VERSION changed, or when the HTML is missing.
+
+    Parameters:
+    - files (list of Path): Head CSVs
+    - prec, evap (pd.Series): KNMI series, loaded once by the caller
+    - output_dir (Path): Folder for the HTML files and the shared plotly.min.js
+    - aggregation (str): Daily aggregation of the head, see aggregate_daily
+    - max_points (int | None): Points per trace, see pastas_wv2030.plotting.downsample
+    - max_workers (int): Worker processes, defaults to all cores; 1 renders in-process
+    - force (bool): Render everything
+    - progress (callable): Called as progress(path, error) after every rendered (or failed) report;
+      an exception raised by it stops the rendering
+
+    Returns:
+    - counts (dict): Number of 'rendered', 'skipped' and 'failed' files
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    bundle = output_dir / "plotly.min.js"
+    if not bundle.exists():
+        # Written once here, so the workers never race on it
+        bundle.write_text(get_plotlyjs(), encoding="utf-8")
+
+    manifest_path = output_dir / MANIFEST
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() and not force else {}
+    knmi_hash = series_hash(pd.concat([prec.rename("prec"), evap.rename("evap")], axis=1))
+
+    todo = {}
+    for path in map(Path, files):
+        signature = report_signature(path, knmi_hash, aggregation, max_points)
+        if manifest.get(path.stem) == signature and (output_dir / f"{path.stem}.html").exists():
+            continue
+        todo[path] = signature
+    counts = {"rendered": 0, "skipped": len(files) - len(todo), "failed": 0}
+    logger.info("%d reports up to date, %d to render", counts["skipped"], len(todo))
+
+    def done(path, error=None):
+        if error is None:
+            manifest[path.stem] = todo[path]
+            counts["rendered"] += 1
+        else:
+            manifest.pop(path.stem, None)
+            counts["failed"] += 1
+            logger.error("Failed to render %s: %s", path.name, error)
+        if progress is not None:
+            progress(path, error)
+
+    try:
+        if (max_workers or os.cpu_count()) == 1:
+            for path in todo:
+                try:
+                    render_report(path, prec, evap, output_dir, aggregation, max_points)
+                except Exception as e:
+                    done(path, e)
+                    continue
+                done(path)
+        elif todo:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(prec, evap)) as pool:
+                futures = {pool.submit(_render, path, output_dir, aggregation, max_points): path for path in todo}
+                try:
+                    for future in as_completed(futures):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            done(futures[future], e)
+                            continue
+                        done(futures[future])
+                except BaseException:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+    finally:
+        # Also record progress when interrupted, so a rerun continues where it stopped
+        tmp = manifest_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        os.replace(tmp, manifest_path)
+    return counts
@@ -0,0 +1,220 @@
+# Adaptive model selection: screen the recharge × response grid with cheap fits, fully fit only the best variants
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pastas as ps
+
+from pastas_wv2030.batch import (_init_worker, _worker_stresses, build_model, make_jobs, prepare_stresses, run_batch,
+                                 well_stress)
+
+logger = logging.getLogger(__name__)
+
+# Screening fits: no noise model, daily mean heads, loose tolerances, and always from the default initial
+# parameters (a warm start can leave a variant at its parent's optimum, after which it would be pruned).
+# Recharge models whose reference response function ends more than 'prune_delta' above the best (in the
+# criterion) clearly lose, and their other response functions are not fitted. The reference fit is a rough
+# guide: on 12 sheets a delta of 40 fitted two thirds of the variants and kept the best screening fit on 11
+# (20 lost it on 4); a larger delta prunes less, an infinite one screens the whole grid
+SCREEN_SETTINGS = {
+    "ftol": 1e-4,
+    "xtol": 1e-4,
+    "prune_delta": 40.0,
+}
+# Response function every recharge model is screened with first (the cheapest, and the simplest of the grid)
+REFERENCE_RFUNC = "Exponential"
+CRITERIA = ("AIC", "BIC")
+SCREEN_COLUMNS = ["file", "model", "RechargeModel", "RechargeRfunc", "AIC", "BIC", "EVP", "nfev", "solves",
+                  "converged", "status", "error"]
+
+
+def _screen_solve(ml: ps.Model, head: pd.Series, settings: dict):
+    ml.solve(tmin=head.index.min(), tmax=head.index.max(), solver=ps.LeastSquares(), report=False,
+             ftol=settings["ftol"], xtol=settings["xtol"])
+    # least_squares status 0: stopped at max_nfev
+    return ml.solver.nfev, ml.solver.result.status != 0
+
+
+def screen_well(jobs: list, head: pd.Series, prec: pd.Series, evap: pd.Series, criterion: str = "AIC",
+                settings: dict | None = None) -> list:
+    """
+    Cheap fits of the variants of one well, skipping the variants of recharge models that clearly lose.
+
+    Every fit is without noise model, on the daily mean heads, with loose
+    tolerances and from the default initial parameters. The grid is screened in
+    three rounds: every recharge model with REFERENCE_RFUNC; all response functions
+    of the recharge models whose reference fit is within settings['prune_delta'] of
+    the best one (or has none); and the response function of the best variant so far
+    with the remaining recharge models, so a recharge model that only wins with
+    another response function is not missed. Variants outside these rounds are
+    pruned without being fitted.
+
+    Parameters:
+    - jobs (list of BatchJob): Jobs of one well (the noise choice is ignored)
+    - criterion (str): 'AIC' or 'BIC' of the noise-free fit
+    - settings (dict): See SCREEN_SETTINGS
+
+    Returns:
+    - rows (list of dict): One row per variant (SCREEN_COLUMNS, status 'screened', 'pruned' or
+      'failed'), with the objective function and optimal parameters under 'obj_func' and 'parameters'
+    """
+    settings = {**SCREEN_SETTINGS, **(settings or {})}
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion {criterion}, use one of {CRITERIA}")
+    head = head.resample("D").mean().dropna()
+    prec, evap = prepare_stresses(head, prec, evap)
+    variants = list(dict.fromkeys((job.file, job.recharge, job.rfunc) for job in jobs))
+    rfuncs = list(dict.fromkeys(rfunc for _, _, rfunc in variants))
+    reference = REFERENCE_RFUNC if REFERENCE_RFUNC in rfuncs else rfuncs[0]
+
+    rows = {}
+
+    def screen(file, recharge, rfunc):
+        name = f"{file}_{recharge}_{rfunc}"
+        row = {"file": file, "model": name, "RechargeModel": recharge, "RechargeRfunc": rfunc, "solves": 1}
+        start = time.perf_counter()
+        try:
+            ml = build_model(head, prec, evap, recharge, rfunc, noise=False, name=name)
+            nfev, converged = _screen_solve(ml, head, settings)
+            row.update(nfev=nfev, converged=converged, AIC=ml.stats.aic(), BIC=ml.stats.bic(), EVP=ml.stats.evp(),
+                       status="screened", error=None, obj_func=ml.solver.obj_func,
+                       parameters=ml.parameters["optimal"])
+        except Exception as e:
+            logger.warning("Screening of %s failed: %s", name, e)
+            row.update(nfev=None, converged=False, AIC=np.nan, BIC=np.nan, EVP=np.nan, status="failed",
+                       error=str(e), obj_func=None, parameters=None)
+        row["solve_time"] = time.perf_counter() - start
+        rows[file, recharge, rfunc] = row
+
+    def best(candidates):
+        scores = [row for row in candidates if row["error"] is None]
+        return min(scores, key=lambda row: row[criterion]) if scores else None
+
+    for variant in variants:
+        if variant[2] == reference:
+            screen(*variant)
+    first = best(rows.values())
+    losers = {key[1] for key, row in rows.items()
+              if first is not None and row[criterion] - first[criterion] > settings["prune_delta"]}
+    for variant in variants:
+        if variant not in rows and variant[1] not in losers:
+            screen(*variant)
+    winner = best(rows.values())
+    for variant in variants:
+        if variant not in rows and winner is not None and variant[2] == winner["RechargeRfunc"]:
+            screen(*variant)
+
+    results = []
+    for file, recharge, rfunc in variants:
+        row = rows.get((file, recharge, rfunc))
+        if row is None:
+            row = {"file": file, "model": f"{file}_{recharge}_{rfunc}", "RechargeModel": recharge,
+                   "RechargeRfunc": rfunc, "AIC": np.nan, "BIC": np.nan, "EVP": np.nan, "nfev": 0, "solves": 0,
+                   "converged": False, "status": "pruned", "error": None, "obj_func": None, "parameters": None,
+                   "solve_time": 0.0}
+        results.append(row)
+    return results
+
+
+def top_variants(rows: list, criterion: str = "AIC", top_k: int = 3) -> list:
+    """The top_k screened variants of one well (lowest criterion first) as (recharge, rfunc)."""
+    screened = [row for row in rows if row.get("status") == "screened"]
+    screened.sort(key=lambda row: row[criterion])
+    return [(row["RechargeModel"], row["RechargeRfunc"]) for row in screened[:top_k]]
+
+
+def rank_full_fits(results_df: pd.DataFrame, criterion: str = "AIC") -> pd.DataFrame:
+    """Sort full fits by file and criterion (lowest first) and flag the best fit of every file in 'chosen'."""
+    results_df = results_df.sort_values(["file", criterion], na_position="last", kind="stable")
+    results_df = results_df.reset_index(drop=True)
+    results_df["chosen"] = ~results_df["file"].duplicated() & results_df[criterion].notna()
+    return results_df
+
+
+def _screen_worker(jobs: list, head: pd.Series, criterion: str, settings: dict) -> list:
+    file = jobs[0].file
+    return screen_well(jobs, head, well_stress(_worker_stresses["prec"], file),
+                       well_stress(_worker_stresses["evap"], file), criterion, settings)
+
+
+def run_selection(heads: dict, prec, evap, jobs: list | None = None, top_k: int = 3, criterion: str = "AIC",
+                  settings: dict | None = None, noise: bool = True, max_workers: int | None = None, **kwargs):
+    """
+    Adaptive model selection: screen the variants of every well (see screen_well), fit
+    only the top_k with noise model and diagnostics (see batch.run_batch) and choose the
+    full fit with the lowest criterion.
+
+    Parameters:
+    - heads (dict): Mapping of series name to (daily) head series
+    - prec, evap (pd.Series | dict): Stresses, shared or per well (see batch.run_batch)
+    - jobs (list of BatchJob): Variants to screen, defaults to the full grid from make_jobs
+    - top_k (int): Variants per well that get the full fit
+    - criterion (str): 'AIC' or 'BIC', of the screening fits for the top_k and of the full fits
+      for the chosen model
+    - settings (dict): Screening settings, see SCREEN_SETTINGS
+    - noise (bool): Full fits with ArNoiseModel
+    - max_workers (int): Number of worker processes, defaults to all cores; 1 runs in-process
+    - kwargs: Passed on to batch.run_batch (store, retry_failed, warm_start, two_step, log, progress);
+      with warm_start the full fits start from the screening fits
+
+    Returns:
+    - results_df (pd.DataFrame): Full fits of the selected variants, as batch.run_batch, sorted
+      by file and criterion, with the column 'chosen' True for the best fit of every file
+    - diagnostics_df (pd.DataFrame): Diagnostics of the full fits
+    - screening_df (pd.DataFrame): All variants (SCREEN_COLUMNS), with the status 'selected'
+      for the variants that got the full fit and 'pruned' for those that were not fitted
+    """
+    if jobs is None:
+        jobs = make_jobs(heads)
+    wells = {}
+    for job in jobs:
+        wells.setdefault(job.file, []).append(job)
+
+    start = time.perf_counter()
+    screened = {}
+    if (max_workers or os.cpu_count()) == 1 or len(wells) < 2:
+        for file, well_jobs in wells.items():
+            screened[file] = screen_well(well_jobs, heads[file], well_stress(prec, file), well_stress(evap, file),
+                                         criterion, settings)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(prec, evap)) as pool:
+            futures = {pool.submit(_screen_worker, well_jobs, heads[file], criterion, settings): file
+                       for file, well_jobs in wells.items()}
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    screened[file] = future.result()
+                except Exception as e:
+                    logger.error("Screening of well %s crashed: %s", file, e)
+    screen_time = time.perf_counter() - start
+
+    selected, known = [], {}
+    for file in wells:
+        rows = screened.get(file, [])
+        for recharge, rfunc in top_variants(rows, criterion, top_k):
+            selected.append(replace(wells[file][0], recharge=recharge, rfunc=rfunc, noise=noise))
+        # Screening fits are the noise-free solutions the full fits start from
+        known[file] = {(row["RechargeModel"], row["RechargeRfunc"], False):
+                           (row["obj_func"], row["parameters"], row["EVP"])
+                       for row in rows if row["parameters"] is not None}
+    keys = {(job.file, job.recharge, job.rfunc) for job in selected}
+    for rows in screened.values():
+        for row in rows:
+            if (row["file"], row["RechargeModel"], row["RechargeRfunc"]) in keys:
+                row["status"] = "selected"
+
+    n_screen = sum(row["solves"] for rows in screened.values() for row in rows)
+    logger.info("Screened %d of %d variants of %d wells in %.1f s; fitting %d selected models",
+                n_screen, sum(len(rows) for rows in screened.values()), len(wells), screen_time, len(selected))
+    # Only with warm_start do the full fits start from the screening fits (guarded as in batch.solve_well):
+    # started from a noise-free fit, the fit with noise model often ends degenerate and is solved again
+    results_df, diagnostics_df = run_batch(heads, prec, evap, selected, max_workers=max_workers, known=known,
+                                           **kwargs)
+    results_df = rank_full_fits(results_df, criterion)
+    screening_df = pd.DataFrame([row for file in wells for row in screened.get(file, [])],
+                                columns=SCREEN_COLUMNS + ["solve_time"])
+    return results_df, diagnostics_df, screening_df
@@ -0,0 +1,336 @@
+# Index of KNMI stations and local rain gauges, and the choice of stresses for every well
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from pastas_wv2030.config import GAUGES_FILE
+from pastas_wv2030.knmi import KNMI_STATIONS, fetch_knmi_daily, read_station_cache
+from pastas_wv2030.pet import pet_wide
+from pastas_wv2030.readers import read_timeseries_csv
+
+logger = logging.getLogger(__name__)
+
+SELECTION_METHODS = ("nearest", "correlation", "blend")
+INDEX_COLUMNS = ["kind", "name", "lon", "lat", "prec_file", "evap_file"]
+SELECTION_COLUMNS = ["well", "variable", "station", "distance_km", "weight", "score"]
+
+# Time scales (days) of the exponential filters of the net precipitation that is
+# correlated with the heads, roughly the range of response times of the models
+CORRELATION_SCALES = (10, 30, 100)
+# Days of overlap between head and stresses needed for a correlation score
+MIN_OVERLAP = 365
+
+
+def rd_to_wgs84(x, y):
+    """
+    Approximate WGS84 coordinates of Rijksdriehoek (EPSG:28992) coordinates.
+
+    Uses the polynomial of Schreutelkamp and Strang van Hees, accurate to about
+    a metre within the Netherlands, which is plenty to choose a station.
+
+    Returns:
+    - lon, lat (np.ndarray): Degrees
+    """
+    dx = (np.asarray(x, dtype=float) - 155000) * 1e-5
+    dy = (np.asarray(y, dtype=float) - 463000) * 1e-5
+    lat = (3235.65389 * dy - 32.58297 * dx**2 - 0.2475 * dy**2 - 0.84978 * dx**2 * dy
+           - 0.0655 * dy**3 - 0.01709 * dx**2 * dy**2 - 0.00738 * dx + 0.0053 * dx**4
+           - 0.00039 * dx**2 * dy**3 + 0.00033 * dx**4 * dy - 0.00012 * dx * dy)
+    lon = (5260.52916 * dx + 105.94684 * dx * dy + 2.45656 * dx * dy**2 - 0.81885 * dx**3
+           + 0.05594 * dx * dy**3 - 0.05607 * dx**3 * dy + 0.01199 * dy - 0.00256 * dx**3 * dy**2
+           + 0.00128 * dx * dy**4 + 0.00022 * dy**2 - 0.00022 * dx**2 + 0.00026 * dx**5)
+    return 5.38720621 + lon / 3600, 52.15517440 + lat / 3600
+
+
+def distance_km(lon1, lat1, lon2, lat2):
+    """Great-circle distance in km (haversine)."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+
+def _with_lonlat(df: pd.DataFrame, path) -> pd.DataFrame:
+    """Add lon/lat columns from x/y (RD) columns when a table has no lon/lat."""
+    if {"lon", "lat"} <= set(df.columns):
+        return df
+    if not {"x", "y"} <= set(df.columns):
+        raise ValueError(f"{path}: needs either x and y (RD) or lon and lat columns")
+    lon, lat = rd_to_wgs84(df["x"], df["y"])
+    return df.assign(lon=lon, lat=lat)
+
+
+def read_locations(path) -> pd.DataFrame:
+    """
+    Well locations: a CSV with a 'name' column (the series name, e.g. the head CSV stem)
+    and x, y (RD, m) or lon, lat (degrees) columns.
+
+    Returns:
+    - locations (pd.DataFrame): Index name, columns lon and lat
+    """
+    df = pd.read_csv(path, dtype={"name": str})
+    return _with_lonlat(df, path).set_index("name")[["lon", "lat"]]
+
+
+def read_gauges(path) -> pd.DataFrame:
+    """
+    Local rain gauges: a CSV with 'station', 'name', x, y (RD) or lon, lat, a 'prec_file'
+    and optionally an 'evap_file' column (files relative to the CSV folder).
+
+    Returns:
+    - gauges (pd.DataFrame): Index station, columns INDEX_COLUMNS
+    """
+    path = Path(path)
+    df = _with_lonlat(pd.read_csv(path, dtype={"station": str, "name": str}), path)
+    if "evap_file" not in df:
+        df["evap_file"] = None
+    for column in ("prec_file", "evap_file"):
+        df[column] = [str(path.parent / f) if isinstance(f, str) and f else None for f in df[column]]
+    df["name"] = df["name"].fillna(df["station"]) if "name" in df else df["station"]
+    return df.assign(kind="gauge").set_index("station")[INDEX_COLUMNS]
+
+
+def station_index(cache_dir=None, gauges=GAUGES_FILE) -> pd.DataFrame:
+    """
+    All stations stresses can be taken from: the KNMI stations in KNMI_STATIONS and
+    in the headers of earlier downloads, and the local rain gauges.
+
+    Parameters:
+    - cache_dir (str | Path): KNMI cache folder, see knmi.fetch_knmi_daily
+    - gauges (str | Path): Gauge table, see read_gauges; skipped when it does not exist
+
+    Returns:
+    - index (pd.DataFrame): Index station (str, the KNMI number for KNMI stations),
+      columns kind ('knmi' or 'gauge'), name, lon, lat, prec_file, evap_file
+    """
+    knmi = {stn: {"name": name, "lon": lon, "lat": lat} for stn, (name, lon, lat) in KNMI_STATIONS.items()}
+    knmi.update(read_station_cache(cache_dir))
+    index = pd.DataFrame([{"station": str(stn), "kind": "knmi", "name": meta["name"], "lon": meta["lon"],
+                           "lat": meta["lat"], "prec_file": None, "evap_file": None}
+                          for stn, meta in sorted(knmi.items())]).set_index("station")
+    if gauges is not None and Path(gauges).exists():
+        index = pd.concat([index, read_gauges(gauges)])
+        index = index[~index.index.duplicated(keep="last")]
+    return index
+
+
+def _has(index: pd.DataFrame, variable: str) -> pd.Series:
+    """Stations that provide the variable: KNMI stations both, gauges what they have a file for."""
+    return (index["kind"] == "knmi") | index[f"{variable}_file"].notna()
+
+
+def nearest_stations(index: pd.DataFrame, lon: float, lat: float, variable: str = "prec", k: int = 1,
+                     max_km: float | None = None) -> pd.Series:
+    """
+    The k stations nearest to a location that provide precipitation or evaporation.
+
+    Returns:
+    - distances (pd.Series): Distance in km, indexed by station, nearest first
+    """
+    candidates = index[_has(index, variable)]
+    distances = pd.Series(distance_km(lon, lat, candidates["lon"], candidates["lat"]), index=candidates.index,
+                          name="distance_km").sort_values(kind="stable")
+    if max_km is not None:
+        distances = distances[distances <= max_km]
+    return distances.head(k)
+
+
+def load_station_stresses(index: pd.DataFrame, stations, start, end, method: str = "hargreaves",
+                          **kwargs) -> dict:
+    """
+    Precipitation and evaporation of many stations, in one cached KNMI request.
+
+    Parameters:
+    - index (pd.DataFrame): See station_index
+    - stations (list of str): Stations in the index
+    - start, end (str | pd.Timestamp): First and last day
+    - method (str): PET method for the KNMI stations, see pet.PET_METHODS
+    - kwargs: Passed on to knmi.fetch_knmi_daily (cache_dir, offline, url)
+
+    Returns:
+    - stresses (dict): station -> (prec, evap) daily series in mm/day; evap is None for
+      a gauge without evaporation file, a station without data gives empty series
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    stations = list(dict.fromkeys(stations))
+    knmi = [int(stn) for stn in stations if index.at[stn, "kind"] == "knmi"]
+    stresses = {}
+    if knmi:
+        knmi_df = fetch_knmi_daily(knmi, start, end, **kwargs)
+        prec = knmi_df.pivot(index="DATE", columns="STN", values="Precipitation")
+        evap = pet_wide(knmi_df, method)
+        for stn in knmi:
+            stresses[str(stn)] = tuple(
+                (wide[stn].dropna() if stn in wide else pd.Series(dtype=float, index=pd.DatetimeIndex([])))
+                .astype(float).rename(f"{variable}_{stn}").rename_axis(None)
+                for variable, wide in (("prec", prec), ("evap", evap)))
+    for stn in stations:
+        if index.at[stn, "kind"] == "gauge":
+            stresses[stn] = tuple(
+                read_timeseries_csv(path).loc[start:end].astype(float).rename(f"{variable}_{stn}")
+                if isinstance(path, str) else None
+                for variable, path in (("prec", index.at[stn, "prec_file"]),
+                                       ("evap", index.at[stn, "evap_file"])))
+    return stresses
+
+
+def correlation_score(head: pd.Series, prec: pd.Series, evap: pd.Series) -> float:
+    """
+    How well a station's net precipitation explains a head series: the largest
+    correlation between the head and the exponentially filtered prec - evap over
+    CORRELATION_SCALES. NaN for less than MIN_OVERLAP days of overlap.
+    """
+    net = (prec - evap).dropna()
+    if net.empty:
+        return np.nan
+    net = net.asfreq("D", fill_value=0.0)
+    head = head.dropna()
+    head = head[head.index.normalize().isin(net.index)]
+    if len(head) < MIN_OVERLAP:
+        return np.nan
+    if head.std() == 0:
+        return np.nan
+    positions = net.index.get_indexer(head.index.normalize())
+    scores = []
+    for days in CORRELATION_SCALES:
+        a = np.exp(-1 / days)
+        filtered = lfilter([1 - a], [1, -a], net.to_numpy())[positions]
+        if filtered.std() > 0:
+            scores.append(np.corrcoef(filtered, head.to_numpy())[0, 1])
+    return float(max(scores)) if scores else np.nan
+
+
+def blend_series(series: list, weights: list, name: str | None = None) -> pd.Series:
+    """
+    Weighted mean of daily series; on days a series is missing the weights of the
+    others are scaled up, days without any data are dropped.
+    """
+    if len(series) == 1:
+        return series[0].rename(name or series[0].name)
+    df = pd.concat(series, axis=1)
+    values = df.to_numpy()
+    w = np.where(np.isnan(values), 0.0, np.asarray(weights, dtype=float))
+    with np.errstate(invalid="ignore"):
+        blended = np.nansum(values * w, axis=1) / w.sum(axis=1)
+    return pd.Series(blended, index=df.index, name=name).dropna()
+
+
+def select_stations(index: pd.DataFrame, locations: pd.DataFrame, stresses: dict, method: str = "nearest",
+                    heads: dict | None = None, k: int = 3, max_km: float | None = None,
+                    power: float = 2.0) -> pd.DataFrame:
+    """
+    Choose the stations (and their weights) of every well.
+
+    Parameters:
+    - index (pd.DataFrame): See station_index
+    - locations (pd.DataFrame): See read_locations
+    - stresses (dict): Loaded candidate stations, see load_station_stresses; stations
+      without data in it are skipped
+    - method (str): 'nearest' station; 'correlation': the precipitation of the best
+      correlated of the k nearest stations (see correlation_score; falls back to the nearest
+      station without head or overlap); 'blend': inverse distance weighting of the k nearest.
+      The evaporation is never chosen by correlation, but from the nearest station
+    - heads (dict): Head series per well, needed for 'correlation'
+    - k (int): Candidate stations per well
+    - max_km (float): Only stations within this distance
+    - power (float): Power of the inverse distance weights of 'blend'
+
+    Returns:
+    - selection (pd.DataFrame): Columns SELECTION_COLUMNS, one row per well, variable and station
+    """
+    if method not in SELECTION_METHODS:
+        raise ValueError(f"Unknown method {method}, use one of {SELECTION_METHODS}")
+    available = {}
+    for position, variable in enumerate(("prec", "evap")):
+        available[variable] = index.loc[[stn for stn in index.index if stn in stresses
+                                         and stresses[stn][position] is not None and len(stresses[stn][position])]]
+    rows = []
+    for well, (lon, lat) in locations[["lon", "lat"]].iterrows():
+        evap_station = None
+        for variable in ("evap", "prec"):
+            n = 1 if method == "nearest" or (method == "correlation" and variable == "evap") else k
+            distances = nearest_stations(available[variable], lon, lat, variable, n, max_km)
+            if distances.empty:
+                logger.warning("No station with %s data for %s", variable, well)
+                break
+            weights = pd.Series(0.0, index=distances.index)
+            scores = pd.Series(np.nan, index=distances.index)
+            if method == "blend":
+                weights[:] = 1 / np.maximum(distances.to_numpy(), 0.1) ** power
+                weights /= weights.sum()
+            elif method == "correlation" and variable == "prec" and heads is not None and well in heads:
+                evap = stresses[evap_station][1]
+                scores = pd.Series({stn: correlation_score(heads[well], stresses[stn][0], evap)
+                                    for stn in distances.index})
+                weights[scores.idxmax() if scores.notna().any() else distances.index[0]] = 1.0
+            else:
+                weights.iloc[0] = 1.0
+            if variable == "evap":
+                evap_station = weights.idxmax()
+            rows += [{"well": well, "variable": variable, "station": stn, "distance_km": distances[stn],
+                      "weight": weights[stn], "score": scores[stn]} for stn in distances.index]
+    return pd.DataFrame(rows, columns=SELECTION_COLUMNS)
+
+
+def selection_stresses(selection: pd.DataFrame, stresses: dict) -> tuple:
+    """
+    The prec and evap series of every well in a selection.
+
+    Wells with the same stations and weights share one series object, so a batch run
+    sends (and hashes) every distinct stress only once.
+
+    Returns:
+    - prec, evap (dict): well -> daily series
+    """
+    selection = selection[selection["weight"] > 0]
+    blends = {}
+    result = {"prec": {}, "evap": {}}
+    for (well, variable), rows in selection.groupby(["well", "variable"], sort=False):
+        key = (variable, tuple(zip(rows["station"], rows["weight"].round(6))))
+        if key not in blends:
+            position = 1 if variable == "evap" else 0
+            blends[key] = blend_series([stresses[stn][position] for stn in rows["station"]], rows["weight"].tolist(),
+                                       f"{variable}_" + "+".join(rows["station"]))
+        result[variable][well] = blends[key]
+    wells = set(result["prec"]) & set(result["evap"])
+    return ({well: s for well, s in result["prec"].items() if well in wells},
+            {well: s for well, s in result["evap"].items() if well in wells})
+
+
+def well_stresses(locations: pd.DataFrame, start, end, method: str = "nearest", heads: dict | None = None,
+                  index: pd.DataFrame | None = None, k: int = 3, max_km: float | None = None,
+                  power: float = 2.0, pet_method: str = "hargreaves", **kwargs):
+    """
+    Stresses for many wells: choose the stations per well and load all of them at once.
+
+    All candidate stations of all wells are fetched in one cached KNMI request (only
+    days that are not cached yet are downloaded), so hundreds of wells near a few
+    stations need at most a few downloads; with offline=True only the cache is used.
+
+    Parameters:
+    - locations (pd.DataFrame): See read_locations
+    - start, end (str | pd.Timestamp): Period of the stresses (including the model warmup)
+    - method, heads, k, max_km, power: See select_stations
+    - index (pd.DataFrame): See station_index, defaults to the index of the KNMI cache folder
+    - pet_method (str): PET method for the KNMI stations
+    - kwargs: Passed on to knmi.fetch_knmi_daily (cache_dir, offline, url)
+
+    Returns:
+    - prec, evap (dict): well -> daily series, for the wells a station was found for
+    - selection (pd.DataFrame): See select_stations
+    """
+    if index is None:
+        index = station_index(kwargs.get("cache_dir"))
+    # Also for 'nearest' the k nearest are loaded, so a station without data in the period is skipped
+    candidates = []
+    for lon, lat in locations[["lon", "lat"]].itertuples(index=False):
+        for variable in ("prec", "evap"):
+            candidates += list(nearest_stations(index, lon, lat, variable, k, max_km).index)
+    stresses = load_station_stresses(index, candidates, start, end, pet_method, **kwargs)
+    selection = select_stations(index, locations, stresses, method, heads, k, max_km, power)
+    prec, evap = selection_stresses(selection, stresses)
+    logger.info("Stresses for %d of %d wells from %d stations", len(prec), len(locations),
+                selection.loc[selection["weight"] > 0, "station"].nunique())
+    return prec, evap, selection
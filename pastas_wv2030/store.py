@@ -0,0 +1,135 @@
+# Checkpointed run store for batch calibrations, keyed by the inputs of each model
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Bump when the way a model is built or solved changes, so old results are refitted
+SOLVER_SETTINGS = {"solver": "LeastSquares", "version": 2}
+
+
+def series_hash(series: pd.Series) -> str:
+    """Content hash of a series (index and values); the name is ignored."""
+    hashed = pd.util.hash_pandas_object(series, index=True).values
+    return hashlib.sha256(hashed.tobytes()).hexdigest()
+
+
+def job_key(job, head_hash: str, stress_hash: str, settings: dict | None = None) -> str:
+    """
+    Key of one model fit in the run store.
+
+    Parameters:
+    - job (BatchJob): Recharge model, response function and noise choice
+    - head_hash (str): series_hash of the (aggregated) head series
+    - stress_hash (str): Combined hash of the stress series
+    - settings (dict): Solver settings, defaults to SOLVER_SETTINGS
+
+    Returns:
+    - key (str): Hex digest that changes whenever any of the inputs change
+    """
+    payload = {
+        "head": head_hash,
+        "stresses": stress_hash,
+        "recharge": job.recharge,
+        "rfunc": job.rfunc,
+        "noise": job.noise,
+        "settings": SOLVER_SETTINGS if settings is None else settings,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class RunStore:
+    """
+    SQLite store with one row per solved (or failed) model.
+
+    Every result is committed as soon as it arrives, so an interrupted batch
+    loses at most the models that were being solved at that moment.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.con = sqlite3.connect(self.path)
+        self.con.execute(
+            """CREATE TABLE IF NOT EXISTS runs (
+                key TEXT PRIMARY KEY,
+                file TEXT,
+                model TEXT,
+                result TEXT,
+                diagnostics TEXT,
+                parameters TEXT,
+                error TEXT,
+                created REAL
+            )"""
+        )
+        self.con.commit()
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.con.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def status(self, keys) -> dict:
+        """Map every stored key in keys to its error message (None for a solved model)."""
+        keys = list(keys)
+        status = {}
+        # Stay below SQLite's limit on the number of query parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            query = f"SELECT key, error FROM runs WHERE key IN ({','.join('?' * len(chunk))})"
+            status.update(self.con.execute(query, chunk).fetchall())
+        return status
+
+    def put(self, key: str, row: dict, diagnostics: pd.DataFrame | None = None,
+            parameters: pd.Series | None = None):
+        """Store (or replace) the result of one model and commit immediately."""
+        self.con.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                row["file"],
+                row["model"],
+                json.dumps(row, default=str),
+                None if diagnostics is None else diagnostics.to_json(orient="records"),
+                None if parameters is None else parameters.to_json(),
+                row.get("error"),
+                time.time(),
+            ),
+        )
+        self.con.commit()
+
+    def get(self, keys):
+        """
+        Load stored results.
+
+        Returns:
+        - rows (list of dict): Result rows in the format of batch.RESULT_COLUMNS
+        - diagnostics (list of pd.DataFrame): Diagnostics of the solved models
+        """
+        keys = list(keys)
+        rows, diagnostics = [], []
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            query = f"SELECT result, diagnostics FROM runs WHERE key IN ({','.join('?' * len(chunk))})"
+            for result, diag in self.con.execute(query, chunk):
+                rows.append(json.loads(result))
+                if diag is not None:
+                    diagnostics.append(pd.DataFrame(json.loads(diag)))
+        return rows, diagnostics
+
+    def parameters(self, key: str) -> pd.Series | None:
+        """Optimal parameters of a stored model, None if it is unknown or failed."""
+        found = self.con.execute("SELECT parameters FROM runs WHERE key = ?", (key,)).fetchone()
+        if found is None or found[0] is None:
+            return None
+        return pd.Series(json.loads(found[0]), dtype=float)
@@ -0,0 +1,257 @@
+# Chunked reading of long logger exports, aggregated to daily values while reading
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from pastas_wv2030.aggregate import STATISTICS, compute_aggregates
+from pastas_wv2030.archive import sanitize_column_name
+from pastas_wv2030.ingest import _to_series
+
+logger = logging.getLogger(__name__)
+
+# Rows per chunk; a chunk of a Fugro export holds this many rows of every sensor column
+CHUNKSIZE = 50_000
+
+
+class DailyAggregator:
+    """
+    Daily statistics of one series, updated chunk by chunk.
+
+    Only the rows of the last (possibly incomplete) day are kept between chunks,
+    so memory stays proportional to the number of days instead of the number of
+    raw rows. The rows must arrive in time order, as in the logger exports;
+    disorder within the last day is allowed.
+    """
+
+    def __init__(self, statistics=STATISTICS, drop_duplicates: bool = True):
+        """
+        Parameters:
+        - statistics (list of str): Daily statistics, a subset of aggregate.STATISTICS
+        - drop_duplicates (bool): Keep only the first row of a repeated timestamp (as read_head_csv does)
+        """
+        self.statistics = list(statistics)
+        self.drop_duplicates = drop_duplicates
+        self.n = 0
+        self._open = None
+        self._open_day = None
+        self._days = []
+
+    def add(self, chunk: pd.Series):
+        """Add the next rows; all days before the last day in them are complete."""
+        if chunk.empty:
+            return
+        if self._open_day is not None and chunk.index.min() < self._open_day:
+            raise ValueError(f"Rows before {self._open_day.date()} arrived after that day was completed; "
+                             f"the series is not in time order")
+        self.n += len(chunk)
+        rows = chunk if self._open is None else pd.concat([self._open, chunk])
+        if not rows.index.is_monotonic_increasing:
+            rows = rows.sort_index(kind="stable")
+        self._open_day = rows.index[-1].normalize()
+        split = rows.index.searchsorted(self._open_day)
+        if split:
+            self._days.append(self._aggregate(rows.iloc[:split]))
+        self._open = rows.iloc[split:]
+
+    def _aggregate(self, rows: pd.Series) -> pd.DataFrame:
+        if self.drop_duplicates:
+            rows = rows[~rows.index.duplicated(keep="first")]
+        return compute_aggregates(rows, "D")[self.statistics]
+
+    def result(self) -> pd.DataFrame:
+        """
+        Returns:
+        - daily (pd.DataFrame): One row per day with data, one column per statistic
+          (as aggregate.compute_aggregates)
+        """
+        days = list(self._days)
+        if self._open is not None and len(self._open):
+            days.append(self._aggregate(self._open))
+        if not days:
+            return self._aggregate(pd.Series(dtype=float, index=pd.DatetimeIndex([])))
+        return pd.concat(days)
+
+
+def _chunks(rows, chunksize: int):
+    """Group an iterator of rows into lists of at most chunksize rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_fugro_chunks(path, chunksize: int = CHUNKSIZE):
+    """
+    Chunked read_fugro_workbook.
+
+    Yields:
+    - (key, series_id, chunk, meta): key tells the columns apart (series IDs can repeat in a file)
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        for _ in range(6):
+            next(rows)
+        header = [str(h) if h is not None else None for h in next(rows)]
+        next(rows)  # polluted first row
+        ncol = len(header)
+        columns = [i for i, col in enumerate(header) if i > 0 and col is not None and col != "Time"]
+        metas = {}
+        for i in columns:
+            unit = re.search(r"\[([^\[\]]*[a-zA-Z][^\[\]]*)\]", header[i])
+            metas[i] = {"source": "fugro", "file": Path(path).name, "sheet": ws.title, "column": header[i],
+                        "unit": unit.group(1) if unit else None}
+        for chunk in _chunks((row for row in rows if row[0] is not None), chunksize):
+            chunk = [tuple(row) + (None,) * (ncol - len(row)) for row in chunk]
+            timestamps = [row[0] for row in chunk]
+            for i in columns:
+                series = _to_series(timestamps, [row[i] for row in chunk])
+                yield i, sanitize_column_name(header[i]), series, metas[i]
+    finally:
+        wb.close()
+
+
+def iter_geoloket_chunks(path, chunksize: int = CHUNKSIZE):
+    """Chunked read_geoloket_workbook; yields (key, series_id, chunk, meta)."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            try:
+                name = str(next(rows)[0]).strip()
+                header = [str(h) if h is not None else "" for h in next(rows)]
+            except StopIteration:
+                continue
+            ts_col = next((i for i, col in enumerate(header) if "Timestamp" in col), None)
+            wn_col = next((i for i, col in enumerate(header) if "Waterniveau (m NAP)" in col), None)
+            if ts_col is None or wn_col is None:
+                logger.info("%s - Sheet %s: required columns not found", Path(path).name, ws.title)
+                continue
+            meta = {"source": "geoloket", "file": Path(path).name, "sheet": ws.title,
+                    "column": header[wn_col], "unit": "m NAP"}
+            width = max(ts_col, wn_col)
+            for chunk in _chunks((row for row in rows if len(row) > width), chunksize):
+                series = _to_series([row[ts_col] for row in chunk], [row[wn_col] for row in chunk])
+                yield ws.title, name, series, meta
+    finally:
+        wb.close()
+
+
+def iter_beemster_chunks(path, chunksize: int = CHUNKSIZE):
+    """Chunked read_beemster_workbook (heads converted from cm to m); yields (key, series_id, chunk, meta)."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        meta = {"source": "beemster", "file": Path(path).name, "sheet": ws.title, "column": "head", "unit": "m"}
+        rows = (row for row in ws.iter_rows(min_row=2, max_col=2, values_only=True)
+                if len(row) == 2 and row[0] is not None)
+        for chunk in _chunks(rows, chunksize):
+            series = _to_series([row[0] for row in chunk], [row[1] for row in chunk], dayfirst=True) / 100
+            yield None, Path(path).stem, series, meta
+    finally:
+        wb.close()
+
+
+def iter_csv_chunks(path, chunksize: int = CHUNKSIZE):
+    """Chunked read_output_sheet (a 'Timestamp' and a 'head' column); yields (key, series_id, chunk, meta)."""
+    meta = {"source": "csv", "file": Path(path).name, "sheet": None, "column": "head", "unit": None}
+    for chunk in pd.read_csv(path, usecols=["Timestamp", "head"], dtype={"Timestamp": str}, chunksize=chunksize):
+        yield None, Path(path).stem, _to_series(chunk["Timestamp"].to_numpy(), chunk["head"].to_numpy()), meta
+
+
+CHUNK_READERS = {
+    "fugro": iter_fugro_chunks,
+    "geoloket": iter_geoloket_chunks,
+    "beemster": iter_beemster_chunks,
+    "csv": iter_csv_chunks,
+}
+
+
+def stream_file(path, layout: str, statistics=STATISTICS, chunksize: int = CHUNKSIZE,
+                drop_duplicates: bool = True) -> list:
+    """
+    Read one export in chunks and aggregate every series in it to daily values.
+
+    The raw rows of a file are never held at once, only one chunk and the last
+    day of every series.
+
+    Parameters:
+    - path (str | Path): Export file
+    - layout (str): 'fugro', 'geoloket', 'beemster' or 'csv' (see ingest.LAYOUTS)
+    - statistics (list of str): Daily statistics, see DailyAggregator
+    - chunksize (int): Rows per chunk
+
+    Returns:
+    - series (list of (series_id, daily frame, meta)): As ingest.parse_file, with daily statistics
+      instead of the raw series; meta also holds the number of raw rows 'n_raw'
+    """
+    aggregators = {}
+    for key, series_id, chunk, meta in CHUNK_READERS[layout](path, chunksize):
+        if key not in aggregators:
+            aggregators[key] = (series_id, DailyAggregator(statistics, drop_duplicates), meta)
+        aggregators[key][1].add(chunk)
+    return [(series_id, aggregator.result(), {**meta, "n_raw": aggregator.n})
+            for series_id, aggregator, meta in aggregators.values()]
+
+
+def _stream_file_series(path, layout: str, aggregation: str, chunksize: int) -> list:
+    return [(series_id, daily[aggregation].rename(series_id), meta)
+            for series_id, daily, meta in stream_file(path, layout, [aggregation], chunksize)]
+
+
+def read_daily_heads(sources, aggregation: str = "median", chunksize: int = CHUNKSIZE,
+                     max_workers: int | None = None) -> dict:
+    """
+    Daily head series of many exports, each kept as its own series.
+
+    This replaces reading every export whole and joining them into one wide
+    (mostly empty) frame before resampling: every file is aggregated while it
+    is read, and the result holds each well only on its own days.
+
+    Parameters:
+    - sources (list of (path, layout)): See ingest.default_sources
+    - aggregation (str): 'mean', 'median', 'max' or 'min'
+    - chunksize (int): Rows per chunk
+    - max_workers (int): Worker processes, defaults to all cores; 1 runs in-process
+
+    Returns:
+    - heads (dict): series_id -> daily head series; for a series ID in several sources
+      the one listed last wins (as in ingest.ingest)
+    """
+    if aggregation not in STATISTICS or aggregation == "count":
+        raise ValueError(f"Unknown aggregation: {aggregation}")
+    sources = list(sources)
+    parsed = {}
+    if (max_workers or os.cpu_count()) == 1 or len(sources) < 2:
+        for order, (path, layout) in enumerate(sources):
+            try:
+                parsed[order] = _stream_file_series(path, layout, aggregation, chunksize)
+            except Exception as e:
+                logger.error("Failed to read %s: %s", path, e)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_stream_file_series, path, layout, aggregation, chunksize): (order, path)
+                       for order, (path, layout) in enumerate(sources)}
+            for future in as_completed(futures):
+                order, path = futures[future]
+                try:
+                    parsed[order] = future.result()
+                except Exception as e:
+                    logger.error("Failed to read %s: %s", path, e)
+
+    heads = {}
+    for order in sorted(parsed):
+        for series_id, daily, _ in parsed[order]:
+            if len(daily):
+                heads[series_id] = daily
+    return heads
@@ -0,0 +1,236 @@
+# Monte Carlo parameter uncertainty of solved Pastas models, with batched ensemble simulation
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pastas as ps
+from scipy.fft import irfft, next_fast_len, rfft
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.025, 0.05, 0.5, 0.95, 0.975)
+# Ensembles larger than this (in bytes) are kept in a memory-mapped temporary file
+MAX_IN_MEMORY = 256 * 2**20
+
+
+def parameter_samples(ml: ps.Model, n: int = 1000, seed: int | None = None, max_iter: int = 10) -> pd.DataFrame:
+    """
+    Draw parameter sets from the covariance matrix of a solved model.
+
+    Like ps.Solver.get_parameter_sample: a multivariate normal around the optimal
+    parameters, truncated to pmin/pmax; fixed parameters keep their optimal value.
+
+    Returns:
+    - samples (pd.DataFrame): n rows, one column per model parameter
+    """
+    parameters = ml.parameters
+    p = parameters["optimal"].to_numpy(dtype=float)
+    pcov = ml.solver.pcov.reindex(index=parameters.index, columns=parameters.index).fillna(0.0).to_numpy()
+    pmin = parameters["pmin"].fillna(-np.inf).to_numpy(dtype=float)
+    pmax = parameters["pmax"].fillna(np.inf).to_numpy(dtype=float)
+
+    rng = np.random.default_rng(seed)
+    accepted = []
+    for _ in range(max_iter):
+        s = rng.multivariate_normal(p, pcov, size=n, check_valid="ignore", method="eigh")
+        accepted.append(s[np.all((s >= pmin) & (s <= pmax), axis=1)])
+        if sum(len(a) for a in accepted) >= n:
+            break
+    samples = np.concatenate(accepted)[:n]
+    if len(samples) == 0:
+        raise ValueError(f"No parameter samples of {ml.name} within pmin/pmax; the covariance matrix "
+                         "is probably degenerate (check the stderr of the parameters)")
+    if len(samples) < n:
+        logger.warning("Only %d of %d parameter samples within bounds; increase max_iter", len(samples), n)
+    return pd.DataFrame(samples, columns=parameters.index)
+
+
+def chain_samples(ml: ps.Model, n: int = 1000, chain=None, discard: int = 0, thin: int = 1,
+                  seed: int | None = None) -> pd.DataFrame:
+    """
+    Draw parameter sets from an MCMC chain.
+
+    Parameters:
+    - ml (ps.Model): Model solved with ps.EmceeSolve, or any solved model when chain is given
+    - n (int): Number of samples, drawn with replacement from the (flattened) chain
+    - chain (np.ndarray): Flat chain (steps x varying parameters); default ml.solver.sampler
+    - discard, thin (int): Burn-in and thinning of the emcee chain
+
+    Returns:
+    - samples (pd.DataFrame): n rows, one column per model parameter
+    """
+    parameters = ml.parameters
+    vary = parameters["vary"].to_numpy(dtype=bool)
+    if chain is None:
+        chain = ml.solver.sampler.get_chain(flat=True, discard=discard, thin=thin)
+    # EmceeSolve appends its own (noise) parameters after the model parameters
+    chain = np.asarray(chain)[:, :vary.sum()]
+    rng = np.random.default_rng(seed)
+    samples = np.tile(parameters["optimal"].to_numpy(dtype=float), (n, 1))
+    samples[:, vary] = chain[rng.integers(0, len(chain), n)]
+    return pd.DataFrame(samples, columns=parameters.index)
+
+
+def _is_batchable(ml: ps.Model) -> bool:
+    """Whether every contribution is a linear convolution that simulate_ensemble can batch."""
+    if ml.transform is not None:
+        return False
+    for sm in ml.stressmodels.values():
+        if type(sm) not in (ps.StressModel, ps.RechargeModel):
+            return False
+    return True
+
+
+def _stress_spectrum(sm, p: np.ndarray, nfft: int, cache: dict) -> np.ndarray:
+    """rFFT of the stress of one stress model for a chunk of parameter sets (rows of p)."""
+    if type(sm) is ps.StressModel:
+        if ("stress", nfft) not in cache:
+            cache["stress", nfft] = rfft(sm.stress[0].series.to_numpy(dtype=float), nfft)
+        return cache["stress", nfft][np.newaxis]
+    prec = sm.prec.series.to_numpy(dtype=float)
+    evap = sm.evap.series.to_numpy(dtype=float)
+    p_rch = p[:, sm.nparam - sm.recharge.nparam:]
+    if isinstance(sm.recharge, ps.rch.Linear):
+        # prec + f * evap is linear in f: transform prec and evap once, combine per sample
+        if ("prec", nfft) not in cache:
+            cache["prec", nfft] = rfft(prec, nfft)
+            cache["evap", nfft] = rfft(evap, nfft)
+        return cache["prec", nfft] + p_rch[:, [0]] * cache["evap", nfft]
+    temp = sm.temp.series.to_numpy(dtype=float) if sm.temp is not None else None
+    recharge = np.stack([sm.recharge.simulate(prec=prec, evap=evap, p=pi, temp=temp) for pi in p_rch])
+    return rfft(recharge, nfft, axis=1)
+
+
+def simulate_ensemble(ml: ps.Model, samples, chunk_size: int = 256, out=None, sigma: float | None = None,
+                      seed: int | None = None):
+    """
+    Simulate a solved model for many parameter sets at once.
+
+    Per chunk of samples the response blocks are built, padded to a common
+    length and convolved with the stresses in one batched FFT, instead of
+    calling ml.simulate for every sample. Models with other components (e.g.
+    TarsoModel or a transform) fall back to ml.simulate per sample.
+
+    Parameters:
+    - ml (ps.Model): Solved model
+    - samples (pd.DataFrame | np.ndarray): Parameter sets, one per row (see parameter_samples)
+    - chunk_size (int): Samples per batch; bounds the working memory
+    - out (np.ndarray): Array (len(samples) x len(index)) to write into, e.g. a np.memmap;
+      a float32 array is created when omitted
+    - sigma (float): Add normal noise with this standard deviation (prediction instead of
+      confidence intervals)
+    - seed (int): Seed for the noise
+
+    Returns:
+    - ensemble (np.ndarray): One simulation per row, without the warmup period
+    - index (pd.DatetimeIndex): Time steps of the columns
+    """
+    samples = np.asarray(samples, dtype=float)
+    reference = ml.simulate(return_warmup=True)
+    sim_index = reference.index
+    tmin, tmax = ml.settings["tmin"], ml.settings["tmax"]
+    # The simulation period without the warmup, a contiguous range of sim_index
+    keep = slice(sim_index.searchsorted(tmin), sim_index.searchsorted(tmax, side="right"))
+    index = sim_index[keep]
+    if out is None:
+        out = np.empty((len(samples), len(index)), dtype="float32")
+    rng = np.random.default_rng(seed)
+
+    if not _is_batchable(ml):
+        logger.info("Model %s cannot be batched; simulating %d samples one by one", ml.name, len(samples))
+        for i, p in enumerate(samples):
+            out[i] = ml.simulate(p=p).to_numpy()
+    else:
+        freq = ml.settings["freq"]
+        dt = pd.Timedelta(pd.tseries.frequencies.to_offset(freq)) / pd.Timedelta(1, "D")
+        tstart = sim_index.min()
+        n = len(sim_index)
+        for sm in ml.stressmodels.values():
+            sm.update_stress(tmin=tstart, tmax=tmax, freq=freq)
+        cache = {}
+        for i0 in range(0, len(samples), chunk_size):
+            p = samples[i0:i0 + chunk_size]
+            sim = np.zeros((len(p), len(index)))
+            istart = 0
+            for sm in ml.stressmodels.values():
+                psm = p[:, istart:istart + sm.nparam]
+                blocks = [sm._get_block(pi[:sm.rfunc.nparam], dt, tstart, tmax) for pi in psm]
+                length = max(len(b) for b in blocks)
+                padded = np.zeros((len(blocks), length))
+                for j, b in enumerate(blocks):
+                    padded[j, :len(b)] = b
+                nfft = next_fast_len(n + length - 1, real=True)
+                spectrum = _stress_spectrum(sm, psm, nfft, cache) * rfft(padded, nfft, axis=1)
+                sim += irfft(spectrum, nfft, axis=1)[:, keep]
+                istart += sm.nparam
+            if ml.constant:
+                sim += p[:, [istart]]
+            out[i0:i0 + len(p)] = sim
+            if sigma:
+                out[i0:i0 + len(p)] += sigma * rng.standard_normal(sim.shape, dtype="float32")
+    return out, index
+
+
+def ensemble_bands(ensemble, index, quantiles=QUANTILES, block: int = 512) -> pd.DataFrame:
+    """
+    Quantiles of an ensemble per time step, computed over blocks of columns so a
+    memory-mapped ensemble is never loaded at once. A float32 ensemble stays float32,
+    which halves the memory and time of the quantiles.
+
+    Returns:
+    - bands (pd.DataFrame): Index as the ensemble columns, one column per quantile
+    """
+    bands = np.empty((len(index), len(quantiles)))
+    for j0 in range(0, len(index), block):
+        bands[j0:j0 + block] = np.quantile(np.asarray(ensemble[:, j0:j0 + block]), quantiles, axis=0).T
+    return pd.DataFrame(bands, index=index, columns=list(quantiles))
+
+
+def parameter_distributions(samples: pd.DataFrame, quantiles=QUANTILES) -> pd.DataFrame:
+    """Mean, standard deviation and quantiles of every sampled parameter."""
+    summary = samples.quantile(list(quantiles)).T
+    summary.insert(0, "std", samples.std())
+    summary.insert(0, "mean", samples.mean())
+    return summary
+
+
+def prediction_bands(ml: ps.Model, n: int = 1000, method: str = "covariance", quantiles=QUANTILES,
+                     noise: bool = True, seed: int | None = None, chunk_size: int = 256, memmap=None, **kwargs):
+    """
+    Monte Carlo uncertainty bands of a solved model.
+
+    Parameters:
+    - ml (ps.Model): Solved model
+    - n (int): Number of parameter sets
+    - method (str): 'covariance' (parameter_samples) or 'emcee' (chain_samples, kwargs are
+      passed on, e.g. discard)
+    - quantiles (tuple of float): Quantiles of the bands
+    - noise (bool): Add residual noise (prediction interval, as ps.Solver.prediction_interval);
+      False gives the confidence interval of the simulation
+    - chunk_size (int): Samples simulated per batch
+    - memmap (str | Path): File for the ensemble; by default a temporary file is used
+      when the ensemble exceeds MAX_IN_MEMORY
+
+    Returns:
+    - bands (pd.DataFrame): One column per quantile
+    - samples (pd.DataFrame): The parameter sets used
+    """
+    if method == "covariance":
+        samples = parameter_samples(ml, n, seed=seed)
+    elif method == "emcee":
+        samples = chain_samples(ml, n, seed=seed, **kwargs)
+    else:
+        raise ValueError(f"Unknown sampling method: {method}")
+
+    sigma = ml.residuals().std() if noise else None
+    ntimes = ml.simulate().size
+    with tempfile.TemporaryDirectory() as tmp:
+        out = None
+        if memmap is not None or len(samples) * ntimes * 4 > MAX_IN_MEMORY:
+            out = np.lib.format.open_memmap(memmap or f"{tmp}/ensemble.npy", mode="w+", dtype="float32",
+                                            shape=(len(samples), ntimes))
+        ensemble, index = simulate_ensemble(ml, samples, chunk_size=chunk_size, out=out, sigma=sigma, seed=seed)
+        bands = ensemble_bands(ensemble, index, quantiles)
+        del ensemble, out
+    return bands, samples
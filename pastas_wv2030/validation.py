@@ -0,0 +1,253 @@
+# Validation of all input series: gaps, duplicates, jumps, unit anomalies, outliers and KNMI coverage
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pastas_wv2030.config import INPUT_DIR
+from pastas_wv2030.ingest import default_sources, parse_file
+
+logger = logging.getLogger(__name__)
+
+# Bump when a check changes, so all files are checked again
+VALIDATION_VERSION = 1
+
+# Thresholds of the checks, stored with the report and part of the cache key
+DEFAULT_SETTINGS = {
+    "gap_days": 2.0,  # a time step longer than this is a gap
+    "jump": 0.5,  # m between consecutive values (the 'Jumps >0.5m' of data_validation.xlsx)
+    "cm_level": 20.0,  # |head| above this (m) looks like cm, not m NAP
+    "spike": 0.2,  # m up and back down (or the reverse) around one value
+    "outlier_z": 6.0,  # robust z-score (median/MAD) of an extreme value
+    "outlier_scale": 0.25,  # m; lower bound of the MAD scale, so tight series do not flag every event
+    "min_days": 365,  # days with data needed for a model with a one-year memory
+}
+
+ISSUES = ["empty", "short", "gaps", "duplicates", "conflicting duplicates", "unsorted", "jumps", "cm values",
+          "outliers", "outside KNMI record"]
+
+
+def file_hash(path) -> str:
+    """Content hash of a file, so a copied or touched but unchanged file is not checked again."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def knmi_period(prec: pd.Series, evap: pd.Series) -> tuple:
+    """(first, last) date with both precipitation and evaporation, as ISO strings."""
+    index = prec.dropna().index.intersection(evap.dropna().index)
+    return str(index.min().date()), str(index.max().date())
+
+
+def check_series(series: pd.Series, knmi: tuple | None = None, settings: dict | None = None) -> dict:
+    """
+    Check one raw head series (as parsed, before dropping duplicates or resampling).
+
+    Parameters:
+    - series (pd.Series): Head series with a DatetimeIndex, without empty values
+    - knmi (tuple): (first, last) date of the KNMI record, see knmi_period
+    - settings (dict): Thresholds, defaults to DEFAULT_SETTINGS
+
+    Returns:
+    - row (dict): Statistics of every check and an 'issues' list
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    row = {"n": int(series.size)}
+    if series.empty:
+        return {**row, "issues": ["empty"]}
+
+    index = series.index
+    unsorted = not index.is_monotonic_increasing
+    if unsorted:
+        series = series.sort_index(kind="stable")
+        index = series.index
+    duplicated = index.duplicated(keep=False)
+    n_duplicates = int(index.duplicated().sum())
+    conflicting = int(series[duplicated].groupby(level=0).nunique().gt(1).sum()) if n_duplicates else 0
+    unique = series[~index.duplicated(keep="first")]
+
+    days = unique.index.normalize().unique()
+    first, last = unique.index[0], unique.index[-1]
+    length_days = int((last.normalize() - first.normalize()).days) + 1
+    steps = np.diff(unique.index.asi8) / 86400e9 if len(unique) > 1 else np.array([])
+    gaps = steps[steps > settings["gap_days"]]
+
+    values = unique.to_numpy()
+    median = float(np.median(values))
+    scale = max(float(np.median(np.abs(values - median))) / 0.6745, settings["outlier_scale"])
+    extreme = np.abs(values - median) / scale > settings["outlier_z"]
+    diffs = np.diff(values)
+    spikes = np.zeros(len(values), dtype=bool)
+    spikes[1:-1] = ((np.abs(diffs[:-1]) > settings["spike"]) & (np.abs(diffs[1:]) > settings["spike"])
+                    & (np.sign(diffs[:-1]) != np.sign(diffs[1:])))
+    outliers = int((extreme | spikes).sum())
+    cm_like = float(np.mean(np.abs(values) > settings["cm_level"]))
+
+    row.update({
+        "first": str(first), "last": str(last), "length_days": length_days,
+        "days_with_data": int(len(days)), "days_without_data": length_days - int(len(days)),
+        "median_step_hours": float(np.median(steps) * 24) if len(steps) else None,
+        "n_gaps": int(len(gaps)), "largest_gap_days": float(gaps.max()) if len(gaps) else 0.0,
+        "duplicates": n_duplicates, "conflicting_duplicates": conflicting, "unsorted": unsorted,
+        "jumps": int((np.abs(diffs) > settings["jump"]).sum()),
+        "max_jump": float(np.abs(diffs).max()) if len(diffs) else 0.0,
+        "min": float(values.min()), "median": median, "max": float(values.max()),
+        "cm_like_share": cm_like, "spikes": int(spikes.sum()), "extreme_values": int(extreme.sum()),
+        "outliers": outliers,
+    })
+
+    if knmi is not None:
+        start, end = pd.Timestamp(knmi[0]), pd.Timestamp(knmi[1])
+        overlap = int(((days >= start) & (days <= end)).sum())
+        row.update(knmi_overlap_days=overlap, knmi_coverage=overlap / len(days))
+
+    issues = []
+    if len(days) < settings["min_days"]:
+        issues.append("short")
+    if len(gaps):
+        issues.append("gaps")
+    if n_duplicates:
+        issues.append("duplicates")
+    if conflicting:
+        issues.append("conflicting duplicates")
+    if unsorted:
+        issues.append("unsorted")
+    if row["jumps"]:
+        issues.append("jumps")
+    if cm_like > 0.5:
+        issues.append("cm values")
+    if outliers:
+        issues.append("outliers")
+    if knmi is not None and row["knmi_coverage"] < 1:
+        issues.append("outside KNMI record")
+    row["issues"] = issues
+    return row
+
+
+def validate_file(path, layout: str, knmi: tuple | None = None, settings: dict | None = None) -> list:
+    """
+    Check every series in one file.
+
+    Returns:
+    - rows (list of dict): One row per series (see check_series) with its ID, file and source;
+      a file that cannot be read gives one row with an 'error'
+    """
+    path = Path(path)
+    base = {"file": str(path), "layout": layout}
+    try:
+        parsed = parse_file(path, layout)
+    except Exception as e:
+        return [{**base, "series_id": None, "error": str(e), "issues": ["unreadable"]}]
+    rows = []
+    for series_id, series, meta in parsed:
+        row = {**base, "series_id": series_id, "sheet": meta.get("sheet"), "column": meta.get("column"),
+               "unit": meta.get("unit"), "error": None}
+        row.update(check_series(series, knmi, settings))
+        rows.append(row)
+    return rows
+
+
+def default_validation_sources() -> list:
+    """The raw exports in input_files, the head CSVs in input_files/input_head and output_sheets."""
+    sources = default_sources(include_csv=True)
+    return sources + [(path, "csv") for path in sorted((INPUT_DIR / "input_head").glob("*.csv"))]
+
+
+def _cache_key(content_hash: str, layout: str, knmi, settings: dict) -> str:
+    payload = {"version": VALIDATION_VERSION, "file": content_hash, "layout": layout, "knmi": knmi,
+               "settings": settings}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _read_cache(path) -> dict:
+    if path is None or not Path(path).exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(data, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, default=str)
+    os.replace(tmp, path)
+
+
+def validate_sources(sources, knmi: tuple | None = None, settings: dict | None = None, cache_path=None,
+                     max_workers: int | None = None) -> dict:
+    """
+    Check all files in parallel; files whose content was checked before with the same
+    settings are taken from the cache.
+
+    Parameters:
+    - sources (list of (path, layout)): See default_validation_sources
+    - knmi (tuple): (first, last) date of the KNMI record, see knmi_period
+    - settings (dict): Thresholds, see DEFAULT_SETTINGS
+    - cache_path (str | Path): JSON file with the results per file content; None disables the cache
+    - max_workers (int): Worker processes, defaults to all cores; 1 runs in-process
+
+    Returns:
+    - report (dict): 'created', 'version', 'settings', 'knmi', 'summary' (number of series per
+      issue) and 'series' (one row per series, see check_series)
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    sources = list(sources)
+    keys = [_cache_key(file_hash(path), layout, knmi, settings) for path, layout in sources]
+    cache = _read_cache(cache_path)
+    todo = [i for i, key in enumerate(keys) if key not in cache]
+    logger.info("%d of %d files to check (%d cached)", len(todo), len(sources), len(sources) - len(todo))
+
+    results = {}
+    if (max_workers or os.cpu_count()) == 1 or len(todo) < 2:
+        for i in todo:
+            results[i] = validate_file(*sources[i], knmi, settings)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(validate_file, *sources[i], knmi, settings): i for i in todo}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+    rows = []
+    for i, ((path, layout), key) in enumerate(zip(sources, keys)):
+        if i in results:
+            cache[key] = results[i]
+        # The cached rows name the file where its content was first seen
+        rows += [{**row, "file": str(path)} for row in cache[key]]
+    if cache_path is not None and results:
+        _write_json({key: cache[key] for key in set(keys)}, cache_path)
+
+    summary = {issue: sum(issue in row["issues"] for row in rows) for issue in ISSUES + ["unreadable"]}
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "version": VALIDATION_VERSION,
+        "settings": settings,
+        "knmi": knmi,
+        "files": len(sources),
+        "summary": summary,
+        "series": rows,
+    }
+
+
+def write_report(report: dict, path) -> Path:
+    """Write the report as one JSON file."""
+    _write_json(report, path)
+    return Path(path)
+
+
+def report_frame(report: dict) -> pd.DataFrame:
+    """The series of a report as a table, with the issues joined into one column."""
+    df = pd.DataFrame(report["series"])
+    if len(df):
+        df["issues"] = df["issues"].map("; ".join)
+    return df
@@ -0,0 +1,49 @@
+# Command line entry point: convert .pas model files to binary .pasz files (or back)
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from pastas_wv2030.config import MODELS_DIR
+from pastas_wv2030.modelfile import convert_folder, pasz_to_pas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert .pas files to .pasz, skipping files already converted.")
+    parser.add_argument("--input-dir", type=Path, default=MODELS_DIR, help="Folder with model files")
+    parser.add_argument("--pattern", default=None, help="Glob pattern (default: *.pas, or *.pasz with --to-pas)")
+    parser.add_argument("--output-dir", type=Path, default=None,
+                        help="Output folder (default: --input-dir; required with --to-pas)")
+    parser.add_argument("--to-pas", action="store_true", help="Convert .pasz files back to .pas")
+    parser.add_argument("--overwrite", action="store_true", help="With --to-pas, replace existing .pas files")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Also convert files that are up to date")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    start = time.perf_counter()
+    if args.to_pas:
+        # The input folder usually still holds the original .pas files, which must not be overwritten
+        if args.output_dir is None:
+            parser.error("--to-pas needs an explicit --output-dir")
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        files = sorted(args.input_dir.glob(args.pattern or "*.pasz"))
+        n_converted = n_existing = 0
+        for path in files:
+            target = args.output_dir / f"{path.stem}.pas"
+            if target.exists() and not args.overwrite:
+                n_existing += 1
+                continue
+            pasz_to_pas(path, target)
+            n_converted += 1
+        print(f"{n_converted} converted to .pas, {n_existing} skipped because the .pas exists (use --overwrite) "
+              f"in {time.perf_counter() - start:.1f} s -> {args.output_dir}")
+    else:
+        counts = convert_folder(args.input_dir, args.pattern or "*.pas", args.output_dir, force=args.force,
+                                max_workers=args.workers)
+        print(f"{counts['converted']} converted, {counts['skipped']} up to date, {counts['failed']} failed "
+              f"in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
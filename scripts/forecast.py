@@ -0,0 +1,50 @@
+# Command line entry point: percentile bands of solved models under resampled and delta-change forcing scenarios
+import argparse
+import logging
+import time
+from pathlib import Path
+
+import pastas as ps
+
+from pastas_wv2030.config import MODELS_DIR, OUTPUT_DIR, SCENARIOS_FILE
+from pastas_wv2030.forecast import QUANTILES, bands_frame, delta_scenarios, forecast_wells
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast solved models under many forcing scenarios.")
+    parser.add_argument("--models", type=Path, default=MODELS_DIR, help="Folder with .pas/.pasz models")
+    parser.add_argument("--pattern", default="*_Best_Fit.pas*", help="Glob pattern for the model files")
+    parser.add_argument("--n", type=int, default=200, help="Resampled futures per scenario")
+    parser.add_argument("--horizon", type=int, default=10, help="Years to forecast")
+    parser.add_argument("--scenarios", nargs="+", default=["reference", "dry", "wet"],
+                        help="Delta-change scenarios (built-in and those in --scenario-file)")
+    parser.add_argument("--scenario-file", type=Path, default=SCENARIOS_FILE,
+                        help="CSV with scenario, variable, month and factor columns")
+    parser.add_argument("--start", default=None, help="First forecast day (default: after the stresses end)")
+    parser.add_argument("--quantiles", type=float, nargs="+", default=list(QUANTILES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR / "forecast" / "forecast_bands.csv")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    ps.set_log_level("ERROR")
+
+    deltas = delta_scenarios(args.scenario_file)
+    unknown = [s for s in args.scenarios if s not in deltas]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}, choose from {list(deltas)}")
+    paths = sorted(args.models.glob(args.pattern))
+    print(f"Forecasting {len(paths)} models: {args.n} futures x {len(args.scenarios)} scenarios, "
+          f"{args.horizon} years")
+
+    start = time.perf_counter()
+    bands = forecast_wells({path.name: path for path in paths}, args.n, args.horizon, args.scenarios, args.start,
+                           tuple(args.quantiles), args.seed, deltas, args.workers)
+    df = bands_frame(bands)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(args.output, index=False)
+    print(f"{len(bands)} of {len(paths)} models in {time.perf_counter() - start:.1f} s; bands saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
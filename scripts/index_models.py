@@ -0,0 +1,32 @@
+# Command line entry point: update the model comparison index
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from pastas_wv2030.compare import update_index
+from pastas_wv2030.config import BATCH_STORE, MODEL_INDEX, MODELS_DIR
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index solved models (.pas files and batch runs) for comparison.")
+    parser.add_argument("--models-dir", type=Path, nargs="*", default=[MODELS_DIR],
+                        help="Folders with *_Best_Fit.pas and *_Tarso.pas files")
+    parser.add_argument("--store", type=Path, nargs="*", default=[BATCH_STORE], help="Batch run stores")
+    parser.add_argument("--index", type=Path, default=MODEL_INDEX, help="Index database")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    parser.add_argument("--top", type=int, default=10, help="Print the best N models by EVP")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    start = time.perf_counter()
+    with update_index(args.index, args.models_dir, args.store, max_workers=args.workers) as index:
+        print(f"{len(index)} models indexed in {time.perf_counter() - start:.1f} s -> {args.index}")
+        metrics = index.metrics()
+    if args.top and len(metrics):
+        columns = ["file", "model", "RechargeModel", "RechargeRfunc", "EVP", "RMSE", "AIC"]
+        print(metrics.sort_values("EVP", ascending=False)[columns].head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
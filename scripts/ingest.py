@@ -0,0 +1,59 @@
+# Command line entry point: ingest all raw exports into the series archive
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from pastas_wv2030.aggregate import update_aggregates, update_all
+from pastas_wv2030.archive import SeriesArchive
+from pastas_wv2030.config import ARCHIVE_DIR
+from pastas_wv2030.ingest import LAYOUTS, default_sources, ingest, parse_file
+
+
+def append(archive: SeriesArchive, path: Path, layout: str):
+    """Append the new rows of an updated export and refresh only the affected aggregates."""
+    for series_id, series, meta in parse_file(path, layout):
+        if series_id in archive:
+            new = archive.append_series(series_id, series)
+        else:
+            archive.write_series(series_id, series, meta)
+            archive.flush()
+            new = series
+        update_aggregates(archive, series_id)
+        print(f"{series_id}: {len(new)} new rows")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest Fugro, Geoloket and Beemster exports into the series archive.")
+    parser.add_argument("--archive", type=Path, default=ARCHIVE_DIR, help="Archive folder")
+    parser.add_argument("--include-csv", action="store_true",
+                        help="Also ingest output_files/output_sheets (these win over the raw exports)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    parser.add_argument("--no-aggregates", action="store_true",
+                        help="Do not (re)build the daily/weekly/monthly aggregates")
+    parser.add_argument("--append", type=Path, nargs="+", default=None,
+                        help="Only append the new rows of these (updated) exports to the archive")
+    parser.add_argument("--layout", choices=list(LAYOUTS), default="fugro", help="Layout of the --append files")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.append:
+        archive = SeriesArchive(args.archive)
+        for path in args.append:
+            append(archive, path, args.layout)
+        return
+
+    sources = default_sources(include_csv=args.include_csv)
+    start = time.perf_counter()
+    archive = ingest(sources, args.archive, max_workers=args.workers)
+    print(f"Ingested {len(archive)} series from {len(sources)} files in {time.perf_counter() - start:.1f} s")
+    print(archive.index.groupby("source")["n"].agg(["count", "sum"]))
+
+    if not args.no_aggregates:
+        start = time.perf_counter()
+        update_all(archive, max_workers=args.workers)
+        print(f"Updated aggregates in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Command line entry point: worker service for the job queue of the app (calibrations, batches, reports);
+# start it next to `streamlit run app_UI/app.py`, more than once to run several jobs side by side
+import argparse
+import logging
+import multiprocessing
+import signal
+from pathlib import Path
+
+import pastas as ps
+
+from pastas_wv2030.config import JOB_QUEUE
+from pastas_wv2030.jobs import JobQueue, run_worker
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(queue, poll, once):
+    # Stopped with SIGTERM as with Ctrl+C: the running job is left for the next worker, which
+    # continues it (batches resume from the run store)
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        n_jobs = run_worker(queue, poll, once)
+    except KeyboardInterrupt:
+        logging.info("Worker stopped")
+        return
+    logging.info("%d jobs run", n_jobs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the jobs queued by the app.")
+    parser.add_argument("--queue", type=Path, default=JOB_QUEUE, help="Job queue database")
+    parser.add_argument("--concurrent", type=int, default=1,
+                        help="Number of worker processes, each running one job at a time")
+    parser.add_argument("--poll", type=float, default=1.0, help="Seconds between looks at an empty queue")
+    parser.add_argument("--once", action="store_true", help="Stop when the queue is empty")
+    parser.add_argument("--list", action="store_true", help="Only print the recent jobs and the live workers")
+    parser.add_argument("--cancel", type=int, nargs="+", default=None, metavar="ID", help="Cancel these jobs")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    ps.set_log_level("ERROR")
+
+    if args.list or args.cancel:
+        with JobQueue(args.queue) as queue:
+            for job_id in args.cancel or []:
+                print(f"Job {job_id}: {'cancelled' if queue.cancel(job_id) else 'already finished or unknown'}")
+            if args.list:
+                print(queue.list().to_string())
+                print(f"\nWorkers:\n{queue.workers().to_string()}")
+        return
+
+    if args.concurrent == 1:
+        serve(args.queue, args.poll, args.once)
+        return
+    # Not daemonic: the workers start process pools of their own
+    workers = [multiprocessing.Process(target=serve, args=(args.queue, args.poll, args.once), name=f"worker-{i}")
+               for i in range(args.concurrent)]
+    for worker in workers:
+        worker.start()
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
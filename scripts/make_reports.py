@@ -0,0 +1,50 @@
+# Command line entry point: HTML reports (KNMI vs head) for all head CSVs
+import argparse
+import logging
+import time
+from datetime import date
+from pathlib import Path
+
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, OUTPUT_DIR, OUTPUT_SHEETS
+from pastas_wv2030.knmi import fetch_knmi_prec_evap
+from pastas_wv2030.readers import read_timeseries_csv
+from pastas_wv2030.reports import generate_reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render an HTML report per head CSV, skipping unchanged ones.")
+    parser.add_argument("--input-dir", type=Path, default=OUTPUT_SHEETS, help="Folder with head CSVs")
+    parser.add_argument("--pattern", default="*.csv", help="Glob pattern for the head CSVs")
+    parser.add_argument("--output-dir", type=Path, default=None,
+                        help="Report folder (default: output_files/output_graphs_<aggregation>)")
+    parser.add_argument("--aggregation", default="median", choices=["mean", "median", "max", "original"],
+                        help="Daily aggregation of the head series")
+    parser.add_argument("--prec", type=Path, default=DEFAULT_PREC_FILE, help="Precipitation CSV")
+    parser.add_argument("--evap", type=Path, default=DEFAULT_EVAP_FILE, help="Evaporation CSV")
+    parser.add_argument("--station", type=int, default=None,
+                        help="Use this KNMI station (via the local KNMI cache) instead of --prec/--evap")
+    parser.add_argument("--start", default="20220101", help="First KNMI day with --station")
+    parser.add_argument("--max-points", type=int, default=None,
+                        help="Points per trace after downsampling (default: pastas_wv2030.plotting.MAX_POINTS)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Render all reports, also unchanged ones")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.station is not None:
+        prec, evap = fetch_knmi_prec_evap(args.station, args.start, date.today().strftime("%Y%m%d"))
+    else:
+        prec, evap = read_timeseries_csv(args.prec), read_timeseries_csv(args.evap)
+    output_dir = args.output_dir or OUTPUT_DIR / f"output_graphs_{args.aggregation}"
+    files = sorted(args.input_dir.glob(args.pattern))
+
+    kwargs = {"max_points": args.max_points} if args.max_points else {}
+    start = time.perf_counter()
+    counts = generate_reports(files, prec, evap, output_dir, args.aggregation, max_workers=args.workers,
+                              force=args.force, **kwargs)
+    print(f"{counts['rendered']} rendered, {counts['skipped']} unchanged, {counts['failed']} failed "
+          f"in {time.perf_counter() - start:.1f} s -> {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Command line entry point for the batch calibration engine
+import argparse
+import fnmatch
+import logging
+from contextlib import nullcontext
+from pathlib import Path
+
+from pastas_wv2030.aggregate import load_aggregate
+from pastas_wv2030.archive import SeriesArchive
+from pastas_wv2030.batch import RECHARGE_MODELS, RESPONSE_FUNCTIONS, WARMUP, make_jobs, run_batch
+from pastas_wv2030.config import (DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, GAUGES_FILE, OUTPUT_DIR, OUTPUT_SHEETS,
+                                  WELL_LOCATIONS)
+from pastas_wv2030.pet import PET_METHODS
+from pastas_wv2030.profiling import PROFILERS, ProfileLog, format_summary, summarize_log
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+from pastas_wv2030.selection import CRITERIA, run_selection
+from pastas_wv2030.stations import SELECTION_METHODS, read_locations, station_index, well_stresses
+from pastas_wv2030.store import RunStore
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fit the recharge × response model grid on all head series.")
+    parser.add_argument("--input-dir", type=Path, default=OUTPUT_SHEETS, help="Folder with head CSVs")
+    parser.add_argument("--pattern", default="*.csv", help="Glob pattern for the head CSVs")
+    parser.add_argument("--archive", type=Path, default=None,
+                        help="Load the head series from this series archive instead of --input-dir")
+    parser.add_argument("--ids", default="*", help="Glob pattern for the series IDs in --archive")
+    parser.add_argument("--max-files", type=int, default=None, help="Only process the first N files")
+    parser.add_argument("--prec", type=Path, default=DEFAULT_PREC_FILE, help="Precipitation CSV")
+    parser.add_argument("--evap", type=Path, default=DEFAULT_EVAP_FILE, help="Evaporation CSV")
+    parser.add_argument("--stations", default="file", choices=["file", *SELECTION_METHODS],
+                        help="Stresses per well from the KNMI stations and rain gauges near it (see "
+                             "pastas_wv2030.stations) instead of --prec/--evap for all wells; wells without "
+                             "a location still use --prec/--evap")
+    parser.add_argument("--locations", type=Path, default=WELL_LOCATIONS,
+                        help="CSV with the well locations (name and x, y in RD or lon, lat)")
+    parser.add_argument("--gauges", type=Path, default=GAUGES_FILE, help="CSV with the local rain gauges")
+    parser.add_argument("--k", type=int, default=3, help="Candidate stations per well for --stations")
+    parser.add_argument("--max-km", type=float, default=None, help="Only stations within this distance")
+    parser.add_argument("--pet", default="hargreaves", choices=list(PET_METHODS),
+                        help="PET method for the KNMI stations")
+    parser.add_argument("--offline", action="store_true", help="Only use KNMI data that is already cached")
+    parser.add_argument("--aggregation", default="median", choices=["mean", "median", "max", "original"],
+                        help="Daily aggregation of the head series")
+    parser.add_argument("--recharge", nargs="+", default=list(RECHARGE_MODELS), choices=list(RECHARGE_MODELS))
+    parser.add_argument("--rfunc", nargs="+", default=list(RESPONSE_FUNCTIONS), choices=list(RESPONSE_FUNCTIONS))
+    parser.add_argument("--no-tarso", action="store_true", help="Skip the TarsoModel")
+    parser.add_argument("--no-noise", action="store_true", help="Solve without ArNoiseModel")
+    parser.add_argument("--warm", action="store_true",
+                        help="Start related models from each other's solution (faster; a warm fit that ends "
+                             "clearly worse than its starting model is solved cold as well); with --select, "
+                             "start the full fits from the screening fits")
+    parser.add_argument("--two-step", action="store_true",
+                        help="Solve every model without noise model first and start the noise fit from it")
+    parser.add_argument("--select", type=int, default=None, metavar="TOP_K",
+                        help="Screen all variants with cheap noise-free fits and only fully fit the best TOP_K "
+                             "per well (see pastas_wv2030.selection); writes screening_df.csv")
+    parser.add_argument("--criterion", default="AIC", choices=CRITERIA, help="Ranking of the screening fits")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR / "batch")
+    parser.add_argument("--store", type=Path, default=None,
+                        help="Run store to resume from (default: runs.sqlite in the output dir)")
+    parser.add_argument("--no-store", action="store_true", help="Do not checkpoint, refit everything")
+    parser.add_argument("--retry-failed", action="store_true", help="Refit models stored with an error")
+    parser.add_argument("--profile", action="store_true",
+                        help="Log the time per stage and model to profile.jsonl in the output dir and "
+                             "print the slowest wells and model variants")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Also record the peak memory per stage (tracemalloc, slower); implies --profile")
+    parser.add_argument("--profile-job", default=None,
+                        help="Profile the models matching this glob pattern (e.g. '*_FlexModel_Gamma') to "
+                             "profiles/ in the output dir; implies --profile")
+    parser.add_argument("--profiler", default="cprofile", choices=PROFILERS, help="Profiler for --profile-job")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    log = None
+    if args.profile or args.profile_memory or args.profile_job:
+        log = ProfileLog(args.output_dir / "profile.jsonl", memory=args.profile_memory, jobs=args.profile_job,
+                         profile_dir=args.output_dir / "profiles", profiler=args.profiler)
+
+    def stage(name, **fields):
+        return nullcontext() if log is None else log.stage(name, **fields)
+
+    with stage("read_stresses"):
+        prec = read_timeseries_csv(args.prec)
+        evap = read_timeseries_csv(args.evap)
+
+    heads = {}
+    if args.archive is not None:
+        archive = SeriesArchive(args.archive)
+        series_ids = sorted(fnmatch.filter(archive.ids(), args.ids))[:args.max_files]
+        print(f"Processing {len(series_ids)} series from {args.archive}")
+        for series_id in series_ids:
+            with stage("read_archive", file=series_id):
+                if args.aggregation == "original":
+                    heads[series_id] = archive.load(series_id)
+                else:
+                    heads[series_id] = load_aggregate(archive, series_id, "D", args.aggregation)
+    else:
+        csv_files = sorted(args.input_dir.glob(args.pattern))[:args.max_files]
+        print(f"Processing {len(csv_files)} CSV files from {args.input_dir}")
+        for path in csv_files:
+            try:
+                with stage("read", file=path.stem):
+                    head = read_head_csv(path)
+                with stage("resample", file=path.stem):
+                    heads[path.stem] = aggregate_daily(head, args.aggregation)
+            except Exception as e:
+                print(f"  Failed to read {path.name}: {e}")
+
+    if args.stations != "file" and heads:
+        with stage("select_stations"):
+            locations = read_locations(args.locations)
+            locations = locations[locations.index.isin(list(heads))]
+            start = min(head.index[0] for head in heads.values()) - WARMUP
+            end = max(head.index[-1] for head in heads.values())
+            well_prec, well_evap, selection = well_stresses(
+                locations, start.normalize(), end.normalize(), args.stations, heads,
+                station_index(gauges=args.gauges), args.k, args.max_km, pet_method=args.pet, offline=args.offline)
+        selection.to_csv(args.output_dir / "station_selection.csv", index=False)
+        print(f"Stresses from nearby stations for {len(well_prec)} of {len(heads)} wells")
+        prec = {file: well_prec.get(file, prec) for file in heads}
+        evap = {file: well_evap.get(file, evap) for file in heads}
+
+    jobs = make_jobs(heads, args.recharge, args.rfunc, tarso=not args.no_tarso, noise=not args.no_noise)
+    store = None if args.no_store else RunStore(args.store or args.output_dir / "runs.sqlite")
+    try:
+        kwargs = dict(max_workers=args.workers, store=store, retry_failed=args.retry_failed,
+                      warm_start=args.warm, two_step=args.two_step, log=log)
+        if args.select is None:
+            print(f"Running {len(jobs)} models")
+            results_df, diagnostics_df = run_batch(heads, prec, evap, jobs, **kwargs)
+        else:
+            print(f"Screening {len(jobs)} models, fitting the best {args.select} per well")
+            results_df, diagnostics_df, screening_df = run_selection(
+                heads, prec, evap, jobs, args.select, args.criterion, noise=not args.no_noise, **kwargs)
+            screening_df.to_csv(args.output_dir / "screening_df.csv", index=False)
+
+        with stage("write_csv"):
+            results_df.to_csv(args.output_dir / "results_df.csv", index=False)
+            diagnostics_df.to_csv(args.output_dir / "diagnostics_df.csv", index=False)
+        with stage("write_excel"):
+            results_df.to_excel(args.output_dir / "results_df.xlsx", index=False)
+            diagnostics_df.to_excel(args.output_dir / "diagnostics_df.xlsx", index=False)
+    finally:
+        if store is not None:
+            store.close()
+        if log is not None:
+            log.close()
+
+    n_failed = results_df["error"].notna().sum()
+    print(f"Results saved to: {args.output_dir} ({len(results_df) - n_failed} solved, {n_failed} failed)")
+    if log is not None:
+        print(f"\nProfile saved to: {log.path}\n")
+        print(format_summary(summarize_log(log.path)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Command line entry point: choose the KNMI stations and rain gauges of every well and fill the KNMI cache,
+# so later batch runs (run_model --stations ... --offline) read all stresses from the cache
+import argparse
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from pastas_wv2030.config import GAUGES_FILE, STATION_SELECTION, WELL_LOCATIONS
+from pastas_wv2030.pet import PET_METHODS
+from pastas_wv2030.stations import SELECTION_METHODS, read_locations, station_index, well_stresses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Choose the stations of every well and download their data.")
+    parser.add_argument("--locations", type=Path, default=WELL_LOCATIONS,
+                        help="CSV with the well locations (name and x, y in RD or lon, lat)")
+    parser.add_argument("--gauges", type=Path, default=GAUGES_FILE, help="CSV with the local rain gauges")
+    parser.add_argument("--method", default="nearest", choices=[m for m in SELECTION_METHODS if m != "correlation"],
+                        help="'correlation' needs the heads, use run_model --stations correlation")
+    parser.add_argument("--start", default="1990-01-01", help="First day (including the model warmup)")
+    parser.add_argument("--end", default=str(pd.Timestamp.today().date()), help="Last day")
+    parser.add_argument("--k", type=int, default=3, help="Candidate stations per well")
+    parser.add_argument("--max-km", type=float, default=None, help="Only stations within this distance")
+    parser.add_argument("--pet", default="hargreaves", choices=list(PET_METHODS))
+    parser.add_argument("--offline", action="store_true", help="Only use KNMI data that is already cached")
+    parser.add_argument("--output", type=Path, default=STATION_SELECTION, help="Selection table (CSV)")
+    parser.add_argument("--list", action="store_true", help="Only print the station index")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    index = station_index(gauges=args.gauges)
+    if args.list:
+        print(index.to_string())
+        return
+
+    locations = read_locations(args.locations)
+    prec, _, selection = well_stresses(locations, args.start, args.end, args.method, index=index, k=args.k,
+                                       max_km=args.max_km, pet_method=args.pet, offline=args.offline)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    selection.to_csv(args.output, index=False)
+    chosen = selection[selection["weight"] > 0]
+    print(f"{len(prec)} of {len(locations)} wells with stresses from {chosen['station'].nunique()} stations")
+    print(chosen.groupby(["variable", "station"]).size().rename("wells").to_string())
+    print(f"Selection saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Command line entry point: validate every input series and write one JSON report
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, VALIDATION_CACHE, VALIDATION_REPORT
+from pastas_wv2030.readers import read_timeseries_csv
+from pastas_wv2030.validation import (DEFAULT_SETTINGS, default_validation_sources, knmi_period, report_frame,
+                                      validate_sources, write_report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check all series in input_files and output_sheets for gaps, duplicates, jumps, "
+                    "unit anomalies, outliers and KNMI coverage.")
+    parser.add_argument("--output", type=Path, default=VALIDATION_REPORT, help="JSON report")
+    parser.add_argument("--excel", type=Path, default=None, help="Also write the series table to this .xlsx")
+    parser.add_argument("--cache", type=Path, default=VALIDATION_CACHE, help="Results per file content")
+    parser.add_argument("--no-cache", action="store_true", help="Check every file again")
+    parser.add_argument("--prec", type=Path, default=DEFAULT_PREC_FILE, help="Precipitation CSV")
+    parser.add_argument("--evap", type=Path, default=DEFAULT_EVAP_FILE, help="Evaporation CSV")
+    for name, value in DEFAULT_SETTINGS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    knmi = knmi_period(read_timeseries_csv(args.prec), read_timeseries_csv(args.evap))
+    settings = {name: getattr(args, name) for name in DEFAULT_SETTINGS}
+    sources = default_validation_sources()
+    start = time.perf_counter()
+    report = validate_sources(sources, knmi, settings, cache_path=None if args.no_cache else args.cache,
+                              max_workers=args.workers)
+    write_report(report, args.output)
+    print(f"Checked {len(report['series'])} series in {len(sources)} files in {time.perf_counter() - start:.1f} s"
+          f" -> {args.output}")
+    for issue, count in report["summary"].items():
+        if count:
+            print(f"  {issue:<24}{count}")
+    if args.excel is not None:
+        report_frame(report).to_excel(args.excel, index=False)
+
+
+if __name__ == "__main__":
+    main()
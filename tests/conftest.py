@@ -0,0 +1,17 @@
+# Shared fixtures of the tests: a KNMI stand-in server with synthetic data for two years
+import pytest
+
+from pastas_wv2030.knmi_server import KNMIStandInServer, synthetic_knmi_frame
+
+STATIONS = [240, 249, 260]
+
+
+@pytest.fixture(scope="session")
+def knmi_df():
+    return synthetic_knmi_frame(STATIONS, "2020-01-01", "2021-12-31", seed=1)
+
+
+@pytest.fixture
+def knmi_server(knmi_df):
+    with KNMIStandInServer(knmi_df) as server:
+        yield server
@@ -0,0 +1,70 @@
+# Tests of the Parquet series archive
+import numpy as np
+import pandas as pd
+import pytest
+
+from pastas_wv2030.archive import SeriesArchive, series_key
+
+
+def _series(start, periods, offset=0.0):
+    index = pd.date_range(start, periods=periods, freq="D")
+    return pd.Series(np.arange(periods, dtype=float) + offset, index=index)
+
+
+def test_series_key():
+    assert series_key("B19C0123 / filter 1").startswith("B19C0123_filter_1-")
+    # Names that sanitize to the same string still get their own folder
+    assert series_key("a/b") != series_key("a_b")
+
+
+def test_write_and_load(tmp_path):
+    archive = SeriesArchive(tmp_path)
+    series = _series("2020-01-01", 10)
+    row = archive.write_series("well 1", series, {"source": "csv", "unit": "m NAP"})
+    archive.flush()
+    assert (row["n"], row["start"], row["end"]) == (10, series.index[0], series.index[-1])
+
+    # A new archive object reads the flushed index
+    archive = SeriesArchive(tmp_path)
+    assert archive.ids() == ["well 1"] and "well 1" in archive and len(archive) == 1
+    assert archive.index.at["well 1", "unit"] == "m NAP"
+    loaded = archive.load("well 1")
+    np.testing.assert_array_equal(loaded.values, series.values)
+    assert loaded.index.equals(pd.DatetimeIndex(series.index, name="Timestamp"))
+    assert loaded.name == "well 1"
+    assert len(archive.load("well 1", start="2020-01-03", end="2020-01-05")) == 3
+    with pytest.raises(KeyError):
+        archive.load("unknown")
+
+
+def test_write_cleans_series(tmp_path):
+    archive = SeriesArchive(tmp_path)
+    series = pd.Series(["3.0", "bad", "1.0", "2.0"],
+                       index=pd.to_datetime(["2020-01-03", "2020-01-04", "2020-01-01", "2020-01-01"]))
+    archive.write_series("well", series)
+    loaded = archive.load("well")
+    # Sorted, numeric, without duplicate timestamps (the first one is kept) or unparsable values
+    assert loaded.tolist() == [1.0, 3.0]
+
+
+def test_append(tmp_path):
+    archive = SeriesArchive(tmp_path)
+    archive.write_series("well", _series("2020-01-01", 10))
+    archive.flush()
+    version = archive.index.at["well", "version"]
+
+    appended = archive.append_series("well", _series("2020-01-06", 10, offset=100.0))
+    assert len(appended) == 5 and appended.index[0] == pd.Timestamp("2020-01-11")
+    assert len(archive.parts("well")) == 2
+    loaded = SeriesArchive(tmp_path).load("well")
+    assert len(loaded) == 15 and loaded.iloc[-1] == 109.0
+    # Appending keeps the version, replacing the series changes it
+    assert archive.index.at["well", "n"] == 15
+    assert archive.index.at["well", "version"] == version
+    assert archive.append_series("well", _series("2020-01-01", 5)).empty
+
+    archive.write_series("well", _series("2021-01-01", 3))
+    assert len(archive.parts("well")) == 1
+    assert archive.index.at["well", "version"] != version
+    with pytest.raises(KeyError):
+        archive.append_series("unknown", _series("2020-01-01", 3))
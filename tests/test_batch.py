@@ -0,0 +1,124 @@
+# Tests of the warm starts of the batch grid and their guard
+import numpy as np
+import pandas as pd
+import pytest
+
+from pastas_wv2030 import batch
+from pastas_wv2030.batch import BatchJob, solve_well
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, OUTPUT_SHEETS
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+
+INDEX = pd.date_range("2020-01-01", periods=400, freq="D")
+HEAD = pd.Series(0.0, index=INDEX[-200:])
+STRESS = pd.Series(1.0, index=INDEX)
+
+
+class FakeSolver:
+    """Stands in for batch.solve_job: returns the prepared outcome of every (rfunc, noise, warm) fit."""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+
+    def __call__(self, job, head, prec, evap, warm=None, two_step=False):
+        started = "warm" if warm is not None else "cold"
+        self.calls.append((job.rfunc, job.noise, started, None if warm is None else dict(warm[0])))
+        obj_func, evp, error = self.outcomes[job.rfunc, job.noise, started]
+        row = {"file": job.file, "model": job.model_name, "EVP": evp, "obj_func": obj_func, "nfev": 10,
+               "solve_time": 1.0, "error": error, "stages": {"solve": 1.0}}
+        if error is not None:
+            return row, None, None
+        return row, pd.DataFrame({"model": [job.model_name]}), pd.Series({"p": obj_func, started: 1.0})
+
+
+def _solve(monkeypatch, outcomes, rfuncs=("Exponential", "Gamma"), noise=(False,)):
+    fake = FakeSolver(outcomes)
+    monkeypatch.setattr(batch, "solve_job", fake)
+    jobs = [BatchJob("well", "Linear", rfunc, n) for rfunc in rfuncs for n in noise]
+    solved = solve_well(jobs, HEAD, STRESS, STRESS, warm_start=True)
+    results = {(job.rfunc, job.noise): row for job, row, _, _ in solved}
+    return fake, results
+
+
+def test_warm_start_from_the_parent(monkeypatch):
+    fake, results = _solve(monkeypatch, {("Exponential", False, "cold"): (1.0, 80.0, None),
+                                         ("Gamma", False, "warm"): (0.9, 82.0, None)})
+    assert [call[:3] for call in fake.calls] == [("Exponential", False, "cold"), ("Gamma", False, "warm")]
+    # The child starts from the solution of its parent
+    assert fake.calls[1][3] == {"p": 1.0, "cold": 1.0}
+    assert results["Gamma", False]["EVP"] == 82.0 and results["Gamma", False]["nfev"] == 10
+
+
+def test_cold_is_the_default(monkeypatch):
+    fake = FakeSolver({("Exponential", False, "cold"): (1.0, 80.0, None), ("Gamma", False, "cold"): (1.0, 80.0, None)})
+    monkeypatch.setattr(batch, "solve_job", fake)
+    solve_well([BatchJob("well", "Linear", r, False) for r in ("Gamma", "Exponential")], HEAD, STRESS, STRESS)
+    assert [call[:3] for call in fake.calls] == [("Gamma", False, "cold"), ("Exponential", False, "cold")]
+
+
+def test_stuck_warm_fit_is_solved_cold(monkeypatch):
+    fake, results = _solve(monkeypatch, {("Exponential", False, "cold"): (1.0, 80.0, None),
+                                         ("Gamma", False, "warm"): (2.0, 70.0, None),
+                                         ("Gamma", False, "cold"): (0.95, 81.0, None)})
+    assert [call[:3] for call in fake.calls][1:] == [("Gamma", False, "warm"), ("Gamma", False, "cold")]
+    row = results["Gamma", False]
+    assert (row["obj_func"], row["EVP"]) == (0.95, 81.0)
+    # Both fits count for the cost of the model
+    assert row["nfev"] == 20 and row["solve_time"] == 2.0 and row["stages"] == {"solve": 2.0}
+
+
+def test_stuck_warm_fit_is_kept_when_the_cold_fit_is_worse(monkeypatch):
+    _, results = _solve(monkeypatch, {("Exponential", False, "cold"): (1.0, 80.0, None),
+                                      ("Gamma", False, "warm"): (2.0, 70.0, None),
+                                      ("Gamma", False, "cold"): (3.0, 60.0, None)})
+    assert (results["Gamma", False]["obj_func"], results["Gamma", False]["nfev"]) == (2.0, 20)
+
+
+def test_degenerate_warm_fit_keeps_the_higher_evp(monkeypatch):
+    # A lower objective than the parent, but the EVP collapsed: caught by the EVP guard only
+    fake, results = _solve(monkeypatch, {("Exponential", False, "cold"): (1.0, 80.0, None),
+                                         ("Gamma", False, "warm"): (0.5, 5.0, None),
+                                         ("Gamma", False, "cold"): (0.9, 85.0, None)})
+    assert [call[2] for call in fake.calls] == ["cold", "warm", "cold"]
+    assert results["Gamma", False]["EVP"] == 85.0
+
+    _, results = _solve(monkeypatch, {("Exponential", False, "cold"): (1.0, 80.0, None),
+                                      ("Gamma", False, "warm"): (0.5, 5.0, None),
+                                      ("Gamma", False, "cold"): (0.9, 3.0, None)})
+    assert results["Gamma", False]["EVP"] == 5.0
+
+
+def test_small_evp_drop_is_accepted(monkeypatch):
+    fake, results = _solve(monkeypatch, {
+        ("Exponential", False, "cold"): (1.0, 80.0, None),
+        ("Gamma", False, "warm"): (0.99, 80.0 - batch.WARM_START_EVP_DROP + 1, None)})
+    assert len(fake.calls) == 2
+
+
+def test_failed_warm_fit_is_solved_cold(monkeypatch):
+    fake, results = _solve(monkeypatch, {("Exponential", False, "cold"): (1.0, 80.0, None),
+                                         ("Gamma", False, "warm"): (None, None, "LinAlgError"),
+                                         ("Gamma", False, "cold"): (0.9, 81.0, None)})
+    assert [call[2] for call in fake.calls] == ["cold", "warm", "cold"]
+    assert results["Gamma", False]["error"] is None and results["Gamma", False]["EVP"] == 81.0
+
+
+def test_noise_fit_starts_from_the_noise_free_fit(monkeypatch):
+    fake, _ = _solve(monkeypatch, {("Exponential", False, "cold"): (1.0, 80.0, None),
+                                   ("Exponential", True, "warm"): (0.8, 79.0, None)},
+                     rfuncs=("Exponential",), noise=(True, False))
+    assert [call[:3] for call in fake.calls] == [("Exponential", False, "cold"), ("Exponential", True, "warm")]
+
+
+def test_guarded_warm_start_on_a_real_sheet():
+    # Linear/Hantush on this well, started from the Exponential, once ended at EVP 0 (a noise
+    # model that absorbs the signal at a slightly lower objective); the guard refits it cold
+    prec, evap = read_timeseries_csv(DEFAULT_PREC_FILE), read_timeseries_csv(DEFAULT_EVAP_FILE)
+    head = aggregate_daily(read_head_csv(OUTPUT_SHEETS / "86349-1 HB002PB01.csv"), "median").dropna()
+    jobs = [BatchJob("HB002", "Linear", rfunc) for rfunc in ("Exponential", "Hantush")]
+    warm = {job.rfunc: row for job, row, _, _ in solve_well(jobs, head, prec, evap, warm_start=True)}
+    cold = {job.rfunc: row for job, row, _, _ in solve_well(jobs, head, prec, evap)}
+    for rfunc in ("Exponential", "Hantush"):
+        assert warm[rfunc]["error"] is None
+        assert warm[rfunc]["EVP"] == pytest.approx(cold[rfunc]["EVP"], abs=1.0)
+    assert np.isfinite(warm["Hantush"]["EVP"]) and warm["Hantush"]["EVP"] > 80
@@ -0,0 +1,125 @@
+# Tests of the return-period engine: L-moment fits and the fit cache
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import genextreme, genpareto
+
+from pastas_wv2030 import extremes
+from pastas_wv2030.extremes import (annual_maxima, cached_fit, ensemble_return_levels, fit_gev, fit_gpd,
+                                    peaks_over_threshold, return_levels)
+
+
+@pytest.mark.parametrize("shape", [-0.15, 0.0, 0.2])
+def test_fit_gev_recovers_parameters(shape):
+    maxima = pd.DataFrame({f"well{i}": genextreme.rvs(shape, loc=-1.0 + i, scale=0.3, size=5000, random_state=i)
+                           for i in range(3)})
+    params = fit_gev(maxima)
+    assert list(params.index) == list(maxima.columns)
+    assert (params["distribution"] == "gev").all() and (params["n"] == 5000).all()
+    np.testing.assert_allclose(params["shape"], shape, atol=0.05)
+    np.testing.assert_allclose(params["loc"], [-1.0, 0.0, 1.0], atol=0.02)
+    np.testing.assert_allclose(params["scale"], 0.3, rtol=0.05)
+
+
+def test_fit_gev_short_and_missing_columns():
+    maxima = pd.DataFrame({"long": genextreme.rvs(0.1, size=40, random_state=0), "short": np.nan})
+    maxima.loc[:1, "short"] = [1.0, 2.0]
+    params = fit_gev(maxima)
+    assert params.at["long", "n"] == 40 and params.loc["long", ["shape", "loc", "scale"]].notna().all()
+    assert params.at["short", "n"] == 2 and params.loc["short", ["shape", "loc", "scale"]].isna().all()
+
+
+def test_fit_gpd_recovers_parameters():
+    peaks, years = {}, {}
+    for i, shape in enumerate([-0.2, 0.1]):
+        excess = genpareto.rvs(shape, scale=0.2, size=5000, random_state=i)
+        peaks[f"well{i}"] = pd.Series(0.5 + excess)
+        peaks[f"well{i}"].attrs["threshold"] = 0.5
+        years[f"well{i}"] = 1000.0
+    params = fit_gpd(peaks, years)
+    np.testing.assert_allclose(params["shape"], [-0.2, 0.1], atol=0.05)
+    np.testing.assert_allclose(params["scale"], 0.2, rtol=0.05)
+    assert (params["loc"] == 0.5).all() and (params["rate"] == 5.0).all()
+
+
+def test_return_levels_match_scipy():
+    params = pd.DataFrame({"distribution": ["gev", "gpd"], "shape": [0.1, -0.2], "loc": [1.0, 0.5],
+                           "scale": [0.3, 0.2], "threshold": [np.nan, 0.5], "rate": [1.0, 4.0]},
+                          index=["a", "b"])
+    levels = return_levels(params, [10, 100])
+    assert levels.at["a", 10] == pytest.approx(genextreme.ppf(0.9, 0.1, 1.0, 0.3))
+    # Four peaks per year: a 100-year level is exceeded by one in 400 peaks
+    assert levels.at["b", 100] == pytest.approx(genpareto.ppf(1 - 1 / 400, -0.2, 0.5, 0.2))
+    assert (levels[100] > levels[10]).all()
+
+
+def test_annual_maxima_hydrological_years():
+    index = pd.date_range("2020-04-01", "2023-03-31", freq="D")
+    heads = pd.DataFrame({"a": np.arange(len(index), dtype=float)}, index=index)
+    heads.loc["2021-02-15", "a"] = 5000.0
+    maxima = annual_maxima(heads)
+    assert list(maxima.index) == [2020, 2021, 2022]
+    # February 2021 belongs to the hydrological year that started in April 2020
+    assert maxima.at[2020, "a"] == 5000.0 and maxima.at[2022, "a"] == len(index) - 1
+
+    # A year with too little data is left out
+    assert annual_maxima(heads.loc["2020-04-01":"2021-06-30"]).loc[2021].isna().all()
+
+
+def test_peaks_over_threshold_declusters():
+    series = pd.Series(0.0, index=pd.date_range("2020-01-01", periods=60, freq="D"))
+    series.iloc[[10, 12, 14]] = [1.0, 3.0, 2.0]  # one cluster
+    series.iloc[40] = 2.5
+    peaks = peaks_over_threshold(series, threshold=0.5, run=7)
+    assert peaks.tolist() == [3.0, 2.5] and peaks.attrs["threshold"] == 0.5
+    assert len(peaks_over_threshold(series, threshold=0.5, run=1)) == 4
+
+
+def test_ensemble_return_levels():
+    index = pd.date_range("2000-04-01", "2040-03-31", freq="D")
+    rng = np.random.default_rng(0)
+    ensemble = rng.gumbel(0.0, 0.1, (20, len(index)))
+    bands = ensemble_return_levels(ensemble, index, return_periods=(2, 10), quantiles=(0.05, 0.95))
+    assert list(bands.index) == [2, 10] and list(bands.columns) == [0.05, 0.95]
+    assert (bands[0.95] >= bands[0.05]).all() and bands.at[10, 0.05] > bands.at[2, 0.95] - 0.1
+
+
+def _heads(seed, years=30):
+    index = pd.date_range("1990-04-01", periods=int(365.25 * years), freq="D")
+    values = genextreme.rvs(0.1, loc=0.0, scale=0.2, size=len(index), random_state=seed)
+    return pd.Series(values, index=index)
+
+
+def test_cached_fit_hits_and_invalidates(tmp_path, monkeypatch):
+    calls = []
+    fit_series = extremes.fit_series
+
+    def counting_fit(heads, **settings):
+        calls.append(sorted(heads))
+        return fit_series(heads, **settings)
+
+    monkeypatch.setattr(extremes, "fit_series", counting_fit)
+    path = tmp_path / "fits.parquet"
+    heads = {"a": _heads(0), "b": _heads(1)}
+    first = cached_fit(heads, path)
+    assert calls == [["a", "b"]] and path.exists()
+    pd.testing.assert_frame_equal(first, fit_series(heads), check_dtype=False)
+
+    # Unchanged series and settings: served from the cache, in the order asked for
+    again = cached_fit({"b": heads["b"], "a": heads["a"]}, path)
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(again.loc[["a", "b"]], first)
+
+    # A changed series is refitted, the other one is not
+    heads["b"] = heads["b"] + 1.0
+    changed = cached_fit(heads, path)
+    assert calls[1:] == [["b"]]
+    assert changed.at["b", "loc"] == pytest.approx(first.at["b", "loc"] + 1.0)
+    assert changed.at["a", "loc"] == first.at["a", "loc"]
+
+    # Other settings are other fits
+    gpd = cached_fit(heads, path, distribution="gpd")
+    assert calls[2:] == [["a", "b"]] and (gpd["distribution"] == "gpd").all()
+    cached_fit(heads, path, distribution="gpd")
+    cached_fit(heads, path)
+    assert len(calls) == 3
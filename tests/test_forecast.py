@@ -0,0 +1,83 @@
+# Tests of the batched scenario forecasts of solved models
+import numpy as np
+import pandas as pd
+import pytest
+
+from pastas_wv2030.batch import build_model
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, OUTPUT_SHEETS
+from pastas_wv2030.forecast import (DELTA_SCENARIOS, complete_years, forecast_bands, read_delta_scenarios,
+                                    scenario_forcing, simulate_scenarios, year_plan)
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+
+
+@pytest.fixture(scope="module")
+def stresses():
+    return read_timeseries_csv(DEFAULT_PREC_FILE), read_timeseries_csv(DEFAULT_EVAP_FILE)
+
+
+@pytest.fixture(scope="module")
+def models(stresses):
+    head = aggregate_daily(read_head_csv(OUTPUT_SHEETS / "86349-1 HB011PB01.csv"), "mean").dropna()
+    models = {}
+    for recharge in ("Linear", "FlexModel", "Direct"):
+        ml = build_model(head, *stresses, recharge, "Exponential", noise=True, name=recharge)
+        ml.solve(report=False)
+        models[recharge] = ml
+    return models
+
+
+@pytest.mark.parametrize("recharge", ["Linear", "FlexModel", "Direct"])
+def test_historical_plan_equals_simulate(models, recharge):
+    # Every scenario replays the historical years in order, without delta change
+    ml = models[recharge]
+    years = [2019, 2020, 2021, 2022, 2023]
+    plan = np.array([years] * 3)
+    ensemble, index = simulate_scenarios(ml, plan, start="2019-01-01", factors=DELTA_SCENARIOS["reference"],
+                                         chunk_size=2)
+    expected = ml.simulate(tmin="2019-01-01", tmax="2023-12-31")
+    assert index.equals(expected.index)
+    for heads in ensemble:
+        np.testing.assert_allclose(heads, expected.to_numpy(), rtol=0, atol=1e-8)
+    # The model itself is left as it was
+    pd.testing.assert_series_equal(ml.simulate(), ml.simulate(tmin=ml.settings["tmin"], tmax=ml.settings["tmax"]))
+
+
+def test_year_plan_and_forcing(stresses):
+    prec, _ = stresses
+    years = complete_years(*stresses)
+    assert 2024 in years and 2025 not in years  # the stresses end in July 2025
+    plan = year_plan(years, 50, 3, seed=1)
+    assert plan.shape == (50, 3) and np.isin(plan, years).all()
+    np.testing.assert_array_equal(plan, year_plan(years, 50, 3, seed=1))
+
+    index = pd.date_range("2028-01-01", "2028-12-31")  # a leap year
+    forcing = scenario_forcing(prec, np.array([[2023], [2024]]), index, factors=[2.0] * 12)
+    np.testing.assert_allclose(forcing[1], 2 * prec.loc["2024"].to_numpy())
+    # 29 February of a non-leap year repeats 28 February
+    assert forcing[0, 59] == forcing[0, 58] == 2 * prec.loc["2023-02-28"]
+    with pytest.raises(ValueError):
+        scenario_forcing(prec, np.array([[2023]]), pd.date_range("2028-01-01", "2029-12-31"))
+
+
+def test_forecast_bands(models):
+    ml = models["Linear"]
+    plan = year_plan(complete_years(ml.stressmodels["rch"].prec.series_original,
+                                    ml.stressmodels["rch"].evap.series_original), 100, 2)
+    bands = forecast_bands(ml, plan, ["reference", "dry", "wet"], deltas=DELTA_SCENARIOS)
+    assert list(bands.columns.unique("scenario")) == ["reference", "dry", "wet"]
+    assert (bands["reference"].diff(axis=1).iloc[:, 1:] >= 0).all().all()
+    # Less rain and more evaporation give lower heads
+    assert bands["dry", 0.5].mean() < bands["reference", 0.5].mean() < bands["wet", 0.5].mean()
+
+    # The Direct model has no separate precipitation and evaporation: delta scenarios are skipped
+    bands = forecast_bands(models["Direct"], plan, ["reference", "dry"], deltas=DELTA_SCENARIOS)
+    assert list(bands.columns.unique("scenario")) == ["reference"]
+
+
+def test_read_delta_scenarios(tmp_path):
+    path = tmp_path / "scenarios.csv"
+    pd.DataFrame({"scenario": ["W", "W"], "variable": ["prec", "prec"], "month": [1, 7],
+                  "factor": [1.2, 0.8]}).to_csv(path, index=False)
+    scenarios = read_delta_scenarios(path)
+    assert scenarios["W"]["prec"] == [1.2, 1, 1, 1, 1, 1, 0.8, 1, 1, 1, 1, 1]
+    assert scenarios["W"]["evap"] == [1.0] * 12
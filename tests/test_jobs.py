@@ -0,0 +1,151 @@
+# Tests of the job queue shared by the app and the workers
+import time
+
+import pytest
+
+from pastas_wv2030 import jobs
+from pastas_wv2030.jobs import JobCancelled, JobContext, JobQueue, run_worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with JobQueue(tmp_path / "jobs.sqlite") as queue:
+        yield queue
+
+
+def test_submit_reuse(queue):
+    job_id = queue.submit("report", {"files": ["a.csv"]}, owner="alice")
+    assert queue.submit("report", {"files": ["a.csv"]}, owner="bob") == job_id
+    assert queue.submit("report", {"files": ["a.csv"]}, reuse=False) != job_id
+    assert queue.submit("report", {"files": ["b.csv"]}) != job_id
+
+    job = queue.get(job_id)
+    assert job["status"] == "queued"
+    assert job["params"] == {"files": ["a.csv"]}
+    assert queue.get(12345) is None
+    with pytest.raises(ValueError):
+        queue.submit("unknown", {})
+
+
+def test_failed_jobs_are_resubmitted(queue):
+    job_id = queue.submit("report", {})
+    queue.claim("w1")
+    queue.finish(job_id, error="boom")
+    assert queue.get(job_id)["status"] == "failed"
+    assert queue.submit("report", {}) != job_id
+
+
+def test_claim_takes_turns_between_owners(queue):
+    alice = [queue.submit("report", {"i": i}, owner="alice") for i in range(3)]
+    bob = queue.submit("report", {"i": 3}, owner="bob")
+    assert queue.claim("w1")["id"] == alice[0]
+    # Alice has a running job, so Bob goes first even though his job is newer
+    assert queue.claim("w2")["id"] == bob
+    assert queue.claim("w3")["id"] == alice[1]
+    assert queue.claim("w4")["id"] == alice[2]
+    assert queue.claim("w5") is None
+    assert (queue.list()["status"] == "running").all()
+    assert list(queue.list(owner="bob").index) == [bob]
+
+
+def test_progress_events_and_finish(queue):
+    job_id = queue.submit("report", {})
+    queue.claim("w1")
+    queue.progress(job_id, 0.5, "halfway", payload={"file": "a.csv"})
+    queue.progress(job_id, payload={"file": "b.csv"})
+    job = queue.get(job_id)
+    assert (job["progress"], job["message"]) == (0.5, "halfway")
+
+    events = queue.events(job_id)
+    assert [payload for _, payload in events] == [{"file": "a.csv"}, {"file": "b.csv"}]
+    assert queue.events(job_id, after=events[0][0]) == events[1:]
+
+    queue.finish(job_id, {"n": 2})
+    job = queue.get(job_id)
+    assert (job["status"], job["progress"], job["result"]) == ("done", 1.0, {"n": 2})
+
+
+def test_cancel(queue):
+    queued = queue.submit("report", {"i": 0})
+    assert queue.cancel(queued)
+    assert queue.get(queued)["status"] == "cancelled"
+    assert not queue.cancel(queued)
+
+    running = queue.submit("report", {"i": 1})
+    queue.claim("w1")
+    assert queue.cancel(running)
+    # A running job stops at its next progress report
+    assert queue.get(running)["status"] == "running"
+    with pytest.raises(JobCancelled):
+        queue.progress(running, 0.1)
+
+
+def test_requeue_stale(queue):
+    job_id = queue.submit("report", {})
+    queue.heartbeat("alive")
+    queue.claim("dead")
+    assert queue.requeue_stale() == 1
+    job = queue.get(job_id)
+    assert (job["status"], job["worker"]) == ("queued", None)
+
+    # A live worker keeps its job
+    queue.claim("alive")
+    assert queue.requeue_stale() == 0
+
+    # Claimed for the third time, MAX_ATTEMPTS, so the job is given up when its worker stops again
+    queue.con.execute("DELETE FROM workers")
+    queue.requeue_stale()
+    assert queue.claim("dead")["attempts"] == jobs.MAX_ATTEMPTS
+    assert queue.requeue_stale() == 1
+    assert queue.get(job_id)["status"] == "failed"
+
+
+def test_solve_callback_reports_and_cancels(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "SOLVE_REPORT_EVERY", 0.0)
+    job_id = queue.submit("report", {})
+    ctx = JobContext(queue, queue.claim("w1"))
+    assert ctx.output_dir == queue.path.parent / str(job_id)
+    callback = ctx.solve_callback(0.2)
+    callback(None)
+    callback(None)
+    assert queue.get(job_id)["message"] == "Solving model (2 function evaluations)"
+    queue.cancel(job_id)
+    with pytest.raises(JobCancelled):
+        callback(None)
+
+
+def test_run_worker(tmp_path, monkeypatch):
+    def run_echo(ctx):
+        if ctx.params.get("fail"):
+            raise RuntimeError("failed on purpose")
+        ctx.progress(0.5, payload={"echo": ctx.params["value"]})
+        return {"value": ctx.params["value"]}
+
+    def run_cancelled(ctx):
+        raise JobCancelled("stop")
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "echo", run_echo)
+    monkeypatch.setitem(jobs.JOB_KINDS, "cancelled", run_cancelled)
+    path = tmp_path / "jobs.sqlite"
+    with JobQueue(path) as queue:
+        done = queue.submit("echo", {"value": 1})
+        failed = queue.submit("echo", {"value": 2, "fail": True})
+        cancelled = queue.submit("cancelled", {})
+
+    assert run_worker(path, poll=0.01, once=True, name="w1") == 3
+    with JobQueue(path) as queue:
+        assert queue.get(done)["result"] == {"value": 1}
+        assert queue.events(done)[0][1] == {"echo": 1}
+        assert queue.get(failed)["status"] == "failed"
+        assert queue.get(failed)["error"] == "RuntimeError: failed on purpose"
+        assert queue.get(cancelled)["status"] == "cancelled"
+        # A stopped worker is gone from the list right away
+        assert queue.workers().empty
+
+
+def test_workers(queue):
+    queue.heartbeat("w1", 3)
+    assert list(queue.workers().index) == ["w1"]
+    assert queue.workers().at["w1", "job_id"] == 3
+    queue.con.execute("UPDATE workers SET heartbeat = ?", (time.time() - 120,))
+    assert queue.workers(alive_within=60).empty
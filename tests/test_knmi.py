@@ -0,0 +1,125 @@
+# Tests of the KNMI cache against the local stand-in server
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from pastas_wv2030.knmi import (KNMI_COLUMNS, _missing_ranges, fetch_knmi_daily, fetch_knmi_prec_evap,
+                                read_station_cache)
+
+T = pd.Timestamp
+
+
+def _expected(knmi_df, station, start, end):
+    rows = knmi_df[(knmi_df["STN"] == station) & knmi_df["DATE"].between(start, end)]
+    return rows.set_index("DATE")[KNMI_COLUMNS]
+
+
+def test_fetch_returns_server_data(knmi_server, knmi_df, tmp_path):
+    df = fetch_knmi_daily(249, "2020-01-01", "2020-03-31", cache_dir=tmp_path, url=knmi_server.url)
+    assert knmi_server.requests == [([249], T("2020-01-01"), T("2020-03-31"))]
+    assert (df["STN"] == 249).all()
+    # The server rounds to KNMI units (0.1 °C, 0.1 mm, 0.01 MJ/m2)
+    np.testing.assert_allclose(df.set_index("DATE")[KNMI_COLUMNS],
+                               _expected(knmi_df, 249, "2020-01-01", "2020-03-31"), atol=0.05)
+    assert 249 in read_station_cache(tmp_path)
+
+
+def test_only_missing_ranges_are_requested(knmi_server, tmp_path):
+    kwargs = dict(cache_dir=tmp_path, url=knmi_server.url)
+    fetch_knmi_daily(249, "2020-03-01", "2020-03-31", **kwargs)
+    df = fetch_knmi_daily(249, "2020-02-01", "2020-04-30", **kwargs)
+    assert knmi_server.requests[1:] == [
+        ([249], T("2020-02-01"), T("2020-02-29")),
+        ([249], T("2020-04-01"), T("2020-04-30")),
+    ]
+    assert df["DATE"].tolist() == list(pd.date_range("2020-02-01", "2020-04-30"))
+
+    # Everything is cached now, also for a range inside the covered period
+    fetch_knmi_daily(249, "2020-02-15", "2020-04-15", **kwargs)
+    assert len(knmi_server.requests) == 3
+
+
+def test_holes_between_fetches_are_requested(knmi_server, tmp_path):
+    kwargs = dict(cache_dir=tmp_path, url=knmi_server.url)
+    fetch_knmi_daily(249, "2020-01-01", "2020-03-31", **kwargs)
+    fetch_knmi_daily(249, "2021-07-01", "2021-09-30", **kwargs)
+    df = fetch_knmi_daily(249, "2021-01-01", "2021-03-31", **kwargs)
+    assert knmi_server.requests[2] == ([249], T("2021-01-01"), T("2021-03-31"))
+    assert len(df) == 90
+
+    # Only the parts between the cached quarters are fetched, and the joined period is complete
+    df = fetch_knmi_daily(249, "2020-01-01", "2021-09-30", **kwargs)
+    assert knmi_server.requests[3:] == [
+        ([249], T("2020-04-01"), T("2020-12-31")),
+        ([249], T("2021-04-01"), T("2021-06-30")),
+    ]
+    assert df["DATE"].tolist() == list(pd.date_range("2020-01-01", "2021-09-30"))
+    fetch_knmi_daily(249, "2020-01-01", "2021-09-30", **kwargs)
+    assert len(knmi_server.requests) == 5
+
+
+def test_missing_ranges():
+    coverage = [(T("2020-05-01"), T("2020-05-31")), (T("2020-01-01"), T("2020-01-31"))]
+    assert _missing_ranges([], T("2020-01-01"), T("2020-12-31")) == [(T("2020-01-01"), T("2020-12-31"))]
+    assert _missing_ranges(coverage, T("2020-01-10"), T("2020-05-10")) == [(T("2020-02-01"), T("2020-04-30"))]
+    assert _missing_ranges(coverage, T("2020-05-02"), T("2020-05-30")) == []
+    assert _missing_ranges(coverage, T("2019-12-01"), T("2020-06-30")) == [
+        (T("2019-12-01"), T("2019-12-31")),
+        (T("2020-02-01"), T("2020-04-30")),
+        (T("2020-06-01"), T("2020-06-30")),
+    ]
+
+
+def test_cache_of_a_single_span_is_read(knmi_server, tmp_path):
+    # Caches written before holes were tracked store one start and end
+    fetch_knmi_daily(249, "2020-01-01", "2020-01-31", cache_dir=tmp_path, url=knmi_server.url)
+    (tmp_path / "knmi_249.json").write_text(json.dumps({"start": "2020-01-01", "end": "2020-01-31"}))
+    fetch_knmi_daily(249, "2020-01-01", "2020-02-29", cache_dir=tmp_path, url=knmi_server.url)
+    assert knmi_server.requests[1] == ([249], T("2020-02-01"), T("2020-02-29"))
+    assert "intervals" in json.loads((tmp_path / "knmi_249.json").read_text())
+
+
+def test_stations_share_one_request(knmi_server, tmp_path):
+    kwargs = dict(cache_dir=tmp_path, url=knmi_server.url)
+    df = fetch_knmi_daily([240, 249, 260], "2020-01-01", "2020-01-31", **kwargs)
+    assert knmi_server.requests == [([240, 249, 260], T("2020-01-01"), T("2020-01-31"))]
+    assert sorted(df["STN"].unique()) == [240, 249, 260]
+    assert len(df) == 3 * 31
+
+    # 260 has February as well, so only 240 and 249 miss it
+    fetch_knmi_daily(260, "2020-02-01", "2020-02-29", **kwargs)
+    fetch_knmi_daily([240, 249, 260], "2020-01-01", "2020-02-29", **kwargs)
+    assert knmi_server.requests[1:] == [
+        ([260], T("2020-02-01"), T("2020-02-29")),
+        ([240, 249], T("2020-02-01"), T("2020-02-29")),
+    ]
+
+
+def test_offline_returns_cached_data(knmi_server, tmp_path):
+    online = fetch_knmi_daily(249, "2020-01-01", "2020-01-31", cache_dir=tmp_path, url=knmi_server.url)
+    knmi_server.stop()
+    offline = fetch_knmi_daily(249, "2020-01-10", "2020-01-20", cache_dir=tmp_path, offline=True,
+                               url=knmi_server.url)
+    expected = online[online["DATE"].between("2020-01-10", "2020-01-20")].reset_index(drop=True)
+    pd.testing.assert_frame_equal(offline, expected)
+    assert len(knmi_server.requests) == 1
+
+
+def test_offline_without_cache_warns(knmi_server, tmp_path, caplog):
+    with caplog.at_level(logging.WARNING, logger="pastas_wv2030.knmi"):
+        df = fetch_knmi_daily([240, 249], "2020-01-01", "2020-01-31", cache_dir=tmp_path, offline=True,
+                              url=knmi_server.url)
+    assert df.empty
+    assert list(df.columns) == ["STN", "DATE", *KNMI_COLUMNS]
+    assert "Offline" in caplog.text
+    assert knmi_server.requests == []
+
+
+def test_fetch_prec_evap(knmi_server, tmp_path):
+    prec, evap = fetch_knmi_prec_evap(249, "20200101", "20201231", cache_dir=tmp_path, url=knmi_server.url)
+    assert prec.index.equals(evap.index)
+    assert len(prec) == 366
+    assert prec.dtype == evap.dtype == np.float64
+    assert (prec >= 0).all()
+    assert (evap.dropna() >= 0).all() and evap.mean() > 0
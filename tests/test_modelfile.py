@@ -0,0 +1,56 @@
+# Tests of the binary model files (.pasz)
+import numpy as np
+import pandas as pd
+import pastas as ps
+import pytest
+from pastas.io import pas
+
+from pastas_wv2030.modelfile import ModelFile, dump_model, load_model, pas_to_pasz, pasz_to_pas
+
+
+@pytest.fixture(scope="module")
+def model():
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2015-01-01", "2019-12-31", freq="D")
+    prec = pd.Series(np.where(rng.random(index.size) < 0.45, rng.gamma(0.8, 0.005, index.size), 0.0),
+                     index=index, name="prec")
+    evap = pd.Series(0.0015 + 0.0012 * np.sin(2 * np.pi * (index.dayofyear - 110) / 365.25), index=index,
+                     name="evap")
+    recharge = (prec - evap).rolling(120, min_periods=1).mean()
+    head = 5.0 + 200.0 * recharge + rng.normal(0, 0.02, index.size)
+    # Irregular observations, as measured by hand
+    head = head.iloc[::7].drop(index[[70, 140]])
+    ml = ps.Model(head.rename("head"), name="well")
+    ml.add_stressmodel(ps.RechargeModel(prec, evap, ps.Exponential(), name="recharge"))
+    ml.solve(report=False)
+    return ml
+
+
+def test_dump_and_load(model, tmp_path):
+    path = dump_model(model, tmp_path / "well.pasz")
+    loaded = load_model(path)
+    assert loaded.name == "well"
+    pd.testing.assert_series_equal(loaded.observations(), model.observations())
+    pd.testing.assert_series_equal(loaded.parameters["optimal"], model.parameters["optimal"])
+    pd.testing.assert_series_equal(loaded.simulate(), model.simulate())
+
+
+def test_header_without_series(model, tmp_path):
+    modelfile = ModelFile(dump_model(model, tmp_path / "well.pasz"))
+    assert modelfile.name == "well"
+    assert modelfile.stats["nobs"] == model.observations().size
+    assert modelfile.stats["EVP"] == pytest.approx(model.stats.evp())
+    pd.testing.assert_frame_equal(modelfile.parameters, model.parameters)
+    assert modelfile.settings["freq"] == "D"
+
+
+def test_pas_round_trip(model, tmp_path):
+    model.to_file(tmp_path / "well.pas")
+    pasz = pas_to_pasz(tmp_path / "well.pas")
+    assert pasz == tmp_path / "well.pasz"
+    back = pasz_to_pas(pasz, tmp_path / "back.pas")
+    original, converted = pas.load(tmp_path / "well.pas"), pas.load(back)
+    pd.testing.assert_frame_equal(converted["parameters"], original["parameters"])
+    pd.testing.assert_series_equal(converted["oseries"]["series"], original["oseries"]["series"],
+                                   check_freq=False)
+    pd.testing.assert_series_equal(ps.io.load(back).simulate(), model.simulate())
@@ -0,0 +1,62 @@
+# Tests of the vectorized PET kernels
+import numpy as np
+import pandas as pd
+import pytest
+
+from pastas_wv2030.pet import PET_METHODS, hargreaves, makkink, pet_from_frame, pet_wide, register_pet_method
+
+
+def test_hargreaves_scalar():
+    # 0.0023 * (15 + 17.8) * sqrt(10) * 20
+    assert hargreaves(15.0, 20.0, 10.0, 20.0) == pytest.approx(0.0023 * 32.8 * np.sqrt(10.0) * 20.0)
+
+
+def test_hargreaves_missing_and_bad_inputs():
+    pet = hargreaves([15.0, np.nan, 15.0], [20.0, 20.0, 5.0], [10.0, 10.0, 10.0], [20.0, 20.0, 20.0])
+    assert np.isfinite(pet[0])
+    # NaN input and a negative temperature spread give NaN, without a warning
+    assert np.isnan(pet[1:]).all()
+
+
+def test_makkink():
+    pet = makkink(np.array([0.0, 10.0, 20.0]), 15.0)
+    assert pet.shape == (3,)
+    # Typical Dutch values, increasing with temperature at the same radiation
+    assert ((pet > 0.5) & (pet < 5.0)).all()
+    assert (np.diff(pet) > 0).all()
+    assert np.isnan(makkink(np.nan, 15.0))
+
+
+def test_kernels_broadcast():
+    rng = np.random.default_rng(0)
+    tavg = rng.uniform(0, 20, (30, 4))
+    radiation = rng.uniform(1, 25, (30, 4))
+    wide = makkink(tavg, radiation)
+    assert wide.shape == (30, 4)
+    np.testing.assert_allclose(wide[:, 2], makkink(tavg[:, 2], radiation[:, 2]))
+
+
+@pytest.mark.parametrize("method", ["hargreaves", "makkink"])
+def test_pet_from_frame_and_wide_agree(knmi_df, method):
+    long = pet_from_frame(knmi_df, method)
+    assert long.index.equals(knmi_df.index) and long.name == "ET"
+    wide = pet_wide(knmi_df, method)
+    assert list(wide.columns) == sorted(knmi_df["STN"].unique())
+    for stn in wide.columns:
+        rows = knmi_df["STN"] == stn
+        np.testing.assert_allclose(wide[stn].to_numpy(), long[rows].to_numpy())
+
+
+def test_pet_wide_missing_days(knmi_df):
+    # A station without the last day gets NaN there
+    knmi_df = knmi_df[~((knmi_df["STN"] == 249) & (knmi_df["DATE"] == knmi_df["DATE"].max()))]
+    wide = pet_wide(knmi_df, "makkink")
+    assert np.isnan(wide[249].iloc[-1]) and wide[249].iloc[:-1].notna().all()
+    assert wide[240].notna().all()
+
+
+def test_register_pet_method(knmi_df, monkeypatch):
+    monkeypatch.setattr("pastas_wv2030.pet.PET_METHODS", dict(PET_METHODS))
+    register_pet_method("constant", lambda radiation: np.full_like(radiation, 2.0), ["Radiation"])
+    assert (pet_from_frame(knmi_df, "constant") == 2.0).all()
+    assert isinstance(pet_wide(knmi_df, "constant"), pd.DataFrame)
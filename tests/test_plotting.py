@@ -0,0 +1,44 @@
+# Tests of the downsampled plotting helpers
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from pastas_wv2030.plotting import MAX_POINTS, WEBGL_THRESHOLD, downsample, knmi_traces, lttb, minmax, scatter_trace
+
+
+def _logger_series(n):
+    index = pd.date_range("2015-01-01", periods=n, freq="15min")
+    rng = np.random.default_rng(0)
+    return pd.Series(np.cumsum(rng.normal(0, 0.01, n)), index=index, name="head")
+
+
+def test_downsamplers_keep_extremes():
+    series = _logger_series(100_000)
+    for idx in (lttb(series.index.asi8, series.values, 1000), minmax(series.values, 1000)):
+        assert len(idx) <= 1000 and (np.diff(idx) > 0).all()
+    kept = series.iloc[minmax(series.values, 1000)]
+    assert kept.max() == series.max() and kept.min() == series.min()
+    idx = lttb(series.index.asi8, series.values, 1000)
+    assert (idx[0], idx[-1]) == (0, len(series) - 1)
+
+
+def test_downsample_clips_to_window():
+    series = _logger_series(100_000)
+    data = downsample(series, start="2016-01-01", end="2016-06-30")
+    assert len(data) == MAX_POINTS
+    assert data.index.min() >= pd.Timestamp("2016-01-01") and data.index.max() <= pd.Timestamp("2016-06-30")
+    assert len(downsample(series.iloc[:100])) == 100
+
+
+def test_scatter_trace_uses_webgl_for_long_series():
+    assert WEBGL_THRESHOLD < MAX_POINTS
+    assert isinstance(scatter_trace(_logger_series(1_000_000)), go.Scattergl)
+    assert isinstance(scatter_trace(_logger_series(500)), go.Scatter)
+
+
+def test_knmi_traces_are_clipped():
+    index = pd.date_range("2000-01-01", "2020-12-31", freq="D")
+    prec = pd.Series(1.0, index=index)
+    traces = knmi_traces(prec, prec / 2, start="2019-01-01", end="2019-12-31")
+    assert [trace.name for trace in traces] == ["KNMI Precipitation", "KNMI Evapotranspiration", "KNMI Recharge"]
+    assert all(len(trace.x) == 365 for trace in traces)
@@ -0,0 +1,108 @@
+# Tests of the adaptive model selection: the screening rounds, the ranking of the full fits and a real sheet
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pastas_wv2030 import selection
+from pastas_wv2030.batch import BatchJob, make_jobs, run_batch
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, OUTPUT_SHEETS
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+from pastas_wv2030.selection import rank_full_fits, run_selection, screen_well, top_variants
+
+INDEX = pd.date_range("2020-01-01", periods=400, freq="D")
+HEAD = pd.Series(0.0, index=INDEX[-200:])
+STRESS = pd.Series(1.0, index=INDEX)
+
+
+class FakeModels:
+    """Stands in for selection.build_model: a model whose screening fit ends at the prepared AIC."""
+
+    def __init__(self, aic):
+        self.aic = aic
+        self.built = []
+
+    def __call__(self, head, prec, evap, recharge, rfunc, noise=True, name=None):
+        self.built.append((recharge, rfunc))
+        aic = self.aic[recharge, rfunc]
+        if aic is None:
+            raise ValueError("no fit")
+        return SimpleNamespace(stats=SimpleNamespace(aic=lambda: aic, bic=lambda: aic + 5.0, evp=lambda: 80.0),
+                               solver=SimpleNamespace(obj_func=aic),
+                               parameters=pd.DataFrame({"optimal": [aic]}, index=["p"]))
+
+
+def _screen(monkeypatch, aic):
+    fake = FakeModels(aic)
+    monkeypatch.setattr(selection, "build_model", fake)
+    monkeypatch.setattr(selection, "_screen_solve", lambda ml, head, settings: (10, True))
+    jobs = [BatchJob("well", recharge, rfunc) for recharge, rfunc in aic]
+    rows = {(row["RechargeModel"], row["RechargeRfunc"]): row for row in screen_well(jobs, HEAD, STRESS, STRESS)}
+    return fake, rows
+
+
+def _grid(values):
+    rfuncs = ["Exponential", "Gamma", "Hantush"]
+    return {(recharge, rfunc): value for recharge, row in values.items() for rfunc, value in zip(rfuncs, row)}
+
+
+def test_clear_losers_are_pruned(monkeypatch):
+    fake, rows = _screen(monkeypatch, _grid({"Linear": [-100.0, -105.0, -110.0], "FlexModel": [-110.0, -115.0, -130.0],
+                                             "Direct": [0.0, -10.0, -20.0]}))
+    # Every recharge model is screened with the reference response function first
+    assert fake.built[:3] == [("Linear", "Exponential"), ("FlexModel", "Exponential"), ("Direct", "Exponential")]
+    # Direct clearly loses, so only the response function of the best variant is fitted for it
+    assert rows["Direct", "Gamma"]["status"] == "pruned" and rows["Direct", "Gamma"]["solves"] == 0
+    assert rows["Direct", "Hantush"]["status"] == "screened"
+    assert len(fake.built) == 8 and sum(row["solves"] for row in rows.values()) == 8
+    assert top_variants(list(rows.values()), top_k=2) == [("FlexModel", "Hantush"), ("FlexModel", "Gamma")]
+
+
+def test_recharge_model_that_wins_with_another_response_function(monkeypatch):
+    _, rows = _screen(monkeypatch, _grid({"Linear": [-100.0, -105.0, -120.0], "Direct": [0.0, -10.0, -200.0]}))
+    assert rows["Direct", "Gamma"]["status"] == "pruned"
+    assert top_variants(list(rows.values()), top_k=1) == [("Direct", "Hantush")]
+
+
+def test_close_recharge_models_are_screened_completely(monkeypatch):
+    _, rows = _screen(monkeypatch, _grid({"Linear": [-100.0, -105.0, -110.0], "FlexModel": [-90.0, -120.0, -95.0]}))
+    assert all(row["status"] == "screened" for row in rows.values())
+    assert top_variants(list(rows.values()), top_k=1) == [("FlexModel", "Gamma")]
+
+
+def test_failed_reference_fit_does_not_prune(monkeypatch):
+    _, rows = _screen(monkeypatch, _grid({"Linear": [-100.0, -105.0, -110.0], "Direct": [None, -60.0, -70.0]}))
+    assert rows["Direct", "Exponential"]["status"] == "failed"
+    assert rows["Direct", "Gamma"]["status"] == rows["Direct", "Hantush"]["status"] == "screened"
+
+
+def test_rank_full_fits():
+    df = pd.DataFrame({"file": ["a", "a", "a", "b", "b"], "model": ["a1", "a2", "a3", "b1", "b2"],
+                       "EVP": [90.0, 80.0, np.nan, 70.0, 75.0], "AIC": [-10.0, -20.0, np.nan, np.nan, np.nan],
+                       "error": [None, None, "failed", "failed", "failed"]})
+    ranked = rank_full_fits(df, "AIC")
+    assert ranked["model"].tolist() == ["a2", "a1", "a3", "b1", "b2"]
+    assert ranked["chosen"].tolist() == [True, False, False, False, False]
+
+
+@pytest.fixture(scope="module")
+def hb011():
+    head = aggregate_daily(read_head_csv(OUTPUT_SHEETS / "86349-1 HB011PB01.csv"), "median").dropna()
+    return {"HB011": head}, read_timeseries_csv(DEFAULT_PREC_FILE), read_timeseries_csv(DEFAULT_EVAP_FILE)
+
+
+def test_selection_keeps_the_best_grid_variant_on_a_real_sheet(hb011):
+    # A warm-started screening once pruned Berendrecht/Hantush, the best variant of this well
+    heads, prec, evap = hb011
+    rfuncs = ["Exponential", "Gamma", "Hantush", "DoubleExponential"]
+    jobs = make_jobs(heads, ["Linear", "Direct", "Berendrecht"], rfuncs, tarso=False)
+    grid, _ = run_batch(heads, prec, evap, jobs, max_workers=1)
+    results, _, screening = run_selection(heads, prec, evap, jobs, top_k=3, max_workers=1)
+    assert screening["nfev"].sum() + results["nfev"].sum() < grid["nfev"].sum()
+
+    best = grid.loc[grid["AIC"].idxmin()]
+    assert best["model"] in set(screening.loc[screening["status"] == "selected", "model"])
+    chosen = results[results["chosen"]].iloc[0]
+    assert results["AIC"].iloc[0] == chosen["AIC"] == results["AIC"].min()
+    assert chosen["AIC"] == pytest.approx(best["AIC"], abs=2.0)
@@ -0,0 +1,65 @@
+# Tests of the checkpointed run store of batch calibrations
+import pandas as pd
+
+from pastas_wv2030.batch import BatchJob
+from pastas_wv2030.store import RunStore, job_key, series_hash
+
+
+def _row(file, model, error=None, evp=80.0):
+    return {"file": file, "model": model, "EVP": evp, "error": error}
+
+
+def test_series_hash_ignores_name():
+    series = pd.Series([1.0, 2.0, 3.0], index=pd.date_range("2020-01-01", periods=3))
+    assert series_hash(series) == series_hash(series.rename("other"))
+    assert series_hash(series) != series_hash(series + 0.01)
+    assert series_hash(series) != series_hash(series.shift(1, freq="D"))
+
+
+def test_job_key_changes_with_inputs():
+    job = BatchJob("a.csv", "Linear", "Gamma")
+    key = job_key(job, "head", "stress")
+    assert key == job_key(BatchJob("a.csv", "Linear", "Gamma"), "head", "stress")
+    assert key != job_key(BatchJob("a.csv", "Linear", "Gamma", noise=False), "head", "stress")
+    assert key != job_key(job, "other head", "stress")
+    assert key != job_key(job, "head", "stress", settings={"solver": "LeastSquares", "version": 0})
+
+
+def test_put_get_status(tmp_path):
+    diagnostics = pd.DataFrame({"model": ["m1"], "Test": ["Shapiroo"], "P-value": [0.3]})
+    parameters = pd.Series({"A": 1.5, "a": 100.0})
+    with RunStore(tmp_path / "runs.sqlite") as store:
+        store.put("k1", _row("a.csv", "m1"), diagnostics, parameters)
+        store.put("k2", _row("a.csv", "m2", error="LinAlgError"))
+        assert len(store) == 2
+        assert store.status(["k1", "k2", "unknown"]) == {"k1": None, "k2": "LinAlgError"}
+        pd.testing.assert_series_equal(store.parameters("k1"), parameters)
+        assert store.parameters("k2") is None
+        assert store.parameters("unknown") is None
+
+    # Everything is committed right away, so a new connection sees it
+    with RunStore(tmp_path / "runs.sqlite") as store:
+        rows, diags = store.get(["k1", "k2"])
+        assert sorted(row["model"] for row in rows) == ["m1", "m2"]
+        assert len(diags) == 1
+        pd.testing.assert_frame_equal(diags[0], diagnostics)
+
+
+def test_put_replaces(tmp_path):
+    with RunStore(tmp_path / "runs.sqlite") as store:
+        store.put("k1", _row("a.csv", "m1", error="failed"))
+        store.put("k1", _row("a.csv", "m1", evp=90.0))
+        rows, _ = store.get(["k1"])
+        assert len(store) == 1
+        assert rows == [_row("a.csv", "m1", evp=90.0)]
+        assert store.status(["k1"]) == {"k1": None}
+
+
+def test_many_keys(tmp_path):
+    # More keys than SQLite accepts as query parameters at once
+    keys = [f"k{i}" for i in range(1200)]
+    with RunStore(tmp_path / "runs.sqlite") as store:
+        for key in keys[::2]:
+            store.put(key, _row("a.csv", key))
+        assert set(store.status(keys)) == set(keys[::2])
+        assert len(store.get(keys)[0]) == 600
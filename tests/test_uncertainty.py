@@ -0,0 +1,107 @@
+# Tests of the batched ensemble simulation of the Monte Carlo uncertainty
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pastas_wv2030 import uncertainty
+from pastas_wv2030.batch import build_model
+from pastas_wv2030.config import DEFAULT_EVAP_FILE, DEFAULT_PREC_FILE, OUTPUT_SHEETS
+from pastas_wv2030.readers import aggregate_daily, read_head_csv, read_timeseries_csv
+from pastas_wv2030.uncertainty import (chain_samples, parameter_distributions, parameter_samples,
+                                       prediction_bands, simulate_ensemble)
+
+
+@pytest.fixture(scope="module")
+def stresses():
+    return read_timeseries_csv(DEFAULT_PREC_FILE), read_timeseries_csv(DEFAULT_EVAP_FILE)
+
+
+@pytest.fixture(scope="module")
+def head():
+    return aggregate_daily(read_head_csv(OUTPUT_SHEETS / "86349-1 HB011PB01.csv"), "mean").dropna()
+
+
+def _solved(head, stresses, recharge, noise):
+    ml = build_model(head, *stresses, recharge, "Exponential", noise=noise)
+    ml.solve(report=False)
+    return ml
+
+
+@pytest.mark.parametrize("noise", [False, True])
+@pytest.mark.parametrize("recharge", ["Linear", "FlexModel", "Direct"])
+def test_ensemble_at_optimum_matches_simulate(head, stresses, recharge, noise):
+    ml = _solved(head, stresses, recharge, noise)
+    optimal = ml.parameters["optimal"].to_frame().T
+    expected = ml.simulate()
+
+    out = np.empty((1, expected.size))
+    ensemble, index = simulate_ensemble(ml, optimal, out=out)
+    assert index.equals(expected.index)
+    np.testing.assert_allclose(ensemble[0], expected.to_numpy(), rtol=0, atol=1e-9)
+
+    # The default float32 ensemble, and several samples in more than one chunk
+    ensemble, _ = simulate_ensemble(ml, pd.concat([optimal] * 5), chunk_size=2)
+    assert ensemble.dtype == np.float32
+    np.testing.assert_allclose(ensemble, np.tile(expected.to_numpy(), (5, 1)), rtol=1e-6, atol=1e-6)
+
+
+def test_samples_and_bands(head, stresses):
+    ml = _solved(head, stresses, "Linear", True)
+    samples = parameter_samples(ml, 2000, seed=1)
+    parameters = ml.parameters
+    assert list(samples.columns) == list(parameters.index) and len(samples) == 2000
+    assert (samples >= parameters["pmin"].fillna(-np.inf)).all().all()
+    assert (samples <= parameters["pmax"].fillna(np.inf)).all().all()
+    # Around the optimum; truncation to pmin/pmax shifts the mean by less than a standard error
+    summary = parameter_distributions(samples)
+    assert ((summary["mean"] - parameters["optimal"]).abs() < parameters["stderr"]).all()
+    np.testing.assert_allclose(summary["std"], parameters["stderr"], rtol=0.5)
+
+    bands, _ = prediction_bands(ml, 500, seed=1, noise=False)
+    with_noise, _ = prediction_bands(ml, 500, seed=1, noise=True)
+    assert bands.index.equals(ml.simulate().index)
+    assert (bands.diff(axis=1).iloc[:, 1:] >= 0).all().all()
+    # Residual noise widens the interval
+    width = (bands[0.975] - bands[0.025]).mean()
+    assert (with_noise[0.975] - with_noise[0.025]).mean() > width > 0
+
+
+def test_chain_samples(head, stresses):
+    ml = _solved(head, stresses, "Linear", False)
+    vary = ml.parameters["vary"]
+    chain = np.tile(ml.parameters.loc[vary, "optimal"].to_numpy(), (50, 1)) * np.linspace(0.9, 1.1, 50)[:, None]
+    samples = chain_samples(ml, 200, chain=chain, seed=0)
+    assert len(samples) == 200
+    assert samples.loc[:, vary].isin(chain.ravel()).all().all()
+    assert (samples.loc[:, ~vary] == ml.parameters.loc[~vary, "optimal"]).all().all()
+
+
+def test_memory_and_time_of_10000_samples(stresses, monkeypatch):
+    # Eleven years of daily heads (plus the ten-year warmup), generated by a known model
+    index = pd.date_range("2014-01-01", "2024-12-31")
+    ml = build_model(pd.Series(0.0, index=index, name="head"), *stresses, "Linear", "Exponential", noise=False)
+    p = ml.parameters["initial"].copy()
+    p[["rch_A", "rch_a", "rch_f", "constant_d"]] = 0.4, 60.0, -0.9, -1.5
+    rng = np.random.default_rng(0)
+    head = ml.simulate(p=p.to_numpy(), tmin=index[0], tmax=index[-1]) + rng.normal(0, 0.02, index.size)
+    ml = _solved(head.rename("head"), stresses, "Linear", True)
+
+    n = 10_000
+    ensemble_bytes = n * ml.simulate().size * 4
+    # Keep the ensemble in a memory-mapped file, so only the working memory is traced
+    monkeypatch.setattr(uncertainty, "MAX_IN_MEMORY", ensemble_bytes // 10)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        bands, samples = prediction_bands(ml, n, seed=0)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    elapsed = time.perf_counter() - start
+    assert len(samples) == n and bands.notna().all().all()
+    assert peak < ensemble_bytes / 2, f"Peak memory {peak / 2**20:.0f} MiB"
+    # About 6 s on one core; see benchmarks.suite uncertainty.ensemble_10000 for the timings
+    assert elapsed < 60